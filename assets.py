@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Манифест всех картинок игры и их загрузка заранее, до первого кадра.
+# Картинки декодируются параллельно в пуле потоков, а в формат дисплея
+# переводятся уже в главном потоке. Player, Platform, Monster и загрузчик
+# карт потом берут готовые Surface из кэша, а не читают файлы сами.
+
+import os
+import glob
+import time
+
+import pygame
+
+ASSETS_DIR = os.path.dirname(os.path.realpath(__file__))
+# каталоги с картинками: герой, блоки, монстры и тайлы карт
+ASSET_DIRS = ('mario', 'blocks', 'monsters', 'levels')
+WORKERS = 4  # потоков для декодирования PNG
+
+_images = {}  # {абсолютный путь: Surface}
+
+
+def _key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def manifest():
+    # список всех PNG из каталогов с картинками
+    paths = []
+    for name in ASSET_DIRS:
+        paths.extend(sorted(glob.glob(os.path.join(ASSETS_DIR, name, '*.png'))))
+    return paths
+
+
+def load_image(path):
+    # картинка из кэша; если ее не прогрели заранее - загружаем как раньше
+    if not isinstance(path, basestring):  # файлоподобный объект, не кэшируем
+        return pygame.image.load(path)
+    key = _key(path)
+    img = _images.get(key)
+    if img is None:
+        img = pygame.image.load(path)
+        _images[key] = img
+    return img
+
+
+def frames(animation):
+    # кадры анимации [(путь, длительность)] -> [(Surface, длительность)]
+    return [(load_image(path), delay) for path, delay in animation]
+
+
+def _convert(img):
+    if img.get_flags() & pygame.SRCALPHA:
+        return img.convert_alpha()
+    return img.convert()
+
+
+def warm_up(paths=None, workers=WORKERS):
+    # Загружает все картинки из манифеста в кэш.
+    # pygame отпускает GIL, пока декодирует файл, поэтому потоки реально
+    # работают параллельно. convert() трогает формат дисплея, а SDL это
+    # разрешает только из главного потока - поэтому он делается отдельно.
+    # Возвращает [(этап, секунды)] для отчета.
+    timings = []
+    start = time.time()
+    if paths is None:
+        paths = manifest()
+    paths = [path for path in paths if _key(path) not in _images]
+    timings.append(('manifest', time.time() - start))
+
+    start = time.time()
+    from multiprocessing.pool import ThreadPool  # нужен только здесь
+    pool = ThreadPool(workers)
+    try:
+        images = pool.map(pygame.image.load, paths)
+    finally:
+        pool.close()
+        pool.join()
+    timings.append(('decode', time.time() - start))
+
+    start = time.time()
+    if pygame.display.get_surface() is not None:  # без окна convert невозможен
+        images = [_convert(img) for img in images]
+    for path, img in zip(paths, images):
+        _images[_key(path)] = img
+    timings.append(('convert', time.time() - start))
+    return timings
+
+
+def print_timings(timings):
+    total = sum(seconds for phase, seconds in timings)
+    line = u"Загрузка картинок (%d шт.): %s, всего %.1f мс" % (
+        len(_images),
+        u", ".join(u"%s %.1f мс" % (phase, seconds * 1000)
+                   for phase, seconds in timings),
+        total * 1000)
+    print(line.encode('utf-8'))  # и в pipe, где Python 2 пишет ascii
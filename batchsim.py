@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Пакетный прогон уровней без окна в пуле процессов: автоматические
+# плейтесты ботами и записанным вводом.
+#
+#   python batchsim.py                               # все уровни, все боты
+#   python batchsim.py --scripts random --seeds 64 --workers 64
+#   python batchsim.py --levels levels/map_2 --scripts run.json
+#
+# Задание - это (уровень, сценарий ввода, seed). Сценарий - имя бота из
+# BOTS или файл записи replay.py. Каждый процесс пула гоняет
+# simulation.World без рендера и без ограничения FPS; результаты
+# (пройден ли уровень, сколько смертей, кадров и времени) печатаются по
+# мере готовности. Задания независимы, карты каждый процесс читает один
+# раз (simulation.load_level), так что скорость растет вместе с числом
+# ядер.
+
+import os
+import sys
+import json
+import random
+from timeit import default_timer
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # окно не нужно
+
+import simulation
+import replay
+
+MAX_TICKS = 60 * 60 * 2  # две минуты игры, потом задание прерывается
+SEEDS = 4
+
+_replays = {}  # {файл записи: уровни}
+
+
+def bot_right(rnd):
+    # бежит вправо и прыгает через равные промежутки
+    period = rnd.randint(30, 60)
+    tick = 0
+    while True:
+        yield False, True, tick % period < 12, True
+        tick += 1
+
+
+def bot_random(rnd):
+    # случайно жмет клавиши, но чаще идет вправо
+    while True:
+        right = rnd.random() < 0.7
+        left = not right and rnd.random() < 0.5
+        keys = (left, right, rnd.random() < 0.4, rnd.random() < 0.5)
+        for tick in xrange(rnd.randint(5, 40)):
+            yield keys
+
+
+BOTS = {
+    'right': bot_right,
+    'random': bot_random,
+}
+
+
+def _inputs(level, script, seed):
+    # ввод для задания: бот или запись replay.py
+    if script in BOTS:
+        return BOTS[script](random.Random(seed))
+    if script not in _replays:
+        _replays[script] = dict((recorded['level'], recorded['inputs'])
+                                for recorded in replay.load(script))
+    if level not in _replays[script]:
+        raise ValueError(u'%s has no recording for %s' % (script, level))
+    return replay.inputs(_replays[script][level])
+
+
+def _init_worker():
+    import signal
+    import player
+    # Ctrl+C ловит главный процесс
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    player.DIE_DELAY = 0  # без паузы после смерти героя
+
+
+def run_job(job):
+    # (уровень, сценарий, seed[, предел кадров]) -> словарь с результатом
+    level, script, seed = job[:3]
+    max_ticks = job[3] if len(job) > 3 else MAX_TICKS
+    result = {'level': level, 'script': script, 'seed': seed,
+              'pid': os.getpid()}
+    start = default_timer()
+    try:
+        world = simulation.World(simulation.load_level(level))
+        hero = world.spawn_hero()
+        ticks = 0
+        for left, right, up, running in _inputs(level, script, seed):
+            if hero.winner or ticks >= max_ticks:
+                break
+            world.step(left, right, up, running, animate=False)
+            ticks += 1
+        result.update(completed=hero.winner, deaths=hero.deaths, ticks=ticks)
+    except Exception as e:
+        result['error'] = u'%s: %s' % (e.__class__.__name__, e)
+    result['seconds'] = default_timer() - start
+    return result
+
+
+def make_jobs(levels, scripts, seeds, max_ticks=MAX_TICKS):
+    # боты гоняются с разными seed, запись от seed не зависит
+    jobs = []
+    for level in levels:
+        for script in scripts:
+            for seed in (seeds if script in BOTS else range(1)):
+                jobs.append((level, script, seed, max_ticks))
+    return jobs
+
+
+def run_batch(jobs, workers=None):
+    # Раздает задания пулу процессов, отдает результаты по мере готовности
+    # (в порядке завершения, а не в порядке заданий).
+    import multiprocessing
+    pool = multiprocessing.Pool(workers, _init_worker)
+    try:
+        for result in pool.imap_unordered(run_job, jobs):
+            yield result
+        pool.close()
+    except BaseException:  # в том числе KeyboardInterrupt и GeneratorExit
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def main(argv=None):
+    import argparse
+    import multiprocessing
+    parser = argparse.ArgumentParser(
+        description=u'Пакетный прогон уровней без окна в пуле процессов')
+    parser.add_argument('--levels', nargs='+', metavar='LEVEL',
+                        default=[os.path.join('levels', 'map_%d' % lvl)
+                                 for lvl in range(1, 4)],
+                        help=u'уровни, как в loadLevel (levels/map_1)')
+    parser.add_argument('--scripts', nargs='+', metavar='SCRIPT',
+                        default=sorted(BOTS),
+                        help=u'боты (%s) или файлы записи replay.py'
+                        % u', '.join(sorted(BOTS)))
+    parser.add_argument('--seeds', type=int, default=SEEDS,
+                        help=u'seed 0..N-1 для каждого бота (по умолчанию %d)'
+                        % SEEDS)
+    parser.add_argument('--workers', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help=u'процессов в пуле (по умолчанию по числу ядер)')
+    parser.add_argument('--max-ticks', type=int, default=MAX_TICKS,
+                        help=u'предел кадров на задание (по умолчанию %d)'
+                        % MAX_TICKS)
+    parser.add_argument('--json', metavar='FILE',
+                        help=u'сохранить результаты в JSON')
+    args = parser.parse_args(argv)
+
+    jobs = make_jobs(args.levels, args.scripts, range(args.seeds),
+                     args.max_ticks)
+    # вывод обычно идет в файл или pipe, где Python 2 пишет ascii:
+    # кириллицу кодируем сами
+    print((u"%d заданий, %d процессов" % (len(jobs),
+                                         args.workers)).encode('utf-8'))
+    results = []
+    start = default_timer()
+    for result in run_batch(jobs, args.workers):
+        results.append(result)
+        if 'error' in result:
+            status = result['error']
+        else:
+            status = u"%s, смертей %d, %d кадров" % (
+                u"пройден" if result['completed'] else u"не пройден",
+                result['deaths'], result['ticks'])
+        line = u"%-20s %-10s seed %-4d %7.2f с  %s" % (
+            result['level'], os.path.basename(result['script']),
+            result['seed'], result['seconds'], status)
+        print(line.encode('utf-8'))
+    seconds = default_timer() - start
+    ticks = sum(result.get('ticks', 0) for result in results)
+    line = u"всего %d кадров за %.2f с: %.0f кадров/с" % (
+        ticks, seconds, ticks / max(seconds, 1e-9))
+    print(line.encode('utf-8'))
+    if args.json:
+        out = open(args.json, 'w')
+        try:
+            json.dump(results, out, indent=1, sort_keys=True)
+        finally:
+            out.close()
+        print("-> %s" % args.json)
+    if any('error' in result for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
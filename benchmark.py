@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Бенчмарки горячих мест движка на синтетических уровнях.
+#
+#   python benchmark.py                  # все замеры, результат в benchmark.json
+#   python benchmark.py --quick -o q.json
+#   python benchmark.py --only render_layer --only parse_decode
+#
+# Уровни генерирует levelgen с фиксированным seed, у каждого замера есть
+# прогрев. Функции карты меряются на уровнях от 100 до 100000 столбцов, функции
+# объектов - на разном числе объектов. В JSON попадают все прогоны, а не
+# одно число, так что по нескольким файлам видно и регрессии, и то, как
+# время растет с размером.
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import tempfile
+from timeit import default_timer
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # окно не нужно
+
+import pygame
+
+import tmxreader
+import helperspygame
+import levelgen
+import pyganim
+import assets
+import player
+import simulation
+from blocks import PLATFORM_WIDTH, PLATFORM_HEIGHT
+from monsters import Monster
+
+SEED = 1
+ROWS = 25  # высота уровней, как у map_*.tmx
+COLUMNS = (100, 1000, 10000, 100000)  # ширина синтетических уровней
+QUICK_COLUMNS = (100, 1000, 10000)
+ENTITIES = (10, 100, 1000)  # число монстров и анимаций
+QUICK_ENTITIES = (10, 100)
+ENTITY_COLUMNS = 1000  # ширина уровня для замеров объектов
+SCREEN = (800, 640)  # размер кадра для render_layer
+
+WARM_UP = 1  # прогонов до замера
+REPEAT = 5  # прогонов в замере
+QUICK_REPEAT = 3
+FRAMES = 60  # кадров в одном прогоне покадровых замеров
+
+
+def make_tmx(tmp_dir, columns, seed=SEED):
+    # Синтетический уровень от levelgen: случайные платформы, смертельные
+    # блоки, монстры, телепорт и принцесса справа
+    tmx_name = os.path.join(tmp_dir, 'level_%d.tmx' % columns)
+    levelgen.write(tmx_name, width=columns, height=ROWS, seed=seed,
+                   monsters=max(1, columns // 25))
+    return tmx_name
+
+
+def measure(func, repeat, warm_up=WARM_UP, setup=None):
+    # Время каждого прогона func(), setup() вызывается перед каждым
+    # прогоном и не входит в замер, его результат передается в func.
+    times = []
+    for i in range(warm_up + repeat):
+        arg = setup() if setup is not None else None
+        start = default_timer()
+        if setup is not None:
+            func(arg)
+        else:
+            func()
+        seconds = default_timer() - start
+        if i >= warm_up:
+            times.append(seconds)
+    return times
+
+
+def summary(name, params, times, items=1):
+    # items - сколько единиц работы в одном прогоне (кадров, вызовов)
+    ordered = sorted(times)
+    median = ordered[len(ordered) // 2]
+    return {
+        'name': name,
+        'params': params,
+        'items': items,
+        'times': times,
+        'min': ordered[0],
+        'median': median,
+        'mean': sum(times) / len(times),
+        'max': ordered[-1],
+        'per_item': median / items,
+    }
+
+
+def new_loader():
+    # как в loadLevel, но без общего кэша тайлсетов: меряем нарезку
+    return helperspygame.ResourceLoaderPygame(assets.load_image,
+                                              use_subsurfaces=True,
+                                              tileset_cache=None)
+
+
+def loaded_map(tmx_name):
+    world_map = tmxreader.TileMapParser().parse_decode(tmx_name)
+    resources = new_loader()
+    resources.load(world_map)
+    return world_map, resources
+
+
+# ---------------------------------------------------------------------------
+# замеры на уровнях разной ширины: bench(tmx_name, columns, repeat) -> dict
+
+def bench_parse_decode(tmx_name, columns, repeat):
+    parser = tmxreader.TileMapParser()
+    times = measure(lambda: parser.parse_decode(tmx_name), repeat)
+    return summary('parse_decode', {'columns': columns, 'rows': ROWS}, times)
+
+
+def bench_resource_load(tmx_name, columns, repeat):
+    world_map = tmxreader.TileMapParser().parse_decode(tmx_name)
+    times = measure(lambda resources: resources.load(world_map), repeat,
+                    setup=new_loader)
+    return summary('ResourceLoaderPygame.load',
+                   {'columns': columns, 'rows': ROWS}, times)
+
+
+def bench_get_layers(tmx_name, columns, repeat):
+    world_map, resources = loaded_map(tmx_name)
+    times = measure(lambda: helperspygame.get_layers_from_map(resources),
+                    repeat)
+    return summary('get_layers_from_map', {'columns': columns, 'rows': ROWS},
+                   times)
+
+
+def bench_render_layer(tmx_name, columns, repeat):
+    # камера проходит уровень слева направо, кадр рисуется в Surface
+    world_map, resources = loaded_map(tmx_name)
+    layers = [layer for layer in helperspygame.get_layers_from_map(resources)
+              if not layer.is_object_group]
+    renderer = helperspygame.RendererPygame()
+    screen = pygame.Surface(SCREEN, 0, 32)
+    width = columns * PLATFORM_WIDTH
+    height = ROWS * PLATFORM_HEIGHT
+
+    def run():
+        for frame in range(FRAMES):
+            x = SCREEN[0] // 2 + (width - SCREEN[0]) * frame // FRAMES
+            renderer.set_camera_position_and_size(x, height // 2, SCREEN[0],
+                                                  SCREEN[1], 'center')
+            for layer in layers:
+                renderer.render_layer(screen, layer)
+    times = measure(run, repeat)
+    return summary('RendererPygame.render_layer',
+                   {'columns': columns, 'rows': ROWS, 'layers': len(layers)},
+                   times, FRAMES)
+
+
+def inputs(frame):
+    # одинаковый сценарий для всех прогонов: бег вправо, прыжки, шаг назад
+    left = frame % 50 >= 40
+    return left, not left, frame % 20 == 0, frame % 100 < 50
+
+
+def bench_player_update(tmx_name, columns, repeat):
+    world_map = tmxreader.TileMapParser().parse_decode(tmx_name)
+    world = simulation.World(world_map)
+    hero = world.spawn_hero()
+    platforms = world.platforms
+
+    def run(arg):
+        for frame in range(FRAMES):
+            left, right, up, running = inputs(frame)
+            hero.update(left, right, up, running, platforms)
+
+    def setup():
+        hero.rect.topleft = (hero.startX, hero.startY)
+        hero.xvel = hero.yvel = 0
+    times = measure(run, repeat, setup=setup)
+    return summary('Player.update', {'columns': columns, 'rows': ROWS,
+                                     'platforms': len(platforms)},
+                   times, FRAMES)
+
+
+def bench_player_collide(tmx_name, columns, repeat):
+    world_map = tmxreader.TileMapParser().parse_decode(tmx_name)
+    world = simulation.World(world_map)
+    hero = world.spawn_hero()
+    platforms = world.platforms
+    # герой стоит на полу: столкновение есть, но он никуда не сдвигается
+    hero.rect.bottom = (ROWS - 1) * PLATFORM_HEIGHT
+
+    def run():
+        for frame in range(FRAMES):
+            hero.collide(0, 1, platforms)
+    times = measure(run, repeat)
+    return summary('Player.collide', {'columns': columns, 'rows': ROWS,
+                                      'platforms': len(platforms)},
+                   times, FRAMES)
+
+
+# ---------------------------------------------------------------------------
+# замеры на разном числе объектов: bench(tmx_name, count, repeat) -> dict
+
+def bench_monster_update(tmx_name, count, repeat):
+    world_map = tmxreader.TileMapParser().parse_decode(tmx_name)
+    world = simulation.World(world_map)
+    rnd = random.Random(SEED)
+    monsters = pygame.sprite.Group()
+    for i in range(count):
+        monster = Monster(
+            rnd.randrange(4, ENTITY_COLUMNS - 1) * PLATFORM_WIDTH,
+            rnd.randrange(2, ROWS - 3) * PLATFORM_HEIGHT,
+            rnd.choice((-2, 2)), rnd.choice((0, 1)),
+            rnd.randrange(2, 6) * PLATFORM_WIDTH,
+            rnd.randrange(0, 3) * PLATFORM_HEIGHT)
+        monsters.add(monster)
+    platforms = world.platforms + list(monsters)
+    # каждый монстр проверяет все тела, время растет как count * platforms,
+    # поэтому на больших count кадров меньше (сравнивать по per_item)
+    frames = max(2, FRAMES * ENTITIES[0] // count)
+
+    def run():
+        for frame in range(frames):
+            monsters.update(platforms)
+    times = measure(run, repeat)
+    return summary('Monster.update', {'monsters': count,
+                                      'columns': ENTITY_COLUMNS,
+                                      'platforms': len(platforms)},
+                   times, frames * count)
+
+
+def bench_animation_blit(tmx_name, count, repeat, compiled=False):
+    frames = [(assets.load_image(path), player.ANIMATION_DELAY)
+              for path in player.ANIMATION_RIGHT]
+    animations = []
+    for i in range(count):
+        animation = pyganim.PygAnimation(frames)
+        animation.play()
+        if compiled:
+            animation.compile()
+        animations.append(animation)
+    image = pygame.Surface((player.WIDTH, player.HEIGHT))
+
+    def run():
+        for frame in range(FRAMES):
+            for animation in animations:
+                animation.blit(image, (0, 0))
+    times = measure(run, repeat)
+    return summary('PygAnimation.blit', {'animations': count,
+                                         'compiled': compiled}, times,
+                   FRAMES * count)
+
+
+def bench_animation_blit_compiled(tmx_name, count, repeat):
+    # то же с таблицей кадров (PygAnimation.compile), как в игре
+    return bench_animation_blit(tmx_name, count, repeat, compiled=True)
+
+
+MAP_BENCHMARKS = [
+    ('parse_decode', bench_parse_decode),
+    ('resource_load', bench_resource_load),
+    ('get_layers_from_map', bench_get_layers),
+    ('render_layer', bench_render_layer),
+    ('player_update', bench_player_update),
+    ('player_collide', bench_player_collide),
+]
+ENTITY_BENCHMARKS = [
+    ('monster_update', bench_monster_update),
+    ('animation_blit', bench_animation_blit),
+    ('animation_blit_compiled', bench_animation_blit_compiled),
+]
+
+
+def run_all(columns=COLUMNS, entities=ENTITIES, repeat=REPEAT, only=None,
+            report=None):
+    # Запускает бенчмарки, report(result) вызывается после каждого замера.
+    # Возвращает словарь для JSON.
+    player.DIE_DELAY = 0  # без паузы после смерти героя
+    assets.warm_up()
+    results = []
+    tmp_dir = tempfile.mkdtemp(prefix='mario-bench-')
+    try:
+        tmx_names = {}
+        for count in sorted(set(columns) | set([ENTITY_COLUMNS])):
+            tmx_names[count] = make_tmx(tmp_dir, count)
+        for name, bench in MAP_BENCHMARKS:
+            if only and name not in only:
+                continue
+            for count in columns:
+                results.append(bench(tmx_names[count], count, repeat))
+                if report is not None:
+                    report(results[-1])
+        for name, bench in ENTITY_BENCHMARKS:
+            if only and name not in only:
+                continue
+            for count in entities:
+                results.append(bench(tmx_names[ENTITY_COLUMNS], count, repeat))
+                if report is not None:
+                    report(results[-1])
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'platform': platform.platform(),
+            'seed': SEED,
+            'warm_up': WARM_UP,
+            'repeat': repeat,
+            'frames': FRAMES,
+        },
+        'results': results,
+    }
+
+
+def print_result(result):
+    params = ', '.join('%s=%s' % item for item in sorted(
+        result['params'].items()))
+    print('%-28s %-45s median %9.2f ms  per item %9.1f us' % (
+        result['name'], params, result['median'] * 1000,
+        result['per_item'] * 1e6))
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description=u'Бенчмарки движка на синтетических уровнях')
+    parser.add_argument('-o', '--output', default='benchmark.json',
+                        help=u'куда записать JSON (по умолчанию benchmark.json)')
+    parser.add_argument('--quick', action='store_true',
+                        help=u'уровни до 10000 столбцов и меньше прогонов')
+    parser.add_argument('--only', action='append', metavar='NAME',
+                        choices=[name for name, bench in
+                                 MAP_BENCHMARKS + ENTITY_BENCHMARKS],
+                        help=u'запустить только этот замер (можно несколько)')
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        data = run_all(QUICK_COLUMNS, QUICK_ENTITIES, QUICK_REPEAT,
+                       args.only, print_result)
+    else:
+        data = run_all(only=args.only, report=print_result)
+    out = open(args.output, 'w')
+    try:
+        json.dump(data, out, indent=1, sort_keys=True)
+    finally:
+        out.close()
+    print('-> %s' % args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from pygame import *
+from pygame import sprite, Surface, Color, Rect
 import os
 import pyganim
+import assets
 
 PLATFORM_WIDTH = 32
 PLATFORM_HEIGHT = 32
@@ -20,30 +21,58 @@ ANIMATION_PRINCESS = [
             
  
 class Platform(sprite.Sprite):
-    def __init__(self, x, y):
+    def __init__(self, x, y, width=PLATFORM_WIDTH, height=PLATFORM_HEIGHT):
         sprite.Sprite.__init__(self)
         self.image = Surface((PLATFORM_WIDTH, PLATFORM_HEIGHT))
         self.image.fill(Color(PLATFORM_COLOR))
-        self.image = image.load("%s/blocks/platform.png" % ICON_DIR)
+        self.image = assets.load_image("%s/blocks/platform.png" % ICON_DIR)
         self.image.set_colorkey(Color(PLATFORM_COLOR))
-        self.rect = Rect(x, y, PLATFORM_WIDTH, PLATFORM_HEIGHT)
+        self.rect = Rect(x, y, width, height) # может покрывать несколько тайлов
+        self.area = Rect(x, y, width, height) # тайлы, которые покрывает тело
+
+    def tile_rect(self, x, y): # тело одного тайла с левым верхним углом x, y
+        return Rect(x, y, PLATFORM_WIDTH, PLATFORM_HEIGHT)
+
+    def tiles_hit(self, rect):
+        # сколько тайлов тела задевает rect: тело из make_bodies заменяет
+        # отдельные тела тайлов, и так можно узнать, со сколькими из них
+        # было бы столкновение
+        area = self.area
+        if area.width == PLATFORM_WIDTH and area.height == PLATFORM_HEIGHT:
+            return 1 if rect.colliderect(self.rect) else 0
+        clip = area.clip(rect)
+        if not clip:
+            return 0
+        left = clip.left - (clip.left - area.left) % PLATFORM_WIDTH
+        top = clip.top - (clip.top - area.top) % PLATFORM_HEIGHT
+        hits = 0
+        for y in range(top, clip.bottom, PLATFORM_HEIGHT):
+            for x in range(left, clip.right, PLATFORM_WIDTH):
+                if rect.colliderect(self.tile_rect(x, y)):
+                    hits += 1
+        return hits
         
 class BlockDie(Platform):
-    def __init__(self, x, y):
-        Platform.__init__(self, x, y)
-        self.image = image.load("%s/blocks/dieBlock.png" % ICON_DIR)
-        self.rect = Rect(x + PLATFORM_WIDTH / 4, y + PLATFORM_HEIGHT / 4, PLATFORM_WIDTH - PLATFORM_WIDTH / 2, PLATFORM_HEIGHT - PLATFORM_HEIGHT / 2)
+    def __init__(self, x, y, width=PLATFORM_WIDTH, height=PLATFORM_HEIGHT):
+        Platform.__init__(self, x, y, width, height)
+        self.image = assets.load_image("%s/blocks/dieBlock.png" % ICON_DIR)
+        self.rect = Rect(x + PLATFORM_WIDTH / 4, y + PLATFORM_HEIGHT / 4, width - PLATFORM_WIDTH / 2, height - PLATFORM_HEIGHT / 2)
+
+    def tile_rect(self, x, y): # у каждого тайла отступ в четверть тайла
+        return Rect(x + PLATFORM_WIDTH / 4, y + PLATFORM_HEIGHT / 4, PLATFORM_WIDTH / 2, PLATFORM_HEIGHT / 2)
 
 class BlockTeleport(Platform):
     def __init__(self, x, y, goX,goY):
         Platform.__init__(self, x, y)
         self.goX = goX # координаты назначения перемещения
         self.goY = goY # координаты назначения перемещения
+        self.image = self.image.copy() # рисуем анимацию в свою картинку, а не в общую из кэша
         boltAnim = []
         for anim in ANIMATION_BLOCKTELEPORT:
-            boltAnim.append((anim, 0.3))
+            boltAnim.append((assets.load_image(anim), 0.3))
         self.boltAnim = pyganim.PygAnimation(boltAnim)
         self.boltAnim.play()
+        self.boltAnim.compile()
         
     def update(self):
         self.image.fill(Color(PLATFORM_COLOR))
@@ -53,12 +82,55 @@ class BlockTeleport(Platform):
 class Princess(Platform):
     def __init__(self, x, y):
         Platform.__init__(self, x,y)
+        self.image = self.image.copy() # рисуем анимацию в свою картинку, а не в общую из кэша
         boltAnim = []
         for anim in ANIMATION_PRINCESS:
-            boltAnim.append((anim, 0.8))
+            boltAnim.append((assets.load_image(anim), 0.8))
         self.boltAnim = pyganim.PygAnimation(boltAnim)
         self.boltAnim.play()
+        self.boltAnim.compile()
         
     def update(self):
         self.image.fill(Color(PLATFORM_COLOR))
-        self.boltAnim.blit(self.image, (0, 0))
\ No newline at end of file
+        self.boltAnim.blit(self.image, (0, 0))
+
+
+def merge_cells(rows):
+    # Жадно объединяем соседние непустые клетки в максимальные прямоугольники.
+    # rows - строки тайлового слоя (content2D), пустая клетка - None.
+    # Возвращает список (x, y, ширина, высота) в тайлах.
+    height = len(rows)
+    used = [[False] * len(row) for row in rows]  # клетки, уже вошедшие в прямоугольник
+    rects = []
+    for y in range(height):
+        row = rows[y]
+        used_row = used[y]
+        width = len(row)
+        x = 0
+        while x < width:
+            if row[x] is None or used_row[x]:
+                x += 1
+                continue
+            # растягиваем вправо, пока клетки заполнены
+            x1 = x + 1
+            while x1 < width and row[x1] is not None and not used_row[x1]:
+                x1 += 1
+            # растягиваем вниз, пока вся полоса под нами заполнена
+            y1 = y + 1
+            while y1 < height and len(rows[y1]) >= x1 and \
+                    None not in rows[y1][x:x1] and True not in used[y1][x:x1]:
+                y1 += 1
+            for yy in range(y, y1):
+                used[yy][x:x1] = [True] * (x1 - x)
+            rects.append((x, y, x1 - x, y1 - y))
+            x = x1
+    return rects
+
+
+def make_bodies(rows, cls, left=0, top=0):
+    # Тела для столкновений из тайлового слоя: одно тело на прямоугольник
+    # из merge_cells вместо одного на каждый тайл.
+    # left, top - положение rows в мире, в тайлах
+    return [cls((left + x) * PLATFORM_WIDTH, (top + y) * PLATFORM_HEIGHT,
+                w * PLATFORM_WIDTH, h * PLATFORM_HEIGHT)
+            for x, y, w, h in merge_cells(rows)]
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Камера, которая следит за героем: смещение уровня относительно окна.
+# Ей пользуются окно игры и рендер кадров без окна (framebuffer.py).
+
+from pygame import Rect
+
+WIN_WIDTH = 800  # Ширина создаваемого окна
+WIN_HEIGHT = 640  # Высота
+CENTER_OF_SCREEN = WIN_WIDTH / 2, WIN_HEIGHT / 2
+
+
+class Camera(object):
+
+    def __init__(self, camera_func, width, height, left=0, top=0):
+        self.camera_func = camera_func
+        self.state = Rect(0, 0, width, height)
+        # границы уровня в пикселях: у бесконечных карт начало координат
+        # бывает отрицательным
+        self.level = Rect(left, top, width, height)
+
+    def apply(self, target):
+        return target.rect.move(self.state.topleft)
+
+    def update(self, target):
+        self.state = self.camera_func(self.state, target.rect, self.level)
+
+    def reverse(self, pos):  # получение внутренних координат из глобальных
+        return pos[0] - self.state.left, pos[1] - self.state.top
+
+
+def camera_configure(camera, target_rect, level=None):
+    l, t, _, _ = target_rect
+    _, _, w, h = camera
+    l, t = -l+WIN_WIDTH / 2, -t+WIN_HEIGHT / 2
+    if level is None:
+        level = Rect(0, 0, w, h)
+
+    # Ограничения по границам
+    l = min(-level.left, l)                  # Не движемся дальше левой
+    l = max(-(level.right-WIN_WIDTH), l)     # Не движемся дальше правой
+    t = max(-(level.bottom-WIN_HEIGHT), t)   # Не движемся дальше нижней
+    t = min(-level.top, t)                   # Не движемся дальше верхней
+
+    return Rect(l, t, w, h)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Ввод с клавиатуры: таблица клавиш действий и команд.
+#
+#   controls = Controls()  # стрелки и левый Shift
+#   controls = Controls(parse_bindings('left=a,right=d,up=w+space'))
+#   controls.commands[K_F3] = frame_profiler.toggle  # по нажатию
+#   controls.install()  # в очередь событий попадают только QUIT и KEYDOWN
+#   left, right, up, running = controls.poll()  # раз в кадр
+#   if controls.quit: ...
+#
+# Действия (ACTIONS) - клавиши, которые держат: их состояние за кадр
+# берется из pygame.key.get_pressed(), KEYUP вообще не нужен. Но клавиша,
+# которую нажали и отпустили между двумя кадрами, в get_pressed() уже
+# отпущена, поэтому KEYDOWN клавиш действий тоже засчитывается в кадр:
+# короткое нажатие прыжка на медленном кадре не теряется. Команды
+# срабатывают на KEYDOWN, клавиша ищется в словаре. Остальные события
+# (движение мыши, фокус окна и т.д.) pygame даже не кладет в очередь.
+# poll() отдает кортеж в порядке ACTIONS - то же, что пишет replay.py и
+# принимает World.step, так что ввод легко подменить записью или ботом.
+
+import pygame
+from pygame import QUIT, KEYDOWN, K_LEFT, K_RIGHT, K_UP, K_LSHIFT
+
+ACTIONS = ('left', 'right', 'up', 'running')  # порядок как у World.step
+BINDINGS = {
+    K_LEFT: 'left',
+    K_RIGHT: 'right',
+    K_UP: 'up',
+    K_LSHIFT: 'running',
+}
+EVENTS = [QUIT, KEYDOWN]  # события, которые остаются в очереди
+
+
+def key_names():
+    # {'a': K_a, 'space': K_SPACE, 'lshift': K_LSHIFT, ...}
+    return dict((name[2:].lower(), getattr(pygame, name))
+                for name in dir(pygame) if name.startswith('K_'))
+
+
+def parse_bindings(text):
+    # 'left=a,right=d,up=w+space' -> {клавиша: действие}; клавиши через
+    # '+', имена как у констант pygame без K_. Действия, которых нет в
+    # text, остаются на клавишах из BINDINGS.
+    names = key_names()
+    bindings = dict(BINDINGS)
+    for item in text.split(','):
+        action, sep, keys = item.partition('=')
+        action = action.strip()
+        if not sep or action not in ACTIONS:
+            raise ValueError(u'bad binding %r, expected action=key with '
+                             u'action one of %s' % (item, u', '.join(ACTIONS)))
+        for key, bound in bindings.items():
+            if bound == action:
+                del bindings[key]
+        for name in keys.split('+'):
+            key = names.get(name.strip().lower())
+            if key is None:
+                raise ValueError(u'unknown key %r in %r' % (name, item))
+            bindings[key] = action
+    return bindings
+
+
+class Controls(object):
+    # bindings - {клавиша: действие из ACTIONS},
+    # commands - {клавиша: функция без аргументов}, вызывается на KEYDOWN
+
+    def __init__(self, bindings=None, commands=None):
+        self.commands = {} if commands is None else dict(commands)
+        self.quit = False  # пришел QUIT
+        self.bind(BINDINGS if bindings is None else bindings)
+
+    def bind(self, bindings):
+        self.bindings = dict(bindings)
+        # [клавиши действия] по порядку ACTIONS
+        self._keys = [[key for key, bound in self.bindings.iteritems()
+                       if bound == action] for action in ACTIONS]
+        # {клавиша: номер действия в ACTIONS}
+        self._actions = dict((key, ACTIONS.index(action))
+                             for key, action in self.bindings.iteritems())
+
+    def install(self):
+        # оставить в очереди событий только EVENTS
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(EVENTS)
+
+    def poll(self):
+        # разбирает очередь событий -> (left, right, up, running)
+        commands = self.commands
+        actions = self._actions
+        down = [False] * len(ACTIONS)  # нажатые с прошлого кадра
+        for e in pygame.event.get():
+            if e.type == KEYDOWN:
+                action = actions.get(e.key)
+                if action is not None:
+                    down[action] = True
+                command = commands.get(e.key)
+                if command is not None:
+                    command()
+            elif e.type == QUIT:
+                self.quit = True
+        pressed = pygame.key.get_pressed()
+        return tuple([down[action] or any([pressed[key] for key in keys])
+                      for action, keys in enumerate(self._keys)])
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Кадры игры без окна - пиксельные наблюдения для агентов.
+#
+#   frames = framebuffer.FrameBuffer(84, 84, grayscale=True)
+#   renderer = framebuffer.FrameRenderer(frames.target())
+#   renderer.reset('levels/map_1', world)  # world - simulation.World
+#   renderer.render()                      # после каждого world.step()
+#   frames.array(0)  # numpy (84, 84) поверх тех же байт, без копирования
+#   frames.view(0)   # memoryview тех же байт, если numpy нет
+#
+# Кадр рисуется как в окне игры: слои карты, потом объекты, камера у
+# героя, в поверхность WIN_WIDTH x WIN_HEIGHT, и сразу уменьшается до
+# размера наблюдения.
+# Пиксели наблюдения лежат в bytearray, а Surface, в которую пишется
+# кадр, построена поверх него (pygame.image.frombuffer), так что array() и
+# view() ничего не копируют. pygame.surfarray.pixels3d тоже не копирует,
+# но держит Surface заблокированной, и рисовать в нее уже нельзя.
+# Цветной кадр - 4 байта на пиксель (R, G, B и пустой), array() отдает
+# первые три. Серый - байт на пиксель, яркость 0.299 R + 0.587 G + 0.114 B
+# (LUMA), у Surface серая палитра. Яркость считается явно (gray_bytes):
+# blit из 32 бит в 8 бит подбирает цвет по палитре 3-3-2 и серый портит
+# (128 -> 154).
+# Кадры нескольких сред (count) лежат в одном буфере друг за другом.
+# Буфер может лежать и в чужой памяти, например в общей mmap процессов
+# (sharedenv.py): FrameBuffer(..., memory=m, offset=n).
+
+import ctypes
+
+import pygame
+
+import assets
+import helperspygame
+import simulation
+from camera import WIN_WIDTH, WIN_HEIGHT, CENTER_OF_SCREEN
+from camera import Camera, camera_configure
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # кадры доступны только через view()
+
+BACKGROUND_COLOR = (0, 0, 0)
+GRAY_PALETTE = [(i, i, i) for i in range(256)]
+LUMA = (299, 587, 114)  # вес R, G, B в яркости, тысячные (BT.601)
+# то же таблицами для подсчета без numpy, с округлением
+_LUMA_TABLES = [[value * weight + (500 if channel == 0 else 0)
+                 for value in range(256)]
+                for channel, weight in enumerate(LUMA)]
+
+_layers = {}  # {уровень: слои карты}, тайлы режутся один раз на процесс
+
+
+def level_layers(level):
+    # слои карты для рендера, тайлы - subsurface общих тайлсетов, как в
+    # loadLevel; карта своя, у simulation.load_level она общая с World
+    if level not in _layers:
+        resources = helperspygame.ResourceLoaderPygame(assets.load_image,
+                                                       use_subsurfaces=True)
+        resources.load(simulation.load_map(simulation.level_file(level)))
+        _layers[level] = helperspygame.get_layers_from_map(resources)
+    return _layers[level]
+
+
+def gray_bytes(surface):
+    # яркость каждого пикселя Surface, байт на пиксель по строкам
+    rgb = pygame.image.tostring(surface, 'RGB')
+    if numpy is not None:
+        pixels = numpy.frombuffer(rgb, numpy.uint8).reshape(-1, 3)
+        luma = (pixels.astype(numpy.uint32) * LUMA).sum(1)
+        return ((luma + 500) // 1000).astype(numpy.uint8).tostring()
+    red, green, blue = _LUMA_TABLES
+    rgb = bytearray(rgb)
+    return str(bytearray([(red[r] + green[g] + blue[b]) // 1000
+                          for r, g, b in zip(rgb[0::3], rgb[1::3],
+                                             rgb[2::3])]))
+
+
+def blit_gray(source, target):
+    # source (32 бита) -> яркость в 8-битную target с серой палитрой;
+    # палитры одинаковые, поэтому blit копирует байты как есть
+    gray = pygame.image.fromstring(gray_bytes(source), source.get_size(), 'P')
+    gray.set_palette(GRAY_PALETTE)
+    target.blit(gray, (0, 0))
+
+
+class FrameBuffer(object):
+    # count кадров width x height подряд в одном bytearray или, если
+    # задана memory (mmap), в ней начиная с offset
+
+    def __init__(self, width, height, grayscale=False, count=1, memory=None,
+                 offset=0):
+        self.width = width
+        self.height = height
+        self.grayscale = grayscale
+        self.count = count
+        self.frame_bytes = width * height * (1 if grayscale else 4)
+        length = self.frame_bytes * count
+        if memory is None:
+            self.buffer = pixels = bytearray(length)
+        else:
+            self.buffer = (ctypes.c_ubyte * length).from_buffer(memory, offset)
+            # frombuffer в Python 2 понимает только старый интерфейс буфера
+            pixels = buffer(memory, offset, length)
+        size = (width, height * count)
+        if grayscale:
+            if not pygame.display.get_init():
+                pygame.display.init()  # без него палитру не задать
+            self.surface = pygame.image.frombuffer(pixels, size, 'P')
+            self.surface.set_palette(GRAY_PALETTE)
+        else:
+            self.surface = pygame.image.frombuffer(pixels, size, 'RGBX')
+        self._targets = [self.surface.subsurface((0, i * height,
+                                                  width, height))
+                         for i in xrange(count)]
+
+    def target(self, index=0):
+        # Surface кадра index, пишет прямо в buffer
+        return self._targets[index]
+
+    def view(self, index=None):
+        # байты кадра index (без index - всех кадров), без копирования
+        view = memoryview(self.buffer)
+        if index is None:
+            return view
+        return view[index * self.frame_bytes:(index + 1) * self.frame_bytes]
+
+    def array(self, index=None):
+        # numpy массив поверх buffer: (высота, ширина, 3), у серых кадров
+        # (высота, ширина); без index - все кадры, первая ось - count
+        if numpy is None:
+            raise ImportError(u'numpy is required for array(), use view()')
+        pixels = numpy.frombuffer(self.buffer, numpy.uint8)
+        if self.grayscale:
+            pixels = pixels.reshape(self.count, self.height, self.width)
+        else:
+            pixels = pixels.reshape(self.count, self.height, self.width,
+                                    4)[..., :3]
+        return pixels if index is None else pixels[index]
+
+    def frame(self, index=None):
+        # array(), если есть numpy, иначе view()
+        if numpy is None:
+            return self.view(index)
+        return self.array(index)
+
+
+class FrameRenderer(object):
+    # Рисует уровень в target так, как его видно в окне игры.
+    # smooth - уменьшать с усреднением (smoothscale), а не через пиксель.
+
+    def __init__(self, target, smooth=True):
+        self.target = target
+        self.smooth = smooth
+        self.renderer = helperspygame.RendererPygame()
+        self.world = None
+        self.layers = None
+        self.camera = None
+        size = target.get_size()
+        full = (WIN_WIDTH, WIN_HEIGHT)
+        if target.get_bitsize() == 8:  # серый: рисуем и уменьшаем в 32 бита
+            self._frame = pygame.Surface(full, 0, 32)
+            self._scaled = self._frame
+            if size != full:
+                self._scaled = pygame.Surface(size, 0, 32)
+        elif size == full:  # рисуем сразу в target
+            self._frame = self._scaled = target
+        else:
+            # scale копирует пиксели как есть, формат должен совпадать
+            self._frame = pygame.Surface(full, 0, target)
+            self._scaled = target
+
+    def set_target(self, target):
+        # рисовать в другой Surface того же размера и формата, например в
+        # следующий слот кольца sharedenv
+        if self._frame is self.target:
+            self._frame = target
+        if self._scaled is self.target:
+            self._scaled = target
+        self.target = target
+
+    def reset(self, level, world):
+        # новый уровень или эпизод: world - simulation.World с героем
+        self.world = world
+        self.layers = level_layers(level)
+        self.camera = Camera(camera_configure, world.width, world.height)
+
+    def render(self):
+        # кадр текущего состояния мира в target
+        camera = self.camera
+        camera.update(self.world.hero)
+        center_offset = camera.reverse(CENTER_OF_SCREEN)
+        self.renderer.set_camera_position_and_size(center_offset[0],
+                                                   center_offset[1],
+                                                   WIN_WIDTH, WIN_HEIGHT,
+                                                   "center")
+        frame = self._frame
+        frame.fill(BACKGROUND_COLOR)
+        for sprite_layer in self.layers:
+            if not sprite_layer.is_object_group:
+                self.renderer.render_layer(frame, sprite_layer)
+        for e in self.world.entities:
+            frame.blit(e.image, camera.apply(e))
+        if self._scaled is not frame:
+            if self.smooth:
+                pygame.transform.smoothscale(frame, self._scaled.get_size(),
+                                             self._scaled)
+            else:
+                pygame.transform.scale(frame, self._scaled.get_size(),
+                                       self._scaled)
+        if self._scaled is not self.target:
+            blit_gray(self._scaled, self.target)
+        return self.target
@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Среда для обучения агентов в стиле gym, без окна и без рендера.
+#
+#   env = gameenv.GameEnv('levels/map_1')
+#   obs = env.reset()
+#   obs, reward, done, info = env.step(replay.RIGHT | replay.UP)
+#
+#   envs = gameenv.VectorEnv(64, ['levels/map_1', 'levels/map_2'])
+#   obs = envs.reset()
+#   obs, rewards, dones, infos = envs.step([replay.RIGHT] * 64)
+#
+# Действие - биты клавиш из replay.py (LEFT, RIGHT, UP, RUNNING), то есть
+# число 0..15, или кортеж (left, right, up, running), как в Player.update.
+# Наблюдение: позиция и скорость героя, onGround, клетки вокруг героя
+# (коды EMPTY...PRINCESS, строки сверху вниз) и монстры рядом с ним (dx, dy в
+# пикселях, ближние первыми).
+# Награда - продвижение вправо дальше прежнего рекорда, в тайлах, минус
+# DEATH_PENALTY за смерть и плюс WIN_REWARD за принцессу.
+# VectorEnv шагает K независимых сред за один вызов и пишет наблюдения в
+# общие array/bytearray, без словаря на каждую среду.
+# С frame_size=(ширина, высота) в наблюдении есть и кадр игры
+# (framebuffer.py): numpy массив, или memoryview, если numpy нет, поверх
+# буфера, в который кадр рисуется, без копирования. grayscale=True - байт
+# на пиксель вместо RGB. У VectorEnv кадры всех сред лежат в одном
+# буфере: observation['frame'] - (K, высота, ширина[, 3]).
+#
+#   env = gameenv.GameEnv('levels/map_1', frame_size=(84, 84),
+#                         grayscale=True)
+#   obs = env.reset()   # obs['frame'] - numpy (84, 84)
+
+import sys
+from array import array
+
+import simulation
+import replay
+import framebuffer
+from blocks import PLATFORM_WIDTH, PLATFORM_HEIGHT, BlockTeleport, Princess
+
+DEFAULT_LEVEL = 'levels/map_1'
+MAX_STEPS = 60 * 60 * 2  # две минуты игры на эпизод
+VIEW_RADIUS = 5  # клеток вокруг героя в наблюдении: (2 * R + 1) ** 2
+DEATH_PENALTY = 1.0
+WIN_REWARD = 10.0
+ACTIONS = 16  # все сочетания четырех клавиш
+
+# коды клеток в наблюдении
+EMPTY = 0
+SOLID = 1  # платформа или край карты
+DIE = 2
+TELEPORT = 3
+PRINCESS = 4
+
+_grids = {}  # {(уровень, радиус): (сетка, ширина строки)}
+
+
+def _tile_codes(layer, code, grid, stride, radius):
+    # непустые клетки тайлового слоя -> code в сетке с рамкой radius
+    width = layer.width
+    gids = layer.decoded_content
+    for y in xrange(layer.height):
+        start = (y + radius) * stride + radius
+        row = gids[y * width:(y + 1) * width]
+        for x in xrange(width):
+            if row[x]:
+                grid[start + x] = code
+
+
+def level_grid(level, radius=VIEW_RADIUS):
+    # Коды клеток уровня одной строкой байт, с рамкой SOLID шириной radius,
+    # чтобы окно вокруг героя у края карты не выходило за сетку.
+    # Монстры двигаются, в сетку они не попадают.
+    key = (level, radius)
+    if key not in _grids:
+        world_map = simulation.load_level(level)
+        stride = world_map.width + 2 * radius
+        grid = bytearray(chr(SOLID) * (stride *
+                                       (world_map.height + 2 * radius)))
+        for y in xrange(world_map.height):
+            start = (y + radius) * stride + radius
+            grid[start:start + world_map.width] = chr(EMPTY) * world_map.width
+        layers = world_map.layers
+        _tile_codes(layers[simulation.PLATFORMS_LAYER], SOLID, grid, stride,
+                    radius)
+        _tile_codes(layers[simulation.DIE_BLOCKS_LAYER], DIE, grid, stride,
+                    radius)
+        _grids[key] = (grid, stride)
+    return _grids[key]
+
+
+def keys(action):
+    # действие -> (left, right, up, running)
+    if isinstance(action, tuple):
+        return action
+    return replay.unpack(action)
+
+
+class GameEnv(object):
+
+    def __init__(self, level=DEFAULT_LEVEL, max_steps=MAX_STEPS,
+                 view_radius=VIEW_RADIUS, frame_size=None, grayscale=False):
+        import player
+        player.DIE_DELAY = 0  # без паузы после смерти героя
+        self.level = level
+        self.max_steps = max_steps
+        self.view_radius = view_radius
+        self.side = 2 * view_radius + 1
+        self.world = None
+        self.hero = None
+        self.steps = 0
+        self.done = True
+        self._grid = None
+        self._stride = 0
+        self._best_x = 0
+        self.frames = None  # framebuffer.FrameBuffer, если нужны кадры
+        self.frame_index = 0
+        self.renderer = None
+        if frame_size is not None:
+            self.attach_frames(framebuffer.FrameBuffer(
+                frame_size[0], frame_size[1], grayscale))
+
+    def attach_frames(self, frames, index=0):
+        # рисовать кадр в frames.target(index) при каждом наблюдении
+        self.frames = frames
+        self.frame_index = index
+        self.renderer = framebuffer.FrameRenderer(frames.target(index))
+        if self.world is not None:
+            self.renderer.reset(self.level, self.world)
+
+    def reset(self, level=None):
+        # новый эпизод, можно на другом уровне; возвращает наблюдение
+        if level is not None:
+            self.level = level
+        world_map = simulation.load_level(self.level)
+        self.world = simulation.World(world_map)
+        self.hero = self.world.spawn_hero()
+        if self.renderer is not None:
+            self.renderer.reset(self.level, self.world)
+        grid, self._stride = level_grid(self.level, self.view_radius)
+        # телепорты и принцессы стоят на месте, их кладем в копию сетки
+        self._grid = bytearray(grid)
+        for obj in self.world.objects:
+            if isinstance(obj, BlockTeleport):
+                self._mark(obj.rect, TELEPORT)
+            elif isinstance(obj, Princess):
+                self._mark(obj.rect, PRINCESS)
+        self.steps = 0
+        self.done = False
+        self._best_x = self.hero.rect.x
+        return self.observe()
+
+    def _mark(self, rect, code):
+        world_map = self.world.world_map
+        x = rect.x // PLATFORM_WIDTH
+        y = rect.y // PLATFORM_HEIGHT
+        if 0 <= x < world_map.width and 0 <= y < world_map.height:
+            radius = self.view_radius
+            self._grid[(y + radius) * self._stride + x + radius] = code
+
+    def step(self, action):
+        # -> (наблюдение, награда, эпизод закончен, info)
+        reward = self._advance(action)
+        return self.observe(), reward, self.done, self.info()
+
+    def _advance(self, action):
+        # один кадр симуляции, возвращает награду
+        if self.done:
+            raise ValueError(u'episode is over, call reset()')
+        hero = self.hero
+        deaths = hero.deaths
+        left, right, up, running = keys(action)
+        # анимация телепортов и принцесс видна только на кадрах
+        self.world.step(left, right, up, running,
+                        animate=self.renderer is not None)
+        self.steps += 1
+        reward = 0.0
+        if hero.rect.x > self._best_x:
+            reward = float(hero.rect.x - self._best_x) / PLATFORM_WIDTH
+            self._best_x = hero.rect.x
+        if hero.deaths != deaths:
+            reward -= DEATH_PENALTY
+        if hero.winner:
+            reward += WIN_REWARD
+        self.done = hero.winner or self.steps >= self.max_steps
+        return reward
+
+    def info(self):
+        return {'completed': self.hero.winner, 'deaths': self.hero.deaths,
+                'steps': self.steps}
+
+    def observe(self):
+        hero = self.hero
+        observation = {
+            'position': (hero.rect.x, hero.rect.y),
+            'velocity': (hero.xvel, hero.yvel),
+            'onGround': hero.onGround,
+            'tiles': self.tiles(),
+            'monsters': self.monsters(),
+        }
+        if self.renderer is not None:
+            observation['frame'] = self.frame()
+        return observation
+
+    def frame(self):
+        # рисует текущее состояние и отдает кадр поверх буфера: следующий
+        # шаг перепишет его, копию нужно делать самому
+        self.renderer.render()
+        return self.frames.frame(self.frame_index)
+
+    def tiles(self, out=None, offset=0):
+        # клетки вокруг героя, side * side байт по строкам сверху вниз;
+        # пишет в out с offset, если он задан
+        side = self.side
+        if out is None:
+            out = bytearray(side * side)
+        rect = self.hero.rect
+        world_map = self.world.world_map
+        # в сетке есть рамка radius, так что левый верхний угол окна в
+        # координатах сетки совпадает с клеткой героя
+        tx = min(max(rect.centerx // PLATFORM_WIDTH, 0), world_map.width - 1)
+        ty = min(max(rect.centery // PLATFORM_HEIGHT, 0),
+                 world_map.height - 1)
+        grid = self._grid
+        stride = self._stride
+        start = ty * stride + tx
+        for row in xrange(side):
+            out[offset:offset + side] = grid[start:start + side]
+            offset += side
+            start += stride
+        return out
+
+    def monsters(self):
+        # монстры в окне наблюдения: [(dx, dy)] от героя, ближние первыми
+        rect = self.hero.rect
+        reach_x = (self.view_radius + 1) * PLATFORM_WIDTH
+        reach_y = (self.view_radius + 1) * PLATFORM_HEIGHT
+        near = []
+        for monster in self.world.monsters:
+            dx = monster.rect.x - rect.x
+            dy = monster.rect.y - rect.y
+            if -reach_x <= dx <= reach_x and -reach_y <= dy <= reach_y:
+                near.append((dx * dx + dy * dy, (dx, dy)))
+        near.sort()
+        return [offset for distance, offset in near]
+
+
+class VectorEnv(object):
+    # K независимых GameEnv, шаг всех за один вызов. Законченные эпизоды
+    # сразу начинаются заново, их итог - в infos[i].
+    # Наблюдения лежат в общих массивах, которые переписываются на каждом
+    # шаге: positions и velocities - по два числа на среду (x, y),
+    # on_ground - байт на среду, tiles - side * side байт на среду,
+    # frames - кадры всех сред в одном framebuffer.FrameBuffer.
+
+    def __init__(self, count, levels=(DEFAULT_LEVEL,), max_steps=MAX_STEPS,
+                 view_radius=VIEW_RADIUS, frame_size=None, grayscale=False):
+        if isinstance(levels, basestring):
+            levels = [levels]
+        self.count = count
+        self.envs = [GameEnv(levels[i % len(levels)], max_steps, view_radius)
+                     for i in xrange(count)]
+        self.side = 2 * view_radius + 1
+        self.positions = array('i', [0]) * (2 * count)
+        self.velocities = array('d', [0.0]) * (2 * count)
+        self.on_ground = bytearray(count)
+        self.tiles = bytearray(count * self.side * self.side)
+        self.monsters = [[] for i in xrange(count)]
+        self.rewards = array('d', [0.0]) * count
+        self.dones = bytearray(count)
+        self.observation = {
+            'position': self.positions,
+            'velocity': self.velocities,
+            'onGround': self.on_ground,
+            'tiles': self.tiles,
+            'monsters': self.monsters,
+        }
+        self.frames = None
+        if frame_size is not None:
+            self.frames = framebuffer.FrameBuffer(frame_size[0], frame_size[1],
+                                                  grayscale, count)
+            for i, env in enumerate(self.envs):
+                env.attach_frames(self.frames, i)
+            self.observation['frame'] = self.frames.frame()
+
+    def reset(self, levels=None):
+        for i, env in enumerate(self.envs):
+            env.reset(levels[i % len(levels)] if levels else None)
+            self._write(i, env)
+        return self.observation
+
+    def step(self, actions):
+        # actions - K действий; -> (наблюдения, награды, закончены, infos)
+        infos = [None] * self.count
+        rewards = self.rewards
+        dones = self.dones
+        for i, env in enumerate(self.envs):
+            rewards[i] = env._advance(actions[i])
+            dones[i] = env.done
+            if env.done:
+                infos[i] = env.info()
+                env.reset()
+            self._write(i, env)
+        return self.observation, rewards, dones, infos
+
+    def _write(self, i, env):
+        hero = env.hero
+        self.positions[2 * i] = hero.rect.x
+        self.positions[2 * i + 1] = hero.rect.y
+        self.velocities[2 * i] = hero.xvel
+        self.velocities[2 * i + 1] = hero.yvel
+        self.on_ground[i] = hero.onGround
+        env.tiles(self.tiles, i * self.side * self.side)
+        self.monsters[i] = env.monsters()
+        if env.renderer is not None:
+            env.renderer.render()
+
+
+def main(argv=None):
+    # замер скорости: python gameenv.py [сред] [шагов] [ширина высота]
+    # с размером кадра замеряется и рендер наблюдений
+    import random
+    from timeit import default_timer
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 16
+    steps = int(argv[1]) if len(argv) > 1 else 2000
+    frame_size = None
+    if len(argv) > 3:
+        frame_size = (int(argv[2]), int(argv[3]))
+    envs = VectorEnv(count, ['levels/map_%d' % lvl for lvl in range(1, 4)],
+                     frame_size=frame_size)
+    envs.reset()
+    rnd = random.Random(1)
+    actions = [rnd.randrange(ACTIONS) for i in xrange(count)]
+    start = default_timer()
+    for step in xrange(steps):
+        if step % 20 == 0:
+            actions = [rnd.randrange(ACTIONS) for i in xrange(count)]
+        envs.step(actions)
+    seconds = default_timer() - start
+    line = u"%d сред x %d шагов: %.2f с, %.0f шагов/с" % (
+        count, steps, seconds, count * steps / seconds)
+    print(line.encode('utf-8'))  # utf-8 и в pipe, где по умолчанию ascii
+
+
+if __name__ == "__main__":
+    main()
@@ -39,6 +39,8 @@ __author__ = u'DR0ID @ 2009-2011'
 
 #  -----------------------------------------------------------------------------
 
+import os
+import sys
 from math import ceil
 
 import pygame
@@ -47,6 +49,133 @@ import tmxreader
 
 #  -----------------------------------------------------------------------------
 
+class TilesetCache(object):
+    """
+    Process-lifetime cache of sliced tileset images, shared by the
+    ResourceLoaderPygame instances. A tileset is identified by the absolute
+    path and the mtime of its image and by the slicing parameters, so a
+    changed file is sliced again.
+
+    Every loader acquires the tilesets it uses and gives them back with
+    ResourceLoaderPygame.release(). Unused tilesets stay cached until they
+    are evicted explicitly with evict().
+
+
+    Example::
+
+        res_loader = ResourceLoaderPygame(tileset_cache=TILESET_CACHE)
+        res_loader.load(tile_map)
+        ...
+        # level switch
+        new_loader.load(new_tile_map) # reuses the tiles of res_loader
+        res_loader.release()
+        TILESET_CACHE.evict()
+
+    """
+
+    def __init__(self):
+        self._entries = {} # {key: [images, refcount]}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @staticmethod
+    def make_key(filename, *params):
+        """
+        Creates the key of a tileset.
+
+        :Parameters:
+            filename : string
+                path of the tileset image
+            params : hashables
+                the slicing parameters
+
+        :Returns: the key or None if the file can not be found
+        """
+        filename = os.path.normcase(os.path.abspath(filename))
+        try:
+            mtime = os.path.getmtime(filename)
+        except os.error:
+            return None
+        return (filename, mtime) + params
+
+    def acquire(self, key, create):
+        """
+        Returns the images of a tileset and increments its reference count.
+
+        :Parameters:
+            key : tuple
+                key created by make_key
+            create : function
+                called without arguments to create the images if they are
+                not cached yet
+
+        :Returns: list of images
+        """
+        entry = self._entries.get(key, None)
+        if entry is None:
+            self.misses += 1
+            entry = [create(), 0]
+            self._entries[key] = entry
+        else:
+            self.hits += 1
+        entry[1] += 1
+        return entry[0]
+
+    def release(self, key):
+        """
+        Decrements the reference count of a tileset, the images stay cached.
+        """
+        entry = self._entries.get(key, None)
+        if entry is not None and entry[1] > 0:
+            entry[1] -= 1
+
+    def get_ref_count(self, key):
+        """
+        :Returns: the reference count of a tileset, 0 if not cached
+        """
+        entry = self._entries.get(key, None)
+        if entry is None:
+            return 0
+        return entry[1]
+
+    def evict(self, key=None):
+        """
+        Removes the tilesets nobody has acquired.
+
+        :Parameters:
+            key : tuple
+                Optional, if set only this tileset is removed (if unused).
+
+        :Returns: number of removed tilesets
+        """
+        if key is not None:
+            keys = [key]
+        else:
+            keys = list(self._entries)
+        count = 0
+        for key in keys:
+            entry = self._entries.get(key, None)
+            if entry is not None and entry[1] == 0:
+                del self._entries[key]
+                count += 1
+        return count
+
+    def clear(self):
+        """
+        Removes all tilesets, even the used ones. The loaders keep their
+        images, but they are not shared anymore.
+        """
+        self._entries.clear()
+
+# the cache shared by all ResourceLoaderPygame instances by default
+TILESET_CACHE = TilesetCache()
+
 #  -----------------------------------------------------------------------------
 
 class ResourceLoaderPygame(tmxreader.AbstractResourceLoader):
@@ -63,29 +192,124 @@ class ResourceLoaderPygame(tmxreader.AbstractResourceLoader):
 
     """
 
-    def __init__(self):
+    def __init__(self, image_loader=pygame.image.load, use_subsurfaces=False, \
+                                                tileset_cache=TILESET_CACHE):
+        """
+        :Parameters:
+            image_loader : function
+                Optional, loads a image file, defaults to pygame.image.load.
+                Can be used to share already loaded images.
+            use_subsurfaces : bool
+                Optional, defaults to False. If True the tiles of a tileset
+                are subsurfaces of the tileset image instead of copies, so
+                the pixels are held only once and slicing costs nearly
+                nothing. The tiles then use the format of the tileset image,
+                convert it before loading to get fast blits.
+            tileset_cache : TilesetCache
+                Optional, defaults to TILESET_CACHE. The sliced tilesets are
+                shared through it with other loaders, None disables it.
+        """
         tmxreader.AbstractResourceLoader.__init__(self)
+        self._image_loader = image_loader
+        self.use_subsurfaces = use_subsurfaces
+        self.tileset_cache = tileset_cache
+        self._tileset_keys = [] # acquired from tileset_cache
+
+    def release(self):
+        """
+        Gives the tilesets back to the tileset cache, so they can be evicted
+        when no other loader uses them.
+        """
+        for key in self._tileset_keys:
+            self.tileset_cache.release(key)
+        self._tileset_keys = []
 
     def load(self, tile_map):
         tmxreader.AbstractResourceLoader.load(self, tile_map)
         # delete the original images from memory, they are all saved as tiles
         self._img_cache.clear()
         # ISSUE 17: flipped tiles
+        # only the unique gids of each layer are looked at, set() collects
+        # them without a python loop over the cells; the flipped images are
+        # created on first use by get_tile
+        flip_mask = self.FLIP_X | self.FLIP_Y
+        self.flipped_gids = set()
         for layer in self.world_map.layers:
-            if not layer.is_object_group:
-                for gid in layer.decoded_content:
-                    if gid not in self.indexed_tiles:
-                        if gid & self.FLIP_X or gid & self.FLIP_Y:
-                            image_gid = gid & ~(self.FLIP_X | self.FLIP_Y)
-                            offx, offy, img = self.indexed_tiles[image_gid]
-                            img = img.copy()
-                            img = pygame.transform.flip(img, \
-                                                    bool(gid & self.FLIP_X), \
-                                                    bool(gid & self.FLIP_Y))
-                            self.indexed_tiles[gid] = (offx, offy, img)
+            if not layer.is_object_group and layer.decoded_content and \
+                                    self._has_flip_flags(layer.decoded_content):
+                self.flipped_gids.update(gid for gid in \
+                        set(layer.decoded_content) if gid & flip_mask)
+        for gid in self.flipped_gids:
+            if gid & ~flip_mask not in self.indexed_tiles:
+                raise Exception(u'no tile for flipped gid %d (gid %d)' % \
+                                                    (gid, gid & ~flip_mask))
+
+    @staticmethod
+    def _has_flip_flags(gids):
+        """
+        Checks if any gid of an array('I') has flip flags. The flags are in
+        the most significant byte, so only those bytes are compared.
+        """
+        if gids.itemsize != 4:
+            return True
+        data = gids.tostring()
+        if sys.byteorder == 'little':
+            high_bytes = data[3::4]
+        else:
+            high_bytes = data[0::4]
+        return high_bytes.count('\0') != len(high_bytes)
+
+    def get_tile(self, gid):
+        """
+        Returns the tile of a gid, flipped tiles are created on the first
+        request and cached in indexed_tiles.
+
+        :Parameters:
+            gid : int
+                the gid including the flip flags
+
+        :Returns: (offsetx, offsety, image)
+        """
+        tile = self.indexed_tiles.get(gid, None)
+        if tile is None:
+            tile = self._flip_tile(gid)
+        return tile
+
+    def _flip_tile(self, gid):
+        """
+        Creates the flipped tile for a gid with flip flags and saves it in
+        indexed_tiles.
+        """
+        image_gid = gid & ~(self.FLIP_X | self.FLIP_Y)
+        offx, offy, img = self.indexed_tiles[image_gid]
+        img = img.copy()
+        img = pygame.transform.flip(img, bool(gid & self.FLIP_X), \
+                                         bool(gid & self.FLIP_Y))
+        self.indexed_tiles[gid] = (offx, offy, img)
+        return self.indexed_tiles[gid]
 
     def _load_image_parts(self, filename, margin, spacing, \
                           tile_width, tile_height, colorkey=None): #-> [images]
+        key = None
+        if self.tileset_cache is not None and \
+                                        isinstance(filename, basestring):
+            key = self.tileset_cache.make_key(filename, margin, spacing, \
+                            tile_width, tile_height, colorkey, \
+                            self.use_subsurfaces, self._image_loader)
+        if key is None:
+            return self._slice_image(filename, margin, spacing, \
+                                     tile_width, tile_height, colorkey)
+        images = self.tileset_cache.acquire(key, lambda: \
+                        self._slice_image(filename, margin, spacing, \
+                                          tile_width, tile_height, colorkey))
+        self._tileset_keys.append(key)
+        return list(images)
+
+    def _slice_image(self, filename, margin, spacing, \
+                          tile_width, tile_height, colorkey=None): #-> [images]
+        """
+        Cuts a tileset image into tiles.
+        """
         source_img = self._load_image(filename, colorkey)
         width, height = source_img.get_size()
         # ISSUE 16
@@ -97,11 +321,27 @@ class ResourceLoaderPygame(tmxreader.AbstractResourceLoader):
         images = []
         for ypos in xrange(margin, height, tile_height + spacing):
             for xpos in xrange(margin, width, tile_width + spacing):
-                img_part = self._load_image_part(filename, xpos, ypos, \
+                img_part = None
+                if self.use_subsurfaces:
+                    img_part = self._load_image_part_view(source_img, \
+                                            xpos, ypos, tile_width, tile_height)
+                if img_part is None:
+                    img_part = self._load_image_part(filename, xpos, ypos, \
                                             tile_width, tile_height, colorkey)
                 images.append(img_part)
         return images
 
+    def _load_image_part_view(self, source_img, xpos, ypos, width, height):
+        """
+        Returns a tile of a sprite sheet as subsurface, it shares the pixels
+        and the colorkey with the sprite sheet. Returns None if the tile is
+        not completely inside the sprite sheet (margin and spacing).
+        """
+        source_rect = pygame.Rect(xpos, ypos, width, height)
+        if not source_img.get_rect().contains(source_rect):
+            return None
+        return source_img.subsurface(source_rect)
+
     def _load_image_part(self, filename, xpos, ypos, width, height, \
                                                                 colorkey=None):
         """
@@ -134,7 +374,7 @@ class ResourceLoaderPygame(tmxreader.AbstractResourceLoader):
     def _load_image(self, filename, colorkey=None):
         img = self._img_cache.get(filename, None)
         if img is None:
-            img = pygame.image.load(filename)
+            img = self._image_loader(filename)
             self._img_cache[filename] = img
         if colorkey:
             img.set_colorkey(colorkey, pygame.RLEACCEL)
@@ -199,6 +439,40 @@ class SpriteLayer(object):
             else:
                 return self.rect.bottom
 
+    class FlippedSprite(Sprite):
+        """
+        A Sprite showing a flipped tile. The flipped image is created by the
+        resource loader when the sprite is drawn the first time (ISSUE 17).
+
+        """
+        def __init__(self, resource_loader, gid, rect, key=None):
+            """
+            Constructor.
+            :Parameters:
+                resource_loader : ResourceLoaderPygame
+                    the resource loader which creates the flipped image
+                gid : int
+                    the gid including the flip flags
+                rect : pygame.Rect
+                    the rect used when drawing
+                key : any
+                    used internally for collapsing sprites
+
+            """
+            self._resource_loader = resource_loader
+            self._gid = gid
+            SpriteLayer.Sprite.__init__(self, None, rect, key=key)
+
+        def _get_image(self):
+            if self._image is None:
+                self._image = self._resource_loader.get_tile(self._gid)[2]
+            return self._image
+
+        def _set_image(self, image):
+            self._image = image
+
+        image = property(_get_image, _set_image)
+
     def __init__(self, tile_layer_idx, resource_loader):
         """
 
@@ -238,6 +512,9 @@ class SpriteLayer(object):
         self.visible = _layer.visible
         self.bottom_margin = 0
         self._bottom_margin = 0
+        # tile position of content2D[0][0], only ChunkedSpriteLayer moves it
+        self.origin_x = 0
+        self.origin_y = 0
 
 
         # init data to default
@@ -251,29 +528,45 @@ class SpriteLayer(object):
             self.content2D[ypos] = [None] * self.num_tiles_x
 
         # fill them
-        _img_cache = {}
-        _img_cache["hits"] = 0
-        for ypos_new in xrange(0, self.num_tiles_y):
-            for xpos_new in xrange(0, self.num_tiles_x):
-                coords = self._get_list_of_neighbour_coord(xpos_new, ypos_new, \
-                                        1, self.num_tiles_x, self.num_tiles_y)
-                if coords:
-                    key, sprites = SpriteLayer._get_sprites_fromt_tiled_layer(\
-                            coords, _layer, self._resource_loader.indexed_tiles)
+        # on level 1 every sprite is a single tile, so only the used tiles
+        # need a sprite and there is nothing to union
+        indexed_tiles = self._resource_loader.indexed_tiles
+        tile_w = _layer.tilewidth
+        tile_h = _layer.tileheight
+        for xpos, column in enumerate(_layer.content2D[:self.num_tiles_x]):
+            for ypos, idx in enumerate(column[:self.num_tiles_y]):
+                if idx:
+                    tile = indexed_tiles.get(idx, None)
+                    if tile is None:
+                        self.content2D[ypos][xpos], h = \
+                                self._flipped_sprite(idx, xpos * tile_w, \
+                                                          ypos * tile_h)
+                    else:
+                        offx, offy, img = tile
+                        w, h = img.get_size()
+                        rect = pygame.Rect(xpos * tile_w + offx, \
+                                           ypos * tile_h + offy, w, h)
+                        self.content2D[ypos][xpos] = \
+                                    SpriteLayer.Sprite(img, rect, key=(idx,))
+                    if h > self._bottom_margin:
+                        self._bottom_margin = h
+        self.bottom_margin = self._bottom_margin
 
-                    sprite = None
-                    if sprites:
-                        sprite = SpriteLayer._union_sprites(sprites, key, \
-                                                                    _img_cache)
-                        if sprite.rect.height > self._bottom_margin:
-                            self._bottom_margin = sprite.rect.height
+    def _flipped_sprite(self, gid, world_x, world_y):
+        """
+        Creates a FlippedSprite for a gid with flip flags. The flipped image
+        has the size and offset of the unflipped tile, so it is not needed
+        yet.
 
-                    self.content2D[ypos_new][xpos_new] = sprite
-        self.bottom_margin = self._bottom_margin
-        if __debug__:
-            print '%s: Sprite Cache hits: %d' % \
-                                (self.__class__.__name__, _img_cache["hits"])
-        del _img_cache
+        :Returns: (sprite, height)
+        """
+        resource_loader = self._resource_loader
+        image_gid = gid & ~(resource_loader.FLIP_X | resource_loader.FLIP_Y)
+        offx, offy, img = resource_loader.indexed_tiles[image_gid]
+        w, h = img.get_size()
+        rect = pygame.Rect(world_x + offx, world_y + offy, w, h)
+        return SpriteLayer.FlippedSprite(resource_loader, gid, rect, \
+                                                        key=(gid,)), h
 
     def get_collapse_level(self):
         """
@@ -474,7 +767,6 @@ class SpriteLayer(object):
 
         # fill them
         _img_cache = {}
-        _img_cache["hits"] = 0
         for ypos_new in xrange(0, new_num_tiles_y):
             for xpos_new in xrange(0, new_num_tiles_x):
                 coords = SpriteLayer._get_list_of_neighbour_coord(\
@@ -499,8 +791,6 @@ class SpriteLayer(object):
         # HACK:
         new_layer._level = layer._level * 2
 
-        if __debug__ and level > 1:
-            print '%s: Sprite Cache hits: %d' % ("collapse", _img_cache["hits"])
         return new_layer
 
     @staticmethod
@@ -552,7 +842,6 @@ class SpriteLayer(object):
 
         # dont copy to a new image if only one sprite is in sprites
         # (reduce memory usage)
-        # NOTE: this messes up the cache hits (only on non-collapsed maps)
         if len(sprites) == 1:
             sprite = sprites[0]
             sprite.key = key
@@ -564,7 +853,6 @@ class SpriteLayer(object):
         # cache the images to save memory
         if key in _img_cache:
             image = _img_cache[key]
-            _img_cache["hits"] = _img_cache["hits"] + 1
         else:
             # make new image
             image = pygame.Surface(rect.size, pygame.SRCALPHA | pygame.RLEACCEL)
@@ -577,47 +865,6 @@ class SpriteLayer(object):
 
         return SpriteLayer.Sprite(image, rect, key=key)
 
-    @staticmethod
-    def _get_sprites_fromt_tiled_layer(coords, layer, indexed_tiles):
-        """
-        Get the sprites at the given coordinates from a tiled layer.
-
-        :Parameters:
-            coords : list
-                list of coordinates tuples
-            layer : TiledLayer
-                layer to extract the sprites from
-            indexed_tiles : dict
-                indexed tiles list loaded by the resource loader.
-
-        :Returns:
-            (keys, sprites) the new keys and sprites
-
-        """
-        sprites = []
-        key = []
-        for xpos, ypos in coords:
-            ## ISSUE 14: maps was displayed only sqared because wrong
-            ## boundary checks
-            if xpos >= len(layer.content2D) or \
-                                ypos >= len(layer.content2D[xpos]):
-                # print "CONTINUE", xpos, ypos
-                key.append(-1) # border and corner cases!
-                continue
-            idx = layer.content2D[xpos][ypos]
-            if idx:
-                offx, offy, img = indexed_tiles[idx]
-                world_x = xpos * layer.tilewidth + offx
-                world_y = ypos * layer.tileheight + offy
-                w, h = img.get_size()
-                rect = pygame.Rect(world_x, world_y, w, h)
-                sprite = SpriteLayer.Sprite(img, rect, key=idx)
-                key.append(idx)
-                sprites.append(sprite)
-            else:
-                key.append(-1)
-        return key, sprites
-
     @staticmethod
     def _get_sprite_from(coords, layer, _img_cache):
         """
@@ -781,6 +1028,149 @@ class SpriteLayer(object):
 
 #  -----------------------------------------------------------------------------
 
+class ChunkedSpriteLayer(SpriteLayer):
+    """
+    A SpriteLayer for the chunked layers of infinite maps.
+
+    Only the chunks around the camera are decoded and turned into sprites,
+    they are called resident. The others are evicted using update_window().
+    content2D covers the resident window only, origin_x and origin_y are the
+    tile coordinates of content2D[0][0] and num_tiles_x, num_tiles_y the size
+    of the window.
+
+    """
+
+    def __init__(self, tile_layer_idx, resource_loader, radius=1):
+        """
+
+        :Parameters:
+            tile_layer_idx : int
+                Index of the chunked tile layer to build upon
+            resource_loader : ResourceLoaderPygame
+                Instance of the ResourceLoaderPygame class which has loaded
+                the resouces
+            radius : int
+                Number of chunks around the camera that are kept resident.
+        """
+        self._resource_loader = resource_loader
+        _world_map = self._resource_loader.world_map
+        self.layer_idx = tile_layer_idx
+        self._layer = _world_map.layers[tile_layer_idx]
+
+        self.tilewidth = _world_map.tilewidth
+        self.tileheight = _world_map.tileheight
+        self.position_x = self._layer.x
+        self.position_y = self._layer.y
+        self._level = 1
+        self.scale_x = 1.0
+        self.scale_y = 1.0
+        self.paralax_factor_x = 1.0
+        self.paralax_factor_y = 1.0
+        self.sprites = []
+        self.is_object_group = False
+        self.visible = self._layer.visible
+        self.bottom_margin = 0
+        self._bottom_margin = 0
+
+        chunk = self._layer.chunks.values()[0]
+        self.chunk_width = chunk.width
+        self.chunk_height = chunk.height
+        self.radius = radius
+        self.bounds = self._layer.chunk_bounds
+        self.resident = {} # {(x, y): rows of sprites}
+        self._window = None
+
+        self.origin_x = 0
+        self.origin_y = 0
+        self.num_tiles_x = 0
+        self.num_tiles_y = 0
+        self.content2D = []
+
+    def update_window(self, world_rect):
+        """
+        Makes the chunks around the given rect resident and evicts the others.
+        Does nothing if the window did not change.
+
+        :Parameters:
+            world_rect : pygame.Rect
+                the visible part of the world in pixels
+
+        :Returns:
+            (loaded, evicted) lists of chunk keys, the keys are the (x, y)
+            positions of the chunks in tiles.
+        """
+        cw = self.chunk_width
+        ch = self.chunk_height
+        left = (world_rect.left // self.tilewidth // cw - self.radius) * cw
+        top = (world_rect.top // self.tileheight // ch - self.radius) * ch
+        right = ((world_rect.right - 1) // self.tilewidth // cw + \
+                                                    self.radius + 1) * cw
+        bottom = ((world_rect.bottom - 1) // self.tileheight // ch + \
+                                                    self.radius + 1) * ch
+        window = (int(left), int(top), int(right), int(bottom))
+        if window == self._window:
+            return [], []
+        self._window = window
+
+        wanted = set()
+        for ypos in xrange(window[1], window[3], ch):
+            for xpos in xrange(window[0], window[2], cw):
+                if (xpos, ypos) in self._layer.chunks:
+                    wanted.add((xpos, ypos))
+
+        evicted = [key for key in self.resident if key not in wanted]
+        for key in evicted:
+            del self.resident[key]
+            self._layer.release_chunk(key)
+        loaded = [key for key in wanted if key not in self.resident]
+        for key in loaded:
+            self.resident[key] = self._build_chunk(self._layer.get_chunk(key))
+
+        # rebuild the window, only references are copied
+        self.origin_x, self.origin_y = window[0], window[1]
+        self.num_tiles_x = window[2] - window[0]
+        self.num_tiles_y = window[3] - window[1]
+        self.content2D = [[None] * self.num_tiles_x \
+                                        for ypos in xrange(self.num_tiles_y)]
+        for (xpos, ypos), rows in self.resident.items():
+            xpos -= self.origin_x
+            ypos -= self.origin_y
+            for yidx, row in enumerate(rows):
+                self.content2D[ypos + yidx][xpos:xpos + len(row)] = row
+        self.bottom_margin = self._bottom_margin
+        return loaded, evicted
+
+    def _build_chunk(self, chunk):
+        """
+        Creates the rows of sprites of a decoded chunk.
+        """
+        indexed_tiles = self._resource_loader.indexed_tiles
+        rows = []
+        content = chunk.decoded_content
+        for yidx in xrange(chunk.height):
+            row = [None] * chunk.width
+            for xidx in xrange(chunk.width):
+                idx = content[xidx + yidx * chunk.width]
+                if idx:
+                    world_x = (chunk.x + xidx) * self.tilewidth
+                    world_y = (chunk.y + yidx) * self.tileheight
+                    tile = indexed_tiles.get(idx, None)
+                    if tile is None:
+                        row[xidx], h = self._flipped_sprite(idx, world_x, \
+                                                                 world_y)
+                    else:
+                        offx, offy, img = tile
+                        w, h = img.get_size()
+                        rect = pygame.Rect(world_x + offx, world_y + offy, \
+                                                                        w, h)
+                        row[xidx] = SpriteLayer.Sprite(img, rect, key=(idx,))
+                    if h > self._bottom_margin:
+                        self._bottom_margin = h
+            rows.append(row)
+        return rows
+
+#  -----------------------------------------------------------------------------
+
 def get_layers_from_map(resource_loader):
     """
     Creates SpriteLayers out of the map.
@@ -812,6 +1202,8 @@ def get_layer_at_index(layer_idx, resource_loader):
     layer = resource_loader.world_map.layers[layer_idx]
     if layer.is_object_group:
         return layer
+    if layer.chunks:
+        return ChunkedSpriteLayer(layer_idx, resource_loader)
     return SpriteLayer(layer_idx, resource_loader)
 
 #  -----------------------------------------------------------------------------
@@ -982,10 +1374,15 @@ class RendererPygame(object):
             bottom = int(round(float(cam_world_pos_y + cam_rect.height) // \
                                             tile_h)) + 1
 
-            left = left if left > 0 else 0
-            right = right if right < layer.num_tiles_x else layer.num_tiles_x
-            top = top if top > 0 else 0
-            bottom = bottom if bottom < layer.num_tiles_y else layer.num_tiles_y
+            # chunked layers only hold a window of the world in content2D
+            origin_x = layer.origin_x
+            origin_y = layer.origin_y
+            end_x = origin_x + layer.num_tiles_x
+            end_y = origin_y + layer.num_tiles_y
+            left = left if left > origin_x else origin_x
+            right = right if right < end_x else end_x
+            top = top if top > origin_y else origin_y
+            bottom = bottom if bottom < end_y else end_y
 
             # sprites
             spr_idx = 0
@@ -1024,8 +1421,9 @@ class RendererPygame(object):
                     if spr_idx < len_sprites:
                         sprite = sprites[spr_idx]
                 # next line of the map
-                for xpos in range(left, right):
-                    tile_sprite = layer_content2D[ypos][xpos]
+                row = layer_content2D[ypos - origin_y]
+                for xpos in range(left - origin_x, right - origin_x):
+                    tile_sprite = row[xpos]
                     # print '?', xpos, ypos, tile_sprite
                     if tile_sprite:
                         surf_blit(tile_sprite.image, \
@@ -1059,8 +1457,8 @@ class RendererPygame(object):
             world_pos_x, world_pos_y = \
                                    self.get_world_pos(layer, screen_x, screen_y)
 
-            tile_x = int(world_pos_x / layer.tilewidth)
-            tile_y = int(world_pos_y / layer.tileheight)
+            tile_x = int(world_pos_x / layer.tilewidth) - layer.origin_x
+            tile_y = int(world_pos_y / layer.tileheight) - layer.origin_y
 
             if 0 <= tile_x < layer.num_tiles_x and \
                0 <= tile_y < layer.num_tiles_y:
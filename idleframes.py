@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Пропуск одинаковых кадров и редкие кадры, пока в игре ничего не
+# происходит (python platformerhabrahabr.py --idle, для киосков).
+#
+#   idle = idleframes.IdleFrames()
+#   idle.install()                        # после Controls.install()
+#   idle.reset()                          # в начале уровня
+#   ticks = idle.wait(timer)              # вместо timer.tick(60)
+#   ...ticks - 1 раз world.step без клавиш, затем обычный кадр
+#   if idle.changed(camera, world.entities, pressed):
+#       ...рисуем кадр и pygame.display.update()
+#
+# Кадр на экране определяют положение камеры, места видимых объектов и
+# то, что нарисовано в их image: анимация boltAnim и номер ее кадра
+# (PygAnimation.lastFrameNum). Если все это как в прошлом нарисованном
+# кадре, рисовать и показывать нечего.
+# Если камера и видимые объекты стоят, а клавиши действий отпущены,
+# IDLE_AFTER кадров подряд, игра переходит на IDLE_FPS кадров в секунду:
+# анимации идут по часам и меняют картинку так же. Реже только рисуем,
+# мир живет по-прежнему FPS тактов в секунду: wait() говорит, сколько
+# тактов прошло, и цикл проходит их все (иначе монстры вне экрана
+# замедлились бы в FPS / IDLE_FPS раз).
+# Нажатие клавиши будит игру сразу, не дожидаясь следующего редкого кадра.
+
+import pygame
+from pygame import Rect
+
+from camera import WIN_WIDTH, WIN_HEIGHT
+
+FPS = 60
+IDLE_FPS = 10  # кадров в секунду в простое
+IDLE_AFTER = FPS  # кадров без движения до простоя
+WAKE_EVENT = pygame.USEREVENT  # таймер редких кадров
+
+
+def look(entity):
+    # что сейчас нарисовано в image объекта: (анимация, номер кадра);
+    # None - картинка не меняется
+    animation = getattr(entity, 'boltAnim', None)
+    if animation is None:
+        return None
+    return animation, animation.lastFrameNum
+
+
+class IdleFrames(object):
+
+    def __init__(self, fps=FPS, idle_fps=IDLE_FPS, idle_after=IDLE_AFTER):
+        self.fps = fps
+        self.idle_fps = idle_fps
+        self.idle_after = idle_after
+        self.screen = Rect(0, 0, WIN_WIDTH, WIN_HEIGHT)
+        self.still = 0  # кадров подряд без движения и нажатий
+        self.skipped = 0  # кадров, которые не пришлось рисовать
+        self._positions = None  # камера и видимые объекты прошлого кадра
+        self._shown = None  # то же и их картинки на экране
+        self._tick_time = None  # когда прошел последний такт, мс
+
+    @property
+    def idle(self):
+        return self.still >= self.idle_after
+
+    def install(self):
+        # один раз до основного цикла, после controls.Controls.install():
+        # set_allowed и первый set_timer (запуск таймеров SDL) очищают
+        # очередь событий, в wait() так терялись бы нажатия
+        pygame.event.set_allowed(WAKE_EVENT)
+        pygame.time.set_timer(WAKE_EVENT, 0)
+
+    def reset(self):
+        # новый уровень: первый кадр рисуется в любом случае
+        self.still = 0
+        self._positions = None
+        self._shown = None
+        self._tick_time = None
+
+    def changed(self, camera, entities, pressed=False, force=False):
+        # True - кадр отличается от того, что на экране, его надо
+        # нарисовать. pressed - нажата клавиша действия, force - рисовать
+        # в любом случае (например, включен оверлей профилировщика)
+        screen = self.screen
+        positions = [camera.state.topleft]
+        looks = []
+        for e in entities:
+            rect = camera.apply(e)
+            if screen.colliderect(rect):
+                positions.append(rect.topleft)
+                looks.append(look(e))
+        if pressed or positions != self._positions:
+            self.still = 0
+        else:
+            self.still += 1
+        self._positions = positions
+        if not force and (positions, looks) == self._shown:
+            self.skipped += 1
+            return False
+        self._shown = (positions, looks)
+        return True
+
+    def wait(self, timer):
+        # пауза до следующего кадра: timer.tick(fps), а в простое - до
+        # следующего редкого кадра или до нажатия клавиши. Возвращает,
+        # сколько тактов симуляции (по fps в секунду) пора пройти, не
+        # меньше одного и не больше fps
+        if not self.idle or self._tick_time is None:
+            timer.tick(self.fps)
+            self._tick_time = pygame.time.get_ticks()
+            return 1
+        pygame.time.set_timer(WAKE_EVENT, 1000 // self.idle_fps)
+        try:
+            event = pygame.event.wait()
+        finally:
+            pygame.time.set_timer(WAKE_EVENT, 0)
+        if event.type != WAKE_EVENT:
+            pygame.event.post(event)  # нажатие разберет controls.Controls
+            self.still = 0
+        timer.tick()  # кадр ожидания не должен сократить следующий
+        return self._due(pygame.time.get_ticks())
+
+    def _due(self, now):
+        # такты с прошлого до now, мс; дробная часть остается на потом
+        tick = 1000.0 / self.fps
+        ticks = int((now - self._tick_time) / tick)
+        if ticks > self.fps:  # долгая пауза (окно таскали): не догоняем
+            self._tick_time = now
+            return self.fps
+        ticks = max(1, ticks)
+        self._tick_time += ticks * tick
+        return ticks
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Генератор больших синтетических уровней для бенчмарков и долгих прогонов.
+#
+#   python levelgen.py levels/stress.tmx --width 10000 --monsters 400
+#   python levelgen.py stress.tmx --height 100 --platforms 0.1 --seed 7
+#
+# Уровень собирается так же, как текстовые уровни (textlevel.make_map), и
+# сохраняется в tmx со слоями BackGround, Platforms, DieBlocks, Monsters,
+# Teleports, как ждет loadLevel. При одном seed и параметрах результат
+# всегда один и тот же, вплоть до байтов файла.
+# Уровень проходим по краям: пол, стены, герой слева, принцесса справа,
+# у точки появления героя нет ни смертельных блоков, ни монстров.
+
+import os
+import random
+
+import textlevel
+from textlevel import TILE_SIZE, PLATFORM_CHAR, DIE_CHAR, PRINCESS_CHAR
+
+LEVELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'levels')
+
+SEED = 1
+WIDTH = 1000  # в тайлах
+HEIGHT = 25  # как у map_*.tmx
+PLATFORM_DENSITY = 0.04  # доля клеток внутри уровня, занятых платформами
+DIE_DENSITY = 0.05  # доля клеток пола со смертельными блоками
+MONSTERS = 40
+PATROL = (2, 6)  # сколько тайлов монстр проходит в одну сторону, от и до
+TELEPORTS = 1
+PLATFORM_LENGTH = (2, 6)  # длина платформы в тайлах, от и до
+SPAWN_CLEAR = 4  # столько столбцов у героя остаются без опасностей
+FREE_CELL_ATTEMPTS = 10000  # попыток найти пустую клетку для объекта
+MIN_WIDTH = SPAWN_CLEAR + 4
+MIN_HEIGHT = 6
+TAKEN_CHAR = '+'  # клетка занята объектом, в тайлы не попадает
+
+
+def generate(width=WIDTH, height=HEIGHT, seed=SEED,
+             platform_density=PLATFORM_DENSITY, die_density=DIE_DENSITY,
+             monsters=MONSTERS, patrol=PATROL, teleports=TELEPORTS):
+    # Возвращает tmxreader.TileMap синтетического уровня
+    if width < MIN_WIDTH or height < MIN_HEIGHT:
+        raise ValueError(u'level must be at least %dx%d tiles, got %dx%d' % (
+            MIN_WIDTH, MIN_HEIGHT, width, height))
+    if not 0 <= platform_density <= 1 or not 0 <= die_density <= 1:
+        raise ValueError(u'densities must be between 0 and 1')
+    if not 0 <= patrol[0] <= patrol[1]:
+        raise ValueError(u'bad patrol range %r' % (patrol,))
+    rnd = random.Random(seed)
+    floor = height - 2  # строка над полом
+    grid = [bytearray(' ' * width) for y in range(height)]
+    grid[height - 1][:] = PLATFORM_CHAR * width  # пол
+    for row in grid:
+        row[0] = row[width - 1] = ord(PLATFORM_CHAR)  # стены
+
+    # платформы висят над полом, но не ниже прыжка от него
+    top, bottom = 2, max(3, floor - 1)
+    target = int(platform_density * (width - 2) * (bottom - top))
+    placed = 0
+    while placed < target:
+        y = rnd.randrange(top, bottom)
+        x = rnd.randrange(1, width - 1)
+        length = min(rnd.randrange(PLATFORM_LENGTH[0], PLATFORM_LENGTH[1] + 1),
+                     width - 1 - x)
+        placed += grid[y][x:x + length].count(' ')
+        grid[y][x:x + length] = PLATFORM_CHAR * length
+
+    # смертельные блоки на полу, кроме места появления героя
+    floor_cells = range(SPAWN_CLEAR + 1, width - 2)
+    for x in rnd.sample(floor_cells, int(die_density * len(floor_cells))):
+        grid[floor][x] = ord(DIE_CHAR)
+    grid[floor][width - 2] = ord(PRINCESS_CHAR)
+
+    def free_cell(min_x=SPAWN_CLEAR + 1):
+        # случайная пустая клетка над полом, в пикселях; клетка помечается
+        # занятой, чтобы два объекта не попали в одно место
+        for attempt in xrange(FREE_CELL_ATTEMPTS):
+            x = rnd.randrange(min_x, width - 2)
+            y = rnd.randrange(1, floor)
+            if grid[y][x] == ord(' '):
+                grid[y][x] = ord(TAKEN_CHAR)
+                return x * TILE_SIZE, y * TILE_SIZE
+        raise ValueError(u'no free cells left, lower platform density')
+
+    player = (TILE_SIZE, (floor - 1) * TILE_SIZE)
+    portals = []
+    for i in range(teleports):
+        x, y = free_cell()
+        goX, goY = free_cell(1)
+        portals.append((x, y, goX, goY))
+    mns = []
+    for i in range(monsters):
+        x, y = free_cell()
+        mns.append((x, y, rnd.choice((-2, 2)), rnd.choice((0, 1)),
+                    rnd.randint(*patrol) * TILE_SIZE,
+                    rnd.randint(*patrol) * TILE_SIZE))
+
+    cells = ''.join([str(row) for row in grid])
+    return textlevel.make_map(cells, width, height, player, portals, mns,
+                              os.path.join(LEVELS_DIR,
+                                           textlevel.TILESET_IMAGE))
+
+
+def write(file_name, **params):
+    # Генерирует уровень и сохраняет его в tmx, параметры - как у generate()
+    world_map = generate(**params)
+    textlevel.write_tmx(world_map, file_name)
+    world_map.map_file_name = os.path.abspath(file_name)
+    return world_map
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description=u'Генератор синтетических tmx уровней')
+    parser.add_argument('output', help=u'куда записать tmx')
+    parser.add_argument('--width', type=int, default=WIDTH,
+                        help=u'ширина в тайлах (по умолчанию %d)' % WIDTH)
+    parser.add_argument('--height', type=int, default=HEIGHT,
+                        help=u'высота в тайлах (по умолчанию %d)' % HEIGHT)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--platforms', type=float, default=PLATFORM_DENSITY,
+                        help=u'доля клеток с платформами (по умолчанию %s)'
+                        % PLATFORM_DENSITY)
+    parser.add_argument('--die', type=float, default=DIE_DENSITY,
+                        help=u'доля клеток пола со смертельными блоками '
+                        u'(по умолчанию %s)' % DIE_DENSITY)
+    parser.add_argument('--monsters', type=int, default=MONSTERS,
+                        help=u'число монстров (по умолчанию %d)' % MONSTERS)
+    parser.add_argument('--patrol', type=int, nargs=2, default=PATROL,
+                        metavar=('MIN', 'MAX'),
+                        help=u'путь монстра в одну сторону в тайлах '
+                        u'(по умолчанию %d %d)' % PATROL)
+    parser.add_argument('--teleports', type=int, default=TELEPORTS,
+                        help=u'число телепортов (по умолчанию %d)' % TELEPORTS)
+    args = parser.parse_args(argv)
+    try:
+        write(args.output, width=args.width, height=args.height,
+              seed=args.seed, platform_density=args.platforms,
+              die_density=args.die, monsters=args.monsters,
+              patrol=tuple(args.patrol), teleports=args.teleports)
+    except ValueError as e:
+        parser.error(e)
+    print('-> %s' % args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Отчет о памяти: сколько байт держат тайлы, спрайты слоев, анимации и
+# объекты уровней.
+#
+#   python memreport.py                       # levels/map_1..3
+#   python memreport.py levels/1.txt --json mem.json
+#
+# Пиксели считаются по буферам: subsurface своих пикселей не имеет, они
+# лежат в родительской картинке. Буфер целиком считается там, где он
+# встретился впервые, а ссылки на уже учтенный буфер (тайлы слоя на
+# тайлсет, та же картинка на другом уровне) идут в колонку "общие" -
+# столько заняли бы копии.
+# В конце - картинки с одинаковыми пикселями в разных буферах: столько
+# памяти сэкономили бы общие Surface вместо копий.
+# Размер Python объектов - sys.getsizeof самого объекта, его __dict__ и
+# Rect, без общих строк и чисел, то есть оценка снизу.
+
+import os
+import sys
+import json
+import hashlib
+
+import pygame
+
+import pyganim
+
+TOP_DUPLICATES = 15  # сколько групп одинаковых картинок показывать
+
+
+def surface_bytes(surface):
+    # пиксели, которыми владеет сама картинка (у subsurface их нет)
+    if surface.get_parent() is not None:
+        return 0
+    return surface.get_pitch() * surface.get_height()
+
+
+def object_bytes(obj):
+    # объект, его __dict__ и Rect, если есть
+    size = sys.getsizeof(obj)
+    attrs = getattr(obj, '__dict__', None)
+    if attrs is not None:
+        size += sys.getsizeof(attrs)
+        rect = attrs.get('rect')
+        if isinstance(rect, pygame.Rect):
+            size += sys.getsizeof(rect)
+    return size
+
+
+class Row(object):
+    # строка отчета: одна группа объектов одного уровня
+
+    def __init__(self, level, group, name):
+        self.level = level
+        self.group = group  # tiles, layer, animations, entities
+        self.name = name
+        self.items = 0  # спрайтов, кадров, объектов
+        self.surfaces = 0  # ссылок на картинки
+        self.object_bytes = 0  # Python объекты и списки
+        self.pixel_bytes = 0  # пиксели, впервые встреченные здесь
+        self.shared_bytes = 0  # ссылки на пиксели, учтенные раньше
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+class MemoryReport(object):
+    # Собирает строки по уровням, один буфер пикселей считается один раз.
+
+    def __init__(self):
+        self.rows = []
+        self._owners = {}  # {id(буфер): (буфер, где встречен впервые)}
+
+    def row(self, level, group, name):
+        row = Row(level, group, name)
+        self.rows.append(row)
+        return row
+
+    def add_surface(self, row, surface):
+        # буфер считается в первой строке, где встретился, целиком;
+        # дальше в "общие" идет только видимая через surface часть
+        row.surfaces += 1
+        owner = surface.get_abs_parent()
+        if id(owner) in self._owners:
+            width, height = surface.get_size()
+            row.shared_bytes += width * height * surface.get_bytesize()
+        else:
+            self._owners[id(owner)] = (owner, row)
+            row.pixel_bytes += surface_bytes(owner)
+
+    def add_level(self, level, resources, sprite_layers, world):
+        # resources - helperspygame.ResourceLoaderPygame уровня,
+        # sprite_layers - его слои, world - simulation.World
+        row = self.row(level, 'tiles', 'indexed_tiles')
+        for offx, offy, image in resources.indexed_tiles.itervalues():
+            row.items += 1
+            self.add_surface(row, image)
+        # отраженные тайлы попадают сюда, когда их впервые нарисуют
+        row.object_bytes += sys.getsizeof(resources.indexed_tiles)
+
+        for idx, layer in enumerate(sprite_layers):
+            if layer.is_object_group:
+                continue
+            name = resources.world_map.layers[layer.layer_idx].name
+            self.add_sprite_layer(level, '%d %s' % (idx, name), layer)
+
+        animations = {}  # анимации считаем по классам объектов
+        entities = {}
+        for entity in world.entities:
+            cls = entity.__class__.__name__
+            if cls not in entities:
+                entities[cls] = self.row(level, 'entities', cls)
+                animations[cls] = self.row(level, 'animations', cls)
+            self.add_entity(entities[cls], animations[cls], entity)
+
+    def add_sprite_layer(self, level, name, layer):
+        row = self.row(level, 'layer', name)
+        row.object_bytes += sys.getsizeof(layer.content2D)
+        for line in layer.content2D:
+            row.object_bytes += sys.getsizeof(line)
+            for sprite in line:
+                if sprite is None:
+                    continue
+                row.items += 1
+                row.object_bytes += object_bytes(sprite)
+                # у FlippedSprite картинки нет, пока его не нарисовали
+                image = sprite.__dict__.get('_image', sprite.__dict__.get(
+                    'image'))
+                if image is not None:
+                    self.add_surface(row, image)
+        for sprite in layer.sprites:
+            row.items += 1
+            row.object_bytes += object_bytes(sprite)
+            self.add_surface(row, sprite.image)
+
+    def add_entity(self, row, animations_row, entity):
+        row.items += 1
+        row.object_bytes += object_bytes(entity)
+        for value in entity.__dict__.itervalues():
+            if isinstance(value, pygame.Surface):
+                self.add_surface(row, value)
+            elif isinstance(value, pyganim.PygAnimation):
+                animations_row.items += 1
+                animations_row.object_bytes += object_bytes(value)
+                for image in value._images + value._transformedImages:
+                    self.add_surface(animations_row, image)
+
+    def duplicates(self):
+        # одинаковые пиксели в разных буферах:
+        # [(байт можно сэкономить, копий, байт в одной, [строки])]
+        groups = {}
+        for owner, row in self._owners.itervalues():
+            key = (owner.get_size(), owner.get_bitsize(), owner.get_colorkey(),
+                   owner.get_alpha(), hashlib.md5(
+                       pygame.image.tostring(owner, 'RGBA')).digest())
+            groups.setdefault(key, []).append((owner, row))
+        result = []
+        for copies in groups.itervalues():
+            if len(copies) < 2:
+                continue
+            size = surface_bytes(copies[0][0])
+            names = sorted(set('%s/%s/%s' % (row.level, row.group, row.name)
+                               for owner, row in copies))
+            result.append(((len(copies) - 1) * size, len(copies), size, names))
+        result.sort(reverse=True)
+        return result
+
+    def as_dict(self):
+        return {
+            'rows': [row.as_dict() for row in self.rows],
+            'duplicates': [{'savable_bytes': savable, 'copies': copies,
+                            'bytes': size, 'where': names}
+                           for savable, copies, size, names
+                           in self.duplicates()],
+        }
+
+    def print_report(self):
+        _write(u"%-14s %-10s %-22s %7s %7s %10s %10s %10s" % (
+            u"уровень", u"группа", u"имя", u"штук", u"картин",
+            u"объекты", u"пиксели", u"общие"))
+        level = None
+        totals = [0, 0, 0]
+        for row in self.rows:
+            if level is not None and row.level != level:
+                _print_total(level, totals)
+                totals = [0, 0, 0]
+            level = row.level
+            _write(u"%-14s %-10s %-22s %7d %7d %10s %10s %10s" % (
+                row.level, row.group, row.name[:22], row.items, row.surfaces,
+                _kb(row.object_bytes), _kb(row.pixel_bytes),
+                _kb(row.shared_bytes)))
+            totals[0] += row.object_bytes
+            totals[1] += row.pixel_bytes
+            totals[2] += row.shared_bytes
+        if level is not None:
+            _print_total(level, totals)
+
+        duplicates = self.duplicates()
+        _write(u"")
+        _write(u"Одинаковые картинки в разных буферах: %d групп, можно "
+              u"сэкономить %s" % (len(duplicates),
+                                  _kb(sum(d[0] for d in duplicates))))
+        for savable, copies, size, names in duplicates[:TOP_DUPLICATES]:
+            _write(u"  %10s  %5d копий по %s  %s" % (
+                _kb(savable), copies, _kb(size), u", ".join(names)))
+
+
+def _write(line):
+    # utf-8 явно: в pipe или файл Python 2 пишет unicode как ascii и на
+    # кириллице падает
+    print(line.encode('utf-8'))
+
+
+def _kb(size):
+    return u"%.1f КБ" % (size / 1024.0)
+
+
+def _print_total(level, totals):
+    _write(u"%-14s %-10s %-22s %7s %7s %10s %10s %10s" % (
+        level, u"", u"итого", u"", u"", _kb(totals[0]), _kb(totals[1]),
+        _kb(totals[2])))
+
+
+def load_level(name):
+    # уровень так же, как его грузит loadLevel: тайлы - subsurface общих
+    # тайлсетов, объекты - simulation.World с героем
+    import assets
+    import helperspygame
+    import simulation
+    world_map = simulation.load_map(simulation.level_file(name))
+    resources = helperspygame.ResourceLoaderPygame(assets.load_image,
+                                                   use_subsurfaces=True)
+    resources.load(world_map)
+    sprite_layers = helperspygame.get_layers_from_map(resources)
+    world = simulation.World(world_map)
+    world.spawn_hero()
+    return resources, sprite_layers, world
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description=u'Сколько памяти занимают уровни')
+    parser.add_argument('levels', nargs='*', metavar='LEVEL',
+                        default=[os.path.join('levels', 'map_%d' % lvl)
+                                 for lvl in range(1, 4)],
+                        help=u'уровни, как в loadLevel (levels/map_1, '
+                        u'levels/1.txt)')
+    parser.add_argument('--json', metavar='FILE',
+                        help=u'сохранить отчет в JSON')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.display.init()
+    # картинки переводятся в формат дисплея, как в игре
+    pygame.display.set_mode((1, 1), 0, 32)
+    import assets
+    assets.warm_up()
+
+    report = MemoryReport()
+    loaded = []  # уровни держим до конца: общие картинки видны по id()
+    for name in args.levels:
+        level = load_level(name)
+        loaded.append(level)
+        report.add_level(os.path.basename(name), *level)
+    report.print_report()
+    if args.json:
+        out = open(args.json, 'w')
+        try:
+            json.dump(report.as_dict(), out, indent=1, sort_keys=True)
+        finally:
+            out.close()
+        print("-> %s" % args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from pygame import *
+from pygame import sprite, Surface, Color, Rect
 import pyganim
 import os
+import assets
+from blocks import Platform
 
 MONSTER_WIDTH = 32
 MONSTER_HEIGHT = 32
@@ -29,14 +31,15 @@ class Monster(sprite.Sprite):
         self.yvel = up # скорость движения по вертикали, 0 - не двигается
         boltAnim = []
         for anim in ANIMATION_MONSTERHORYSONTAL:
-            boltAnim.append((anim, 0.3))
+            boltAnim.append((assets.load_image(anim), 0.3))
         self.boltAnim = pyganim.PygAnimation(boltAnim)
         self.boltAnim.play()
+        self.boltAnim.compile()
+        self.patrol = None # Patrol, если ничто не мешает ходить, см. World
          
     def update(self, platforms): # по принципу героя
                     
-        self.image.fill(Color(MONSTER_COLOR))
-        self.boltAnim.blit(self.image, (0, 0))
+        self.animate()
        
         self.rect.y += self.yvel
         self.rect.x += self.xvel
@@ -48,8 +51,82 @@ class Monster(sprite.Sprite):
         if (abs(self.startY - self.rect.y) > self.maxLengthUp):
             self.yvel = -self.yvel # если прошли максимальное растояние, то идеи в обратную сторону, вертикаль
 
+    def animate(self): # только картинка, без движения (клиент netgame)
+        self.image.fill(Color(MONSTER_COLOR))
+        self.boltAnim.blit(self.image, (0, 0))
+
     def collide(self, platforms):
         for p in platforms:
             if sprite.collide_rect(self, p) and self != p: # если с чем-то или кем-то столкнулись
+               # тело из нескольких тайлов (make_bodies) разворачивает, как
+               # раньше каждый его тайл: четное число поворотов - не поворот
+               if isinstance(p, Platform) and p.tiles_hit(self.rect) % 2 == 0:
+                   continue
                self.xvel = - self.xvel # то поворачиваем в обратную сторону
                self.yvel = - self.yvel
+
+
+def patrol_axis(start, vel, length):
+    # (start, vel, k) для одной оси: без столкновений монстр делает k шагов
+    # от start, поворачивает, 2k шагов назад, снова поворачивает и еще k
+    # шагов до start - период 4k. None - ход не периодический (length < 0)
+    if not vel:
+        return start, 0, 0
+    if length < 0:
+        return None
+    return start, vel, length // abs(vel) + 1  # первое k с |k * vel| > length
+
+
+def axis_at(axis, tick):
+    # (координата, скорость) после tick шагов Monster.update без столкновений
+    start, vel, k = axis
+    if not vel:
+        return start, 0
+    u = tick % (4 * k)
+    if u < k:
+        return start + u * vel, vel
+    if u < 3 * k:  # на u == k уже повернули
+        return start + (2 * k - u) * vel, -vel
+    return start + (u - 4 * k) * vel, vel  # на u == 3k повернули обратно
+
+
+class Patrol(object):
+    # Ход монстра без столкновений в замкнутом виде: где он будет через
+    # tick шагов, за O(1), с теми же координатами и скоростями, что дал бы
+    # Monster.update. box - все, что он заметает за период; если в box
+    # ничего нет, столкновений не будет. None из from_monster - ход не
+    # периодический, монстр шагает как обычно.
+
+    def __init__(self, x_axis, y_axis):
+        self.x_axis = x_axis
+        self.y_axis = y_axis
+        left, right = self._extent(x_axis)
+        top, bottom = self._extent(y_axis)
+        self.box = Rect(left, top, right - left + MONSTER_WIDTH,
+                        bottom - top + MONSTER_HEIGHT)
+
+    @staticmethod
+    def _extent(axis):
+        start, vel, k = axis
+        return start - k * abs(vel), start + k * abs(vel)
+
+    @classmethod
+    def from_monster(cls, monster):
+        # монстр должен стоять в начале хода, как после создания
+        x_axis = patrol_axis(monster.startX, monster.xvel,
+                             monster.maxLengthLeft)
+        y_axis = patrol_axis(monster.startY, monster.yvel,
+                             monster.maxLengthUp)
+        if x_axis is None or y_axis is None:
+            return None
+        return cls(x_axis, y_axis)
+
+    def at(self, tick):
+        # -> (x, y, xvel, yvel) после tick шагов
+        x, xvel = axis_at(self.x_axis, tick)
+        y, yvel = axis_at(self.y_axis, tick)
+        return x, y, xvel, yvel
+
+    def place(self, monster, tick):
+        x, y, monster.xvel, monster.yvel = self.at(tick)
+        monster.rect.topleft = (x, y)
@@ -0,0 +1,609 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Игра по сети: уровень ведет сервер, клиенты шлют ему нажатия.
+#
+#   python netgame.py server --level levels/map_1       # порт 5757
+#   python netgame.py client --host 192.168.0.2         # окно игры
+#   python netgame.py bots --clients 32 --ticks 1800    # нагрузка по loopback
+#
+# Мир (simulation.World) есть только у сервера: TICK_RATE раз в секунду
+# он двигает монстров и героев всех клиентов по их нажатиям и раз в
+# SNAPSHOT_EVERY кадров шлет каждому клиенту снимок. Снимок - дельта от
+# последнего снимка, который клиент подтвердил: только изменившиеся
+# герои и монстры и пропавшие из вида. В снимок попадает только то, что
+# видно на экране клиента, плюс VIEW_MARGIN, так что трафик клиента не
+# растет с размером уровня и с числом игроков вдали от него.
+# Своего героя клиент двигает сразу, не дожидаясь сервера (предсказание).
+# Когда приходит снимок, герой ставится туда, где его видит сервер, и
+# нажатия, которые сервер еще не обработал, проигрываются заново.
+# Пакеты UDP, числа в сетевом порядке байт. Нажатия пронумерованы, и
+# клиент повторяет в каждом пакете последние необработанные, так что
+# потерянный пакет ничего не ломает. asyncio в Python 2 нет, поэтому
+# сервер и клиент работают на select.
+
+import errno
+import select
+import socket
+import struct
+from timeit import default_timer
+
+from pygame import Rect
+
+import simulation
+import replay
+from camera import WIN_WIDTH, WIN_HEIGHT
+from blocks import PLATFORM_WIDTH
+
+DEFAULT_LEVEL = 'levels/map_1'
+PORT = 5757
+TICK_RATE = 60  # кадров симуляции в секунду, как timer.tick(60) в игре
+SNAPSHOT_EVERY = 2  # снимок раз в два кадра, 30 в секунду
+HISTORY = 32  # снимков, от которых еще можно считать дельту
+INPUT_REDUNDANCY = 16  # последних необработанных нажатий в каждом пакете
+MAX_BACKLOG = 8  # нажатий впрок на сервере, более старые выкидываются
+TIMEOUT = 5.0  # с без пакетов, после которых клиент отключается
+CONNECT_ATTEMPTS = 10
+CONNECT_WAIT = 0.5  # с ожидания ответа на каждую попытку
+VIEW_MARGIN = 4 * PLATFORM_WIDTH  # запас вокруг экрана клиента
+MAX_CATCH_UP = 5  # кадров, которые сервер догоняет после задержки
+MAX_PACKET = 65507
+
+# типы пакетов
+HELLO = 'H'  # клиент -> сервер: подключиться
+WELCOME = 'W'  # сервер -> клиент: id героя, кадр, имя уровня
+INPUT = 'I'  # клиент -> сервер: подтвержденный снимок и нажатия
+SNAPSHOT = 'S'  # сервер -> клиент: дельта состояния
+BYE = 'B'  # клиент -> сервер: отключиться
+
+# W, id героя, кадр сервера; дальше имя уровня в utf-8
+WELCOME_HEADER = struct.Struct('!cHI')
+# I, подтвержденный снимок, номер первого нажатия, нажатий; дальше по
+# байту на нажатие (биты replay.pack)
+INPUT_HEADER = struct.Struct('!cIIB')
+# S, кадр, базовый кадр (0 - полный снимок), последнее обработанное
+# нажатие получателя, есть ли его герой (0 или 1), чужих героев,
+# монстров, пропавших; дальше записи в том же порядке
+SNAPSHOT_HEADER = struct.Struct('!cIIIBHHH')
+# свой герой целиком, для предсказания: x, y, xvel, yvel, флаги, смертей
+HERO_RECORD = struct.Struct('!iiddBH')
+PLAYER_RECORD = struct.Struct('!HiiB')  # чужой герой: id, x, y, флаги
+MONSTER_RECORD = struct.Struct('!Iii')  # номер в World.monsters, x, y
+REMOVED_RECORD = struct.Struct('!BI')  # PLAYER или MONSTER, id
+
+# ключи в состоянии: (HERO, 0) - свой герой, (PLAYER, id героя) - чужие,
+# (MONSTER, номер монстра)
+PLAYER = 0
+MONSTER = 1
+HERO = 2
+
+# флаги героя
+ON_GROUND = 1
+IS_FLY = 2
+WINNER = 4
+
+
+def _flags(player):
+    return ((ON_GROUND if player.onGround else 0) |
+            (IS_FLY if player.isFly else 0) |
+            (WINNER if player.winner else 0))
+
+
+def hero_state(player):
+    return (player.rect.x, player.rect.y, player.xvel, player.yvel,
+            _flags(player), min(player.deaths, 0xFFFF))
+
+
+def set_hero_state(player, values):
+    x, y, xvel, yvel, flags, deaths = values
+    set_player_state(player, (x, y, flags))
+    player.xvel = xvel
+    player.yvel = yvel
+    player.deaths = deaths
+
+
+def player_state(player):
+    return player.rect.x, player.rect.y, _flags(player)
+
+
+def set_player_state(player, values):
+    x, y, flags = values
+    player.rect.x = x
+    player.rect.y = y
+    player.onGround = bool(flags & ON_GROUND)
+    player.isFly = bool(flags & IS_FLY)
+    player.winner = bool(flags & WINNER)
+
+
+def encode_snapshot(tick, base_tick, input_seq, state, base):
+    # state и base - {ключ: значения}; в пакет идет только разница
+    hero = []
+    players = []
+    monsters = []
+    for key, values in state.iteritems():
+        if base.get(key) != values:
+            if key[0] == MONSTER:
+                monsters.append(MONSTER_RECORD.pack(key[1], *values))
+            elif key[0] == PLAYER:
+                players.append(PLAYER_RECORD.pack(key[1], *values))
+            else:
+                hero.append(HERO_RECORD.pack(*values))
+    removed = [REMOVED_RECORD.pack(*key) for key in base if key not in state]
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT, tick, base_tick, input_seq,
+                                  len(hero), len(players), len(monsters),
+                                  len(removed))
+    return ''.join([header] + hero + players + monsters + removed)
+
+
+def decode_snapshot(data, states):
+    # -> (кадр, последнее обработанное нажатие, состояние) или None, если
+    # базового снимка в states ({кадр: состояние}) уже нет
+    (kind, tick, base_tick, input_seq, hero, players, monsters,
+     removed) = SNAPSHOT_HEADER.unpack_from(data)
+    state = {}
+    if base_tick:
+        if base_tick not in states:
+            return None
+        state.update(states[base_tick])
+    offset = SNAPSHOT_HEADER.size
+    if hero:
+        state[(HERO, 0)] = HERO_RECORD.unpack_from(data, offset)
+        offset += HERO_RECORD.size
+    for i in xrange(players):
+        values = PLAYER_RECORD.unpack_from(data, offset)
+        state[(PLAYER, values[0])] = values[1:]
+        offset += PLAYER_RECORD.size
+    for i in xrange(monsters):
+        values = MONSTER_RECORD.unpack_from(data, offset)
+        state[(MONSTER, values[0])] = values[1:]
+        offset += MONSTER_RECORD.size
+    for i in xrange(removed):
+        state.pop(REMOVED_RECORD.unpack_from(data, offset), None)
+        offset += REMOVED_RECORD.size
+    return tick, input_seq, state
+
+
+def _receive_all(sock, timeout):
+    # пакеты, которые уже пришли, ждем первый не дольше timeout секунд
+    if not select.select([sock], [], [], timeout)[0]:
+        return
+    while True:
+        try:
+            yield sock.recvfrom(MAX_PACKET)
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            if e.errno != errno.ECONNREFUSED:  # сервер еще не запущен
+                raise
+
+
+class Connection(object):
+    # клиент на сервере
+
+    def __init__(self, address, player_id, player, now):
+        self.address = address
+        self.player_id = player_id
+        self.player = player
+        self.inputs = {}  # {номер нажатия: биты}, еще не обработанные
+        self.next_input = 1
+        # последние нажатия, повторяются, пока новых нет
+        self.keys = (False, False, False, False)
+        self.acked = 0  # последний снимок, который клиент подтвердил
+        self.sent = {}  # {кадр: состояние} отправленные снимки, для дельт
+        self.last_seen = now
+        self.bytes_sent = 0
+
+    def next_keys(self):
+        # нажатия на этот кадр
+        inputs = self.inputs
+        if len(inputs) > MAX_BACKLOG:  # клиент убежал вперед
+            self.next_input = max(inputs) - MAX_BACKLOG + 1
+        elif inputs and self.next_input not in inputs:
+            self.next_input = max(self.next_input, min(inputs))  # потеряно
+        for seq in [seq for seq in inputs if seq < self.next_input]:
+            del inputs[seq]
+        bits = inputs.pop(self.next_input, None)
+        if bits is not None:
+            self.keys = replay.unpack(bits)
+            self.next_input += 1
+        return self.keys
+
+
+class NetServer(object):
+    # Сервер одного уровня: poll() принимает пакеты, tick() - кадр
+    # симуляции и снимки, serve_forever() - и то, и другое по часам.
+
+    def __init__(self, level=DEFAULT_LEVEL, host='127.0.0.1', port=PORT,
+                 snapshot_every=SNAPSHOT_EVERY):
+        import player
+        player.DIE_DELAY = 0  # сервер не может замереть на секунду
+        self.level = level
+        self.world = simulation.World(simulation.load_level(level))
+        self.monsters = self.world.monsters.sprites()
+        self.level_rect = Rect(0, 0, self.world.width, self.world.height)
+        self.snapshot_every = snapshot_every
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+        self.address = self.sock.getsockname()
+        self.connections = {}  # {адрес: Connection}
+        self._next_id = 1
+        self.tick_count = 0
+        # для замеров
+        self.tick_seconds = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.snapshots = 0
+        self.full_snapshots = 0
+
+    def poll(self, timeout=0):
+        for data, address in _receive_all(self.sock, timeout):
+            self.bytes_received += len(data)
+            try:
+                self._receive(data, address)
+            except struct.error:
+                pass  # битый пакет
+
+    def _receive(self, data, address):
+        kind = data[:1]
+        connection = self.connections.get(address)
+        if kind == HELLO:
+            if connection is None:
+                connection = self._connect(address)
+            self._send(connection, WELCOME_HEADER.pack(
+                WELCOME, connection.player_id, self.tick_count) +
+                self.level.encode('utf-8'))
+        elif connection is None:
+            return  # не подключался или уже отключен
+        elif kind == INPUT:
+            ack, first, count = INPUT_HEADER.unpack_from(data)[1:]
+            connection.acked = max(connection.acked, ack)
+            bits = bytearray(data[INPUT_HEADER.size:
+                                  INPUT_HEADER.size + count])
+            for seq, value in enumerate(bits, first):
+                if seq >= connection.next_input:
+                    connection.inputs.setdefault(seq, value)
+            connection.last_seen = default_timer()
+        elif kind == BYE:
+            self._disconnect(connection)
+
+    def _connect(self, address):
+        connection = Connection(address, self._next_id,
+                                self.world.spawn_player(), default_timer())
+        self._next_id = self._next_id % 0xFFFF + 1
+        self.connections[address] = connection
+        return connection
+
+    def _disconnect(self, connection):
+        self.world.remove_player(connection.player)
+        del self.connections[connection.address]
+
+    def _send(self, connection, data):
+        try:
+            self.sock.sendto(data, connection.address)
+        except socket.error:
+            return  # UDP: пакет просто потерялся
+        connection.bytes_sent += len(data)
+        self.bytes_sent += len(data)
+
+    def tick(self):
+        # кадр симуляции, раз в snapshot_every кадров - снимки клиентам
+        start = default_timer()
+        self.tick_count += 1
+        self.world.step_players([(connection.player, connection.next_keys())
+                                 for connection
+                                 in self.connections.itervalues()],
+                                animate=False)
+        if self.tick_count % self.snapshot_every == 0:
+            self._send_snapshots()
+        for connection in self.connections.values():
+            if start - connection.last_seen > TIMEOUT:
+                self._disconnect(connection)
+        self.tick_seconds += default_timer() - start
+
+    def _send_snapshots(self):
+        tick = self.tick_count
+        players = [(connection.player_id, connection.player.rect,
+                    player_state(connection.player))
+                   for connection in self.connections.itervalues()]
+        forget = tick - HISTORY * self.snapshot_every
+        for connection in self.connections.values():
+            state = self.visible_state(connection, players)
+            base = connection.sent.get(connection.acked)
+            base_tick = connection.acked if base is not None else 0
+            self._send(connection, encode_snapshot(
+                tick, base_tick, connection.next_input - 1, state,
+                base or {}))
+            self.snapshots += 1
+            self.full_snapshots += not base_tick
+            connection.sent[tick] = state
+            for old in [t for t in connection.sent if t <= forget]:
+                del connection.sent[old]
+
+    def visible_state(self, connection, players):
+        # что видно на экране клиента (камера, как в игре, не выходит за
+        # уровень), с запасом VIEW_MARGIN; players - [(id, rect, значения)]
+        view = Rect(0, 0, WIN_WIDTH, WIN_HEIGHT)
+        view.center = connection.player.rect.center
+        view = view.clamp(self.level_rect).inflate(2 * VIEW_MARGIN,
+                                                   2 * VIEW_MARGIN)
+        state = {(HERO, 0): hero_state(connection.player)}
+        for player_id, rect, values in players:
+            if player_id != connection.player_id and view.colliderect(rect):
+                state[(PLAYER, player_id)] = values
+        for index, monster in enumerate(self.monsters):
+            if view.colliderect(monster.rect):
+                state[(MONSTER, index)] = (monster.rect.x, monster.rect.y)
+        return state
+
+    def serve_forever(self, tick_rate=TICK_RATE):
+        period = 1.0 / tick_rate
+        next_tick = default_timer()
+        while True:
+            self.poll(max(0.0, next_tick - default_timer()))
+            now = default_timer()
+            for i in xrange(MAX_CATCH_UP):
+                if now < next_tick:
+                    break
+                self.tick()
+                next_tick += period
+            if now - next_tick > period * MAX_CATCH_UP:
+                next_tick = now  # не догнать, пропускаем кадры
+
+    def close(self):
+        self.sock.close()
+
+
+class NetClient(object):
+    # Клиент: connect(), потом на каждом кадре step(нажатия) и poll().
+    # world - свой simulation.World уровня сервера, hero - свой герой,
+    # others - {id: Player} чужие герои, монстры стоят там, где их видел
+    # сервер.
+
+    def __init__(self, host='127.0.0.1', port=PORT):
+        import player
+        player.DIE_DELAY = 0  # предсказание проигрывает кадры заново
+        self.server = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.player_id = None
+        self.level = None
+        self.world = None
+        self.hero = None
+        self.others = {}
+        self.monsters = []
+        self.states = {}  # {кадр: состояние} принятые снимки
+        self.acked = 0
+        self.input_seq = 0
+        self.pending = []  # [(номер, биты)] еще не обработаны сервером
+        # для замеров
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.corrections = 0  # сколько раз сервер поправил предсказание
+
+    def _send(self, data):
+        try:
+            self.sock.sendto(data, self.server)
+        except socket.error:
+            return
+        self.bytes_sent += len(data)
+
+    def hello(self):
+        self._send(HELLO)
+
+    def connect(self, attempts=CONNECT_ATTEMPTS, wait=CONNECT_WAIT):
+        for attempt in xrange(attempts):
+            self.hello()
+            self.poll(wait)
+            if self.world is not None:
+                return
+        raise IOError(u'no answer from %s:%d' % self.server)
+
+    def _welcome(self, data):
+        kind, self.player_id, tick = WELCOME_HEADER.unpack_from(data)
+        self.level = data[WELCOME_HEADER.size:].decode('utf-8')
+        self.world = simulation.World(simulation.load_level(self.level))
+        self.hero = self.world.spawn_hero()
+        self.monsters = self.world.monsters.sprites()
+
+    def step(self, left, right, up, running):
+        # нажатия этого кадра: герой двигается сразу, нажатия - на сервер
+        self.input_seq += 1
+        self.pending.append((self.input_seq,
+                             replay.pack(left, right, up, running)))
+        self.hero.update(left, right, up, running, self.world.platforms)
+        recent = self.pending[-INPUT_REDUNDANCY:]
+        self._send(INPUT_HEADER.pack(INPUT, self.acked, recent[0][0],
+                                     len(recent)) +
+                   str(bytearray(bits for seq, bits in recent)))
+
+    def poll(self, timeout=0):
+        # принимает пакеты и применяет самый свежий снимок
+        latest = None
+        for data, address in _receive_all(self.sock, timeout):
+            self.bytes_received += len(data)
+            kind = data[:1]
+            try:
+                if kind == WELCOME and self.world is None:
+                    self._welcome(data)
+                elif kind == SNAPSHOT and self.world is not None:
+                    decoded = decode_snapshot(data, self.states)
+                    if decoded is not None and decoded[0] > self.acked:
+                        latest = decoded
+                        self.acked = decoded[0]
+                        self.states[self.acked] = decoded[2]
+                        if len(self.states) > HISTORY:
+                            del self.states[min(self.states)]
+            except struct.error:
+                pass  # битый пакет
+        if latest is not None:
+            self._apply(latest[1], latest[2])
+
+    def _apply(self, input_seq, state):
+        for (kind, index), values in state.iteritems():
+            if kind == MONSTER:
+                if index < len(self.monsters):
+                    self.monsters[index].rect.topleft = values
+            elif kind == PLAYER:
+                other = self.others.get(index)
+                if other is None:
+                    other = self.others[index] = self.world.spawn_player()
+                set_player_state(other, values)
+        for index in self.others.keys():
+            if (PLAYER, index) not in state:  # ушел из вида или отключился
+                self.world.remove_player(self.others.pop(index))
+        own = state.get((HERO, 0))
+        if own is None:
+            return
+        # сервер обработал нажатия до input_seq: ставим героя, как у него,
+        # и проигрываем остальные
+        predicted = self.hero.rect.topleft
+        set_hero_state(self.hero, own)
+        self.pending = [(seq, bits) for seq, bits in self.pending
+                        if seq > input_seq]
+        platforms = self.world.platforms
+        for seq, bits in self.pending:
+            left, right, up, running = replay.unpack(bits)
+            self.hero.update(left, right, up, running, platforms)
+        if self.hero.rect.topleft != predicted:
+            self.corrections += 1
+
+    def animate(self):
+        # картинки монстров, телепортов и принцесс для окна; двигает их
+        # сервер
+        self.world.animatedEntities.update()
+        for monster in self.monsters:
+            monster.animate()
+
+    def close(self):
+        if self.world is not None:
+            self._send(BYE)
+        self.sock.close()
+
+
+def run_client(host, port):
+    # окно игры, подключенное к серверу
+    import pygame
+    import assets
+    import framebuffer
+    import controls
+    pygame.init()
+    screen = pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT), 0, 32)
+    pygame.display.set_caption("Super Mario Boy")
+    assets.warm_up()
+    client = NetClient(host, port)
+    client.connect()
+    renderer = framebuffer.FrameRenderer(screen)
+    renderer.reset(client.level, client.world)
+    timer = pygame.time.Clock()
+    keys = controls.Controls()
+    keys.install()
+    try:
+        while True:
+            timer.tick(TICK_RATE)
+            left, right, up, running = keys.poll()
+            if keys.quit:
+                return
+            client.step(left, right, up, running)
+            client.poll()
+            client.animate()
+            renderer.render()
+            pygame.display.update()
+    finally:
+        client.close()
+
+
+def run_bots(level, clients, ticks, snapshot_every=SNAPSHOT_EVERY, seed=0):
+    # Сервер и clients ботов в одном процессе, по loopback, без ожидания
+    # часов: кадр - нажатия всех ботов, прием, tick() сервера, снимки.
+    # -> (сервер, боты)
+    import random
+    import batchsim
+    server = NetServer(level, port=0, snapshot_every=snapshot_every)
+    host, port = server.address
+    bots = []
+    for i in xrange(clients):
+        bot = NetClient(host, port)
+        bot.hello()
+        server.poll(CONNECT_WAIT)
+        bot.poll(CONNECT_WAIT)
+        if bot.world is None:
+            raise IOError(u'bot %d did not connect' % i)
+        bots.append((bot, batchsim.bot_random(random.Random(seed + i))))
+    for tick in xrange(ticks):
+        for bot, inputs in bots:
+            bot.step(*next(inputs))
+        server.poll()
+        server.tick()
+        for bot, inputs in bots:
+            bot.poll()
+    return server, [bot for bot, inputs in bots]
+
+
+def _write(line):
+    # utf-8 явно: в pipe или файл Python 2 пишет unicode как ascii и на
+    # кириллице падает
+    print(line.encode('utf-8'))
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=u'Игра по сети')
+    parser.add_argument('mode', choices=('server', 'client', 'bots'),
+                        help=u'server - сервер уровня, client - окно игры, '
+                        u'bots - сервер и боты по loopback с замером')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help=u'адрес сервера (по умолчанию 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=PORT,
+                        help=u'порт сервера (по умолчанию %d)' % PORT)
+    parser.add_argument('--level', default=DEFAULT_LEVEL,
+                        help=u'уровень сервера, как в loadLevel')
+    parser.add_argument('--clients', type=int, default=16,
+                        help=u'ботов для bots (по умолчанию 16)')
+    parser.add_argument('--ticks', type=int, default=TICK_RATE * 30,
+                        help=u'кадров для bots (по умолчанию %d)'
+                        % (TICK_RATE * 30))
+    parser.add_argument('--snapshot-every', type=int, default=SNAPSHOT_EVERY,
+                        help=u'кадров между снимками (по умолчанию %d)'
+                        % SNAPSHOT_EVERY)
+    args = parser.parse_args(argv)
+
+    if args.mode == 'client':
+        run_client(args.host, args.port)
+        return
+    if args.mode == 'server':
+        server = NetServer(args.level, args.host, args.port,
+                           args.snapshot_every)
+        _write(u"%s на %s:%d" % (args.level, server.address[0],
+                                 server.address[1]))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+        return
+
+    server, bots = run_bots(args.level, args.clients, args.ticks,
+                            args.snapshot_every)
+    seconds = float(args.ticks) / TICK_RATE  # игрового времени
+    _write(u"%d клиентов, %d кадров (%.0f с игры)" % (
+        args.clients, args.ticks, seconds))
+    _write(u"сервер: %.3f мс на кадр, %.0f кадров/с без ожидания" % (
+        server.tick_seconds * 1000 / args.ticks,
+        args.ticks / max(server.tick_seconds, 1e-9)))
+    _write(u"снимков %d, из них полных %d, в среднем %.0f байт" % (
+        server.snapshots, server.full_snapshots,
+        float(server.bytes_sent) / max(server.snapshots, 1)))
+    _write(u"трафик на клиента: к нему %.1f КБ/с, от него %.1f КБ/с" % (
+        server.bytes_sent / 1024.0 / args.clients / seconds,
+        server.bytes_received / 1024.0 / args.clients / seconds))
+    _write(u"поправок предсказания: %d на %d снимков" % (
+        sum(bot.corrections for bot in bots), server.snapshots))
+    for bot in bots:
+        bot.close()
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
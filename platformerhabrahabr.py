@@ -1,197 +1,262 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
+import sys
+import startup  # Профилировщик запуска, подключается первым
+startup.install(sys.argv)
+
 # Импортируем библиотеку pygame
 import pygame
-from pygame import *
-from player import *
-from blocks import *
-from monsters import *
+from pygame import Rect, Surface, Color
+from pygame import K_F3
 
-import tmxreader  # Может загружать tmx файлы
 import helperspygame  # Преобразует tmx карты в формат  спрайтов pygame
+import assets  # Все картинки игры, загружаются заранее
+import simulation  # Уровень без окна: тела, монстры, герой
+import profiler  # Время этапов кадра, оверлей по F3
+import replay  # Запись и воспроизведение ввода
+import statestream  # Запись состояния для зрителей
+import player
+import controls  # Клавиши действий и команд
+import idleframes  # Пропуск одинаковых кадров и простой
+# Камера следит за героем, размер окна
+from camera import WIN_WIDTH, WIN_HEIGHT, CENTER_OF_SCREEN
+from camera import Camera, camera_configure
 
 # Объявляем переменные
-WIN_WIDTH = 800  # Ширина создаваемого окна
-WIN_HEIGHT = 640  # Высота
 # Группируем ширину и высоту в одну переменную
 DISPLAY = (WIN_WIDTH, WIN_HEIGHT)
 BACKGROUND_COLOR = "#000000"
-CENTER_OF_SCREEN = WIN_WIDTH / 2, WIN_HEIGHT / 2
 
 FILE_DIR = os.path.dirname(os.path.realpath(__file__))
 
-
-class Camera(object):
-
-    def __init__(self, camera_func, width, height):
-        self.camera_func = camera_func
-        self.state = Rect(0, 0, width, height)
-
-    def apply(self, target):
-        return target.rect.move(self.state.topleft)
-
-    def update(self, target):
-        self.state = self.camera_func(self.state, target.rect)
-
-    def reverse(self, pos):  # получение внутренних координат из глобальных
-        return pos[0] - self.state.left, pos[1] - self.state.top
-
-
-def camera_configure(camera, target_rect):
-    l, t, _, _ = target_rect
-    _, _, w, h = camera
-    l, t = -l+WIN_WIDTH / 2, -t+WIN_HEIGHT / 2
-
-    # Ограничения по границам
-    l = min(0, l)                            # Не движемся дальше левой
-    l = max(-(camera.width-WIN_WIDTH), l)    # Не движемся дальше правой
-    t = max(-(camera.height-WIN_HEIGHT), t)  # Не движемся дальше нижней
-    t = min(0, t)                            # Не движемся дальше верхней
-
-    return Rect(l, t, w, h)
+resources = None  # загрузчик тайлов текущего уровня, см. loadLevel
 
 
 def loadLevel(name):
     # объявляем глобальные переменные
-    global playerX, playerY  # это координаты героя
+    global world  # все, что двигается и сталкивается: simulation.World
     global total_level_height, total_level_width
+    global level_left, level_top  # начало уровня, у бесконечных карт < 0
     global sprite_layers  # все слои карты
+    global streaming_world  # окно подгруженных чанков для бесконечных карт
+    global resources  # загрузчик тайлов текущего уровня
 
-    world_map = tmxreader.TileMapParser().parse_decode(  # загружаем карту
-            '%s/%s.tmx' % (FILE_DIR, name))
+    # загружаем карту
+    world_map = simulation.load_map(simulation.level_file(name))
+    startup.phase('parse level')
     # инициируем преобразователь карты
-    resources = helperspygame.ResourceLoaderPygame()
+    # тайлы - это subsurface уже загруженного tiles.png, без копирования
+    old_resources = resources
+    resources = helperspygame.ResourceLoaderPygame(assets.load_image,
+                                                   use_subsurfaces=True)
     resources.load(world_map)  # и преобразуем карту в понятный pygame формат
+    # нарезанные тайлсеты общие для всех уровней: новый уровень уже взял
+    # те, что ему нужны, остальные от прошлого уровня выкидываем
+    if old_resources is not None:
+        old_resources.release()
+        helperspygame.TILESET_CACHE.evict()
 
     # получаем все слои карты
     sprite_layers = helperspygame.get_layers_from_map(resources)
-
-    # берем слои по порядку 0 - слой фона, 1- слой блоков,
-    # 2 - слой смертельных блоков,
-    # 3 - слой объектов монстров, 4 - слой объектов телепортов
-    platforms_layer = sprite_layers[1]
-    dieBlocks_layer = sprite_layers[2]
-
-    # перебираем все координаты тайлов
-    for row in range(0, platforms_layer.num_tiles_x):
-        for col in range(0, platforms_layer.num_tiles_y):
-            if platforms_layer.content2D[col][row] is not None:
-                # как и прежде создаем объкты класса Platform
-                pf = Platform(row * PLATFORM_WIDTH, col * PLATFORM_WIDTH)
-                platforms.append(pf)
-            if dieBlocks_layer.content2D[col][row] is not None:
-                bd = BlockDie(row * PLATFORM_WIDTH, col * PLATFORM_WIDTH)
-                platforms.append(bd)
-
-    teleports_layer = sprite_layers[4]
-    for teleport in teleports_layer.objects:
-        try:  # если произойдет ошибка на слое телепортов
-            goX = int(teleport.properties["goX"]) * PLATFORM_WIDTH
-            goY = int(teleport.properties["goY"]) * PLATFORM_HEIGHT
-            x = teleport.x
-            y = teleport.y - PLATFORM_HEIGHT
-            tp = BlockTeleport(x, y, goX, goY)
-            entities.add(tp)
-            platforms.append(tp)
-            animatedEntities.add(tp)
-        except:  # то игра не вылетает, а просто выводит сообщение о неудаче
-            print(u"Ошибка на слое телепортов")
-
-    monsters_layer = sprite_layers[3]
-    for monster in monsters_layer.objects:
-        try:
-            x = monster.x
-            y = monster.y
-            if monster.name == "Player":
-                playerX = x
-                playerY = y - PLATFORM_HEIGHT
-            elif monster.name == "Princess":
-                pr = Princess(x, y - PLATFORM_HEIGHT)
-                platforms.append(pr)
-                entities.add(pr)
-                animatedEntities.add(pr)
-            else:
-                up = int(monster.properties["up"])
-                maxUp = int(monster.properties["maxUp"])
-                left = int(monster.properties["left"])
-                maxLeft = int(monster.properties["maxLeft"])
-                mn = Monster(x, y - PLATFORM_HEIGHT, left, up, maxLeft, maxUp)
-                entities.add(mn)
-                platforms.append(mn)
-                monsters.add(mn)
-        except:
-            print(u"Ошибка на слое монстров")
+    startup.phase('load tiles')
+
+    # тела для столкновений, монстры, телепорты и принцесса
+    world = simulation.World(world_map)
+    startup.phase('spawn objects')
+
+    # у бесконечных карт тайлы подгружаются по чанкам вокруг камеры,
+    # тела для столкновений создаст streaming_world
+    streaming_world = None
+    if world_map.infinite:
+        import streaming  # Подгружает чанки бесконечных карт вокруг камеры
+        streaming_world = streaming.StreamingWorld(
+                sprite_layers,
+                sprite_layers[simulation.PLATFORMS_LAYER],
+                sprite_layers[simulation.DIE_BLOCKS_LAYER],
+                world.platforms)
+        streaming_world.adopt(world.objects)
+        # сразу подгружаем чанки вокруг героя, чтобы он не провалился
+        playerX, playerY = world.playerX, world.playerY
+        if playerX is None:
+            playerX, playerY = simulation.DEFAULT_PLAYER_POS
+        streaming_world.update(Rect(playerX - WIN_WIDTH / 2,
+                                    playerY - WIN_HEIGHT / 2,
+                                    WIN_WIDTH, WIN_HEIGHT))
+        total_level_width = streaming_world.level_rect.width
+        total_level_height = streaming_world.level_rect.height
+        level_left = streaming_world.level_rect.left
+        level_top = streaming_world.level_rect.top
+        return
 
     # Высчитываем фактические ширину и высоту уровня
-    total_level_width = platforms_layer.num_tiles_x * PLATFORM_WIDTH
-    total_level_height = platforms_layer.num_tiles_y * PLATFORM_HEIGHT
-
-
-def main():
+    total_level_width = world.width
+    total_level_height = world.height
+    level_left = level_top = 0
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=u'Super Mario Boy')
+    parser.add_argument('--record', metavar='FILE',
+                        help=u'записать ввод в файл (см. replay.py)')
+    parser.add_argument('--replay', metavar='FILE',
+                        help=u'воспроизвести записанный ввод, без '
+                        u'ограничения FPS')
+    parser.add_argument('--stream', metavar='FILE',
+                        help=u'записать состояние по кадрам для просмотра '
+                        u'(см. statestream.py)')
+    parser.add_argument('--keys', metavar='SPEC',
+                        help=u'свои клавиши, например left=a,right=d,'
+                        u'up=w+space,running=lshift')
+    parser.add_argument('--idle', action='store_true',
+                        help=u'не перерисовывать одинаковые кадры и '
+                        u'замедляться, пока ничего не происходит')
+    parser.add_argument(startup.PROFILE_FLAG, action='store_true',
+                        help=u'замерить запуск до первого кадра и выйти')
+    args = parser.parse_args(argv)
+    bindings = None
+    if args.keys:
+        try:
+            bindings = controls.parse_bindings(args.keys)
+        except ValueError as e:
+            parser.error(e)
+    startup.phase('imports')
     pygame.init()  # Инициация PyGame, обязательная строчка
     screen = pygame.display.set_mode(DISPLAY)  # Создаем окошко
     pygame.display.set_caption("Super Mario Boy")  # Пишем в шапку
+    startup.phase('pygame init')
+    # загружаем все картинки до первого кадра; сколько это заняло,
+    # печатаем только вместе с отчетом о запуске (--profile-startup)
+    timings = assets.warm_up()
+    if startup.enabled:
+        assets.print_timings(timings)
+    startup.phase('warm up images')
     bg = Surface((WIN_WIDTH, WIN_HEIGHT))  # Создание видимой поверхности
     # будем использовать как фон
 
     renderer = helperspygame.RendererPygame()  # визуализатор
-    for lvl in range(1, 4):
-        loadLevel(os.path.join("levels", "map_%s" % lvl))
+    frame_profiler = profiler.FrameProfiler()
+    mark = frame_profiler.mark  # отметка конца этапа кадра
+    # долгие кадры сохраняются в traces/*.json (Perfetto, chrome://tracing)
+    stutter = profiler.StutterDetector(frame_profiler)
+    keys = controls.Controls(bindings)
+    keys.commands[K_F3] = frame_profiler.toggle  # показать/спрятать оверлей
+    keys.install()
+    idle = None
+    if args.idle:
+        idle = idleframes.IdleFrames()
+        idle.install()
+    recorder = None
+    if args.record:
+        recorder = replay.Recorder()
+    streamer = None
+    if args.stream:
+        streamer = statestream.StateRecorder(args.stream)
+    if args.replay:
+        recorded = replay.load(args.replay)
+        levels = [level['level'] for level in recorded]
+        player.DIE_DELAY = 0  # воспроизводим без пауз
+    else:
+        levels = [os.path.join("levels", "map_%s" % lvl)
+                  for lvl in range(1, 4)]
+    for lvl, level_name in enumerate(levels, 1):
+        loadLevel(level_name)
         # Заливаем поверхность сплошным цветом
         bg.fill(Color(BACKGROUND_COLOR))
 
-        left = right = False  # по умолчанию - стоим
-        up = False
-        running = False
-        try:
-            # создаем героя по (x,y) координатам
-            hero = Player(playerX, playerY)
-            entities.add(hero)
-        except:
-            print(u"Не удалось на карте найти героя,"
-                  u" взяты координаты по-умолчанию")
-            hero = Player(65, 65)
-        entities.add(hero)
+        hero = world.spawn_hero()
+
+        def annotate():  # подробности для trace файла в момент рывка
+            return {'level': lvl,
+                    'player': [hero.rect.x, hero.rect.y],
+                    'entities': len(world.entities),
+                    'monsters': len(world.monsters),
+                    'platforms': len(world.platforms)}
+        stutter.annotate = annotate
+        if recorder is not None:
+            recorder.start_level(level_name)
+        if streamer is not None:
+            streamer.start_level(level_name, world)
+        if args.replay:
+            replay_inputs = replay.inputs(recorded[lvl - 1]['inputs'])
+        tick_count = 0
 
         timer = pygame.time.Clock()
 
         camera = Camera(camera_configure,
                         total_level_width,
-                        total_level_height)
+                        total_level_height,
+                        level_left, level_top)
+        camera.update(hero)  # сразу смотрим на героя
+        # и слои первого кадра рисуем оттуда же, а не с камеры прошлого
+        # уровня: иначе в простое (--idle) этот кадр может остаться надолго
+        center_offset = camera.reverse(CENTER_OF_SCREEN)
+        renderer.set_camera_position_and_size(center_offset[0],
+                                              center_offset[1],
+                                              WIN_WIDTH, WIN_HEIGHT, "center")
+        if idle is not None:
+            idle.reset()
 
         while not hero.winner:  # Основной цикл программы
-            timer.tick(60)
-            for e in pygame.event.get():  # Обрабатываем события
-                if e.type == QUIT:
-                    raise(SystemExit, "QUIT")
-                if e.type == KEYDOWN and e.key == K_UP:
-                    up = True
-                if e.type == KEYDOWN and e.key == K_LEFT:
-                    left = True
-                if e.type == KEYDOWN and e.key == K_RIGHT:
-                    right = True
-                if e.type == KEYDOWN and e.key == K_LSHIFT:
-                    running = True
-
-                if e.type == KEYUP and e.key == K_UP:
-                    up = False
-                if e.type == KEYUP and e.key == K_RIGHT:
-                    right = False
-                if e.type == KEYUP and e.key == K_LEFT:
-                    left = False
-                if e.type == KEYUP and e.key == K_LSHIFT:
-                    running = False
-            for sprite_layer in sprite_layers:  # перебираем все слои
-                # и если это не слой объектов
-                if not sprite_layer.is_object_group:
-                    # отображаем его
-                    renderer.render_layer(screen, sprite_layer)
-
-            for e in entities:
-                screen.blit(e.image, camera.apply(e))
-            animatedEntities.update()  # показываеaм анимацию
-            monsters.update(platforms)  # передвигаем всех монстров
+            missed = 0  # такты, проспанные в простое
+            if not args.replay:
+                if idle is not None:
+                    missed = idle.wait(timer) - 1  # в простое кадры реже
+                else:
+                    timer.tick(60)
+            frame_profiler.begin_frame()  # ожидание в tick не считаем
+            # события и нажатые клавиши
+            left, right, up, running = keys.poll()
+            if keys.quit:
+                if recorder is not None:  # недоигранный уровень тоже
+                    recorder.finish_level(world)
+                    recorder.save(args.record)
+                if streamer is not None:
+                    streamer.close()
+                stutter.flush()
+                raise(SystemExit, "QUIT")
+            for tick in xrange(missed):
+                # в простое клавиши отпущены, а рисовать эти такты не нужно
+                if recorder is not None:
+                    recorder.record(False, False, False, False)
+                tick_count += 1
+                world.step(False, False, False, False, animate=False)
+                if streamer is not None:
+                    streamer.record(world)
+            if missed:
+                mark('idle ticks')
+            if args.replay:  # клавиши берем из записи
+                try:
+                    left, right, up, running = next(replay_inputs)
+                except StopIteration:
+                    break
+            if recorder is not None:
+                recorder.record(left, right, up, running)
+            tick_count += 1
+            mark('events')
+            if streaming_world is not None:
+                # подгружаем чанки вокруг камеры и выгружаем остальные
+                streaming_world.update(Rect(-camera.state.left,
+                                            -camera.state.top,
+                                            WIN_WIDTH, WIN_HEIGHT))
+                mark('streaming')
+            # кадр, который совпадает с тем, что на экране, не рисуем
+            draw = idle is None or idle.changed(
+                camera, world.entities, left or right or up or running,
+                frame_profiler.visible)
+            if draw:
+                for sprite_layer in sprite_layers:  # перебираем все слои
+                    # и если это не слой объектов
+                    if not sprite_layer.is_object_group:
+                        # отображаем его
+                        renderer.render_layer(screen, sprite_layer)
+                mark('render_layer')
+
+                for e in world.entities:
+                    screen.blit(e.image, camera.apply(e))
+                mark('entities blit')
             camera.update(hero)  # центризируем камеру относительно персонаж
             # получаем координаты внутри длинного уровня
             center_offset = camera.reverse(CENTER_OF_SCREEN)
@@ -200,18 +265,46 @@ def main():
                                                   WIN_WIDTH,
                                                   WIN_HEIGHT,
                                                   "center")
-            hero.update(left, right, up, running, platforms)  # передвижение
-            # обновление и вывод всех изменений на экран
-            pygame.display.update()
-            # Каждую итерацию необходимо всё перерисовывать
-            screen.blit(bg, (0, 0))
+            mark('camera')
+            # анимации, монстры и передвижение героя
+            world.step(left, right, up, running, mark)
+            if streamer is not None:
+                streamer.record(world)
+                mark('stream')
+            if draw:
+                frame_profiler.draw(screen)
+                mark('overlay')
+                # обновление и вывод всех изменений на экран
+                pygame.display.update()
+                mark('display.update')
+                startup.first_frame()
+                # Каждую итерацию необходимо всё перерисовывать
+                screen.blit(bg, (0, 0))
+                mark('clear')
+            frame_profiler.end_frame()
+            stutter.check()
+        stutter.flush()  # рывок в последних кадрах уровня
+
+        if recorder is not None:
+            recorder.finish_level(world)
+            recorder.save(args.record)
+        if args.replay:
+            errors = replay.check(recorded[lvl - 1]['final'], world,
+                                  tick_count)
+            line = u"%s: %d кадров, %s" % (level_name, tick_count,
+                                           u"OK" if not errors
+                                           else u"РАСХОЖДЕНИЕ")
+            print(line.encode('utf-8'))  # и в pipe без PYTHONIOENCODING
+            for error in errors:
+                print((u"    " + error).encode('utf-8'))
+            continue
 
         for sprite_layer in sprite_layers:
             if not sprite_layer.is_object_group:
                 renderer.render_layer(screen, sprite_layer)
 
         # когда заканчиваем уровень
-        for e in entities:
+        for e in world.entities:
             screen.blit(e.image, camera.apply(e))  # еще раз все перерисовываем
         font = pygame.font.Font(None, 38)
         text = font.render(
@@ -221,13 +314,10 @@ def main():
         screen.blit(text, (10, 100))
         pygame.display.update()
         # ждем 10 секунд и после - переходим на следующий уровень
-        time.wait(10000)
+        pygame.time.wait(10000)
+    if streamer is not None:
+        streamer.close()
 
 level = []
-entities = pygame.sprite.Group()  # Все объекты
-# все анимированные объекты, за исключением героя
-animatedEntities = pygame.sprite.Group()
-monsters = pygame.sprite.Group()  # Все передвигающиеся объекты
-platforms = []  # то, во что мы будем врезаться или опираться
 if __name__ == "__main__":
     main()
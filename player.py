@@ -1,9 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from pygame import *
+from pygame import sprite, Surface, Color, Rect, time
 import pyganim
 import os
+import assets
 import blocks
 import monsters
 
@@ -18,7 +19,13 @@ JUMP_EXTRA_POWER = 2  # дополнительная сила прыжка
 GRAVITY = 0.35 # Сила, которая будет тянуть нас вниз
 ANIMATION_DELAY = 0.1 # скорость смены кадров
 ANIMATION_SUPER_SPEED_DELAY = 0.05 # скорость смены кадров при ускорении
+DIE_DELAY = 1000 # пауза после смерти, мс; 0 - без паузы (симуляция без окна)
 ICON_DIR = os.path.dirname(__file__) #  Полный путь к каталогу с файлами
+# поза героя - биты: в прыжке, с ускорением, движется влево, вправо
+POSE_FLY = 1
+POSE_RUNNING = 2
+POSE_LEFT = 4
+POSE_RIGHT = 8
 
 ANIMATION_RIGHT = [('%s/mario/r1.png' % ICON_DIR),
             ('%s/mario/r2.png' % ICON_DIR),
@@ -44,6 +51,7 @@ class Player(sprite.Sprite):
         self.yvel = 0 # скорость вертикального перемещения
         self.onGround = False # На земле ли я?
         self.isFly = False
+        self.deaths = 0 # сколько раз погибли, для автоматических прогонов
         self.image = Surface((WIDTH,HEIGHT))
         self.image.fill(Color(COLOR))
         self.rect = Rect(x, y, WIDTH, HEIGHT) # прямоугольный объект
@@ -52,36 +60,48 @@ class Player(sprite.Sprite):
         boltAnim = []
         boltAnimSuperSpeed = []
         for anim in ANIMATION_RIGHT:
+            anim = assets.load_image(anim) # картинки уже в кэше, см. assets.warm_up
             boltAnim.append((anim, ANIMATION_DELAY))
             boltAnimSuperSpeed.append((anim, ANIMATION_SUPER_SPEED_DELAY))
         self.boltAnimRight = pyganim.PygAnimation(boltAnim)
         self.boltAnimRight.play()
+        self.boltAnimRight.compile() # номер кадра - из таблицы, см. pyganim.compile
         self.boltAnimRightSuperSpeed = pyganim.PygAnimation(boltAnimSuperSpeed)
         self.boltAnimRightSuperSpeed.play()
+        self.boltAnimRightSuperSpeed.compile()
 #        Анимация движения влево        
         boltAnim = []
         boltAnimSuperSpeed = [] 
         for anim in ANIMATION_LEFT:
+            anim = assets.load_image(anim)
             boltAnim.append((anim, ANIMATION_DELAY))
             boltAnimSuperSpeed.append((anim, ANIMATION_SUPER_SPEED_DELAY))
         self.boltAnimLeft = pyganim.PygAnimation(boltAnim)
         self.boltAnimLeft.play()
+        self.boltAnimLeft.compile()
         self.boltAnimLeftSuperSpeed = pyganim.PygAnimation(boltAnimSuperSpeed)
         self.boltAnimLeftSuperSpeed.play()
+        self.boltAnimLeftSuperSpeed.compile()
         
-        self.boltAnimStay = pyganim.PygAnimation(ANIMATION_STAY)
+        self.boltAnimStay = pyganim.PygAnimation(assets.frames(ANIMATION_STAY))
         self.boltAnimStay.play()
-        self.boltAnimStay.blit(self.image, (0, 0)) # По-умолчанию, стоим
+        self.boltAnimStay.compile()
+        self.boltAnim = self.boltAnimStay # По-умолчанию, стоим
+        self.boltAnim.blit(self.image, (0, 0))
         
-        self.boltAnimJumpLeft= pyganim.PygAnimation(ANIMATION_JUMP_LEFT)
+        self.boltAnimJumpLeft= pyganim.PygAnimation(assets.frames(ANIMATION_JUMP_LEFT))
         self.boltAnimJumpLeft.play()
+        self.boltAnimJumpLeft.compile()
         
-        self.boltAnimJumpRight= pyganim.PygAnimation(ANIMATION_JUMP_RIGHT)
+        self.boltAnimJumpRight= pyganim.PygAnimation(assets.frames(ANIMATION_JUMP_RIGHT))
         self.boltAnimJumpRight.play()
+        self.boltAnimJumpRight.compile()
         
-        self.boltAnimJump= pyganim.PygAnimation(ANIMATION_JUMP)
+        self.boltAnimJump= pyganim.PygAnimation(assets.frames(ANIMATION_JUMP))
         self.boltAnimJump.play()
+        self.boltAnimJump.compile()
         self.winner = False
+        self.pose = 0 # стоим, см. draw_pose
         
 
     def update(self, left, right, up, running, platforms):
@@ -108,29 +128,12 @@ class Player(sprite.Sprite):
             if running: # если усkорение
                 self.xvel+=MOVE_EXTRA_SPEED # то передвигаемся быстрее
 
-        self.image.fill(Color(COLOR))
-        if self.isFly:
-            if self.xvel < 0:
-                self.boltAnimJumpLeft.blit(self.image, (0, 0)) # отображаем анимацию прыжка
-            elif self.xvel > 0:
-                self.boltAnimJumpRight.blit(self.image, (0, 0))
-            else:
-                self.boltAnimJump.blit(self.image, (0, 0))
-        else:
-           if running:
-                if self.xvel < 0:
-                    self.boltAnimLeftSuperSpeed.blit(self.image, (0, 0)) # отображаем анимацию движения
-                elif self.xvel > 0:
-                    self.boltAnimRightSuperSpeed.blit(self.image, (0, 0))
-                else:
-                    self.boltAnimStay.blit(self.image, (0, 0))
-           else:
-                if self.xvel < 0:
-                    self.boltAnimLeft.blit(self.image, (0, 0)) # отображаем анимацию движения
-                elif self.xvel > 0:
-                    self.boltAnimRight.blit(self.image, (0, 0))
-                else:
-                    self.boltAnimStay.blit(self.image, (0, 0))
+        # какую анимацию показать, запоминаем для записи (statestream.py)
+        self.pose = ((POSE_FLY if self.isFly else 0) |
+                     (POSE_RUNNING if running else 0) |
+                     (POSE_LEFT if self.xvel < 0 else 0) |
+                     (POSE_RIGHT if self.xvel > 0 else 0))
+        self.draw_pose(self.pose)
 
 
          
@@ -155,6 +158,32 @@ class Player(sprite.Sprite):
         self.collide(self.xvel, 0, platforms)
 
 
+    def draw_pose(self, pose):
+        self.image.fill(Color(COLOR))
+        if pose & POSE_FLY:
+            if pose & POSE_LEFT:
+                self.boltAnim = self.boltAnimJumpLeft # отображаем анимацию прыжка
+            elif pose & POSE_RIGHT:
+                self.boltAnim = self.boltAnimJumpRight
+            else:
+                self.boltAnim = self.boltAnimJump
+        else:
+           if pose & POSE_RUNNING:
+                if pose & POSE_LEFT:
+                    self.boltAnim = self.boltAnimLeftSuperSpeed # отображаем анимацию движения
+                elif pose & POSE_RIGHT:
+                    self.boltAnim = self.boltAnimRightSuperSpeed
+                else:
+                    self.boltAnim = self.boltAnimStay
+           else:
+                if pose & POSE_LEFT:
+                    self.boltAnim = self.boltAnimLeft # отображаем анимацию движения
+                elif pose & POSE_RIGHT:
+                    self.boltAnim = self.boltAnimRight
+                else:
+                    self.boltAnim = self.boltAnimStay
+        self.boltAnim.blit(self.image, (0, 0)) # анимация, которая сейчас на картинке
+
     def collide(self, xvel, yvel, platforms):
         for p in platforms:
             if sprite.collide_rect(self, p): # если есть пересечение платформы с игроком
@@ -187,7 +216,9 @@ class Player(sprite.Sprite):
         self.rect.y = goY
         
     def die(self):
-        time.wait(1000)
+        self.deaths += 1
+        if DIE_DELAY:
+            time.wait(DIE_DELAY)
         self.xvel = 0
         self.yvel = 0
         self.teleporting(self.startX, self.startY) # перемещаемся в начальные координаты
\ No newline at end of file
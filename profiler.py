@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Покадровый профилировщик и его оверлей (включается клавишей F3).
+# Основной цикл отмечает конец каждого этапа кадра: profiler.mark('этап').
+# Отметка - это один вызов таймера и сложение, поэтому профилировщик
+# работает всегда, а клавиша только показывает или прячет оверлей.
+# Для каждого этапа за последние HISTORY кадров показываются среднее,
+# 95-й перцентиль и максимум, ниже - график времени кадров.
+# Текст собирается из заранее отрисованных букв и перерисовывается раз в
+# REFRESH кадров, так что сам оверлей почти не влияет на замеры.
+# StutterDetector по тем же отметкам ловит редкие долгие кадры и сохраняет
+# окно кадров вокруг них в trace файл для Perfetto или chrome://tracing.
+
+import os
+import json
+import time
+from timeit import default_timer
+
+import pygame
+
+HISTORY = 120  # сколько последних кадров учитывать
+REFRESH = 15  # раз в сколько кадров обновлять цифры
+FRAME_BUDGET = 1.0 / 60  # кадр при 60 FPS, линия на графике
+FONT_SIZE = 18
+TEXT_COLOR = (230, 230, 230)
+PANEL_COLOR = (20, 20, 20)
+PANEL_ALPHA = 210
+GRAPH_HEIGHT = 60
+GRAPH_COLOR = (90, 200, 90)
+GRAPH_SLOW_COLOR = (230, 70, 70)  # кадры дольше бюджета
+GRAPH_BUDGET_COLOR = (230, 230, 90)
+MARGIN = 6
+
+STUTTER_THRESHOLD = 0.05  # кадр дольше этого (3 кадра при 60 FPS) - рывок
+STUTTER_BEFORE = 60  # сколько кадров до рывка сохранять в trace
+STUTTER_AFTER = 20  # и сколько после
+STUTTER_MAX_TRACES = 20  # больше файлов за один запуск не пишем
+TRACE_DIR = 'traces'
+TEXT_CACHE_SIZE = 1000  # сколько готовых строк помнить
+
+
+class GlyphCache(object):
+    # Отрисованные буквы шрифта: каждая буква рендерится один раз,
+    # строки собираются из букв и тоже запоминаются (названия этапов
+    # не меняются, а цифры часто повторяются).
+
+    def __init__(self, font, color, background):
+        self.font = font
+        self.color = color
+        self.background = background
+        self.height = font.get_linesize()
+        self._glyphs = {}  # {буква: Surface}
+        self._texts = {}  # {строка: Surface}
+
+    def glyph(self, char):
+        img = self._glyphs.get(char)
+        if img is None:
+            img = _display_format(self.font.render(char, True, self.color,
+                                                   self.background))
+            self._glyphs[char] = img
+        return img
+
+    def text(self, text):
+        img = self._texts.get(text)
+        if img is None:
+            glyphs = [self.glyph(char) for char in text]
+            img = pygame.Surface((sum(g.get_width() for g in glyphs) or 1,
+                                  self.height))
+            img = _display_format(img)
+            img.fill(self.background)
+            x = 0
+            for glyph in glyphs:
+                img.blit(glyph, (x, 0))
+                x += glyph.get_width()
+            if len(self._texts) >= TEXT_CACHE_SIZE:
+                self._texts.clear()
+            self._texts[text] = img
+        return img
+
+    def size(self, text):
+        return self.text(text).get_size()
+
+    def draw(self, surface, text, pos):
+        surface.blit(self.text(text), pos)
+
+
+class FrameProfiler(object):
+
+    def __init__(self, history=HISTORY):
+        self.history = history
+        self.phases = []  # этапы в порядке первой отметки
+        self._samples = {}  # {этап: [секунды по кадрам, по кругу]}
+        self._frames = [0.0] * history  # длительность кадров, по кругу
+        self._current = {}  # {этап: секунды в текущем кадре}
+        self._order = []  # этапы текущего кадра по порядку
+        self._spans = []  # [(этап, начало, конец)] текущего кадра
+        # (начало, конец, этапы) последних кадров по кругу, для
+        # StutterDetector
+        self._frame_spans = [None] * history
+        self._index = 0  # куда писать следующий кадр
+        self.count = 0  # сколько кадров записано всего
+        self._last = default_timer()
+        self._frame_start = self._last
+        self.visible = False
+        self._glyphs = None
+        self._panel = None  # Surface с таблицей цифр
+        self._graph = None  # Surface с графиком времени кадров
+        self._graph_count = 0  # сколько кадров уже на графике
+
+    def begin_frame(self):
+        self._frame_start = self._last = default_timer()
+
+    def mark(self, phase):
+        # конец этапа: время с прошлой отметки идет в этот этап
+        now = default_timer()
+        current = self._current
+        if phase in current:
+            current[phase] += now - self._last
+        else:
+            current[phase] = now - self._last
+            self._order.append(phase)
+        self._spans.append((phase, self._last, now))
+        self._last = now
+
+    def end_frame(self):
+        # переносит этапы кадра в историю
+        index = self._index
+        for phase in self._order:
+            samples = self._samples.get(phase)
+            if samples is None:
+                samples = self._samples[phase] = [0.0] * self.history
+                self.phases.append(phase)
+            samples[index] = self._current[phase]
+        for phase in self.phases:  # этап не отмечен в этом кадре
+            if phase not in self._current:
+                self._samples[phase][index] = 0.0
+        self._frames[index] = self._last - self._frame_start
+        self._frame_spans[index] = (self._frame_start, self._last, self._spans)
+        self._current = {}
+        self._order = []
+        self._spans = []
+        self._index = (index + 1) % self.history
+        self.count += 1
+        if self.visible and self.count % REFRESH == 0:
+            self._panel = None  # цифры устарели
+
+    def last_frame(self):
+        # длительность последнего записанного кадра, секунды
+        return self._frames[(self._index - 1) % self.history]
+
+    def frames(self, count):
+        # последние count кадров, от старых к новым:
+        # [(номер кадра, начало, конец, [(этап, начало, конец)])]
+        count = min(count, self.count, self.history)
+        result = []
+        for offset in range(count):
+            index = (self._index - count + offset) % self.history
+            start, end, spans = self._frame_spans[index]
+            result.append((self.count - count + offset, start, end, spans))
+        return result
+
+    def _recorded(self, samples):
+        if self.count >= self.history:
+            return samples
+        return samples[:self.count]
+
+    def stats(self, phase):
+        # (среднее, 95-й перцентиль, максимум) в секундах
+        return _stats(self._recorded(self._samples.get(phase, [])))
+
+    def frame_stats(self):
+        return _stats(self._recorded(self._frames))
+
+    def toggle(self):
+        self.visible = not self.visible
+        self._panel = None
+        self._graph = None
+
+    def _rows(self):
+        # строки таблицы: (название, три колонки)
+        rows = [(u'ms', (u'mean', u'p95', u'max'))]
+        for phase in self.phases:
+            rows.append((phase, tuple(u'%.2f' % (v * 1000)
+                                      for v in self.stats(phase))))
+        rows.append((u'frame', tuple(u'%.2f' % (v * 1000)
+                                     for v in self.frame_stats())))
+        return rows
+
+    def _make_panel(self):
+        if self._glyphs is None:
+            # Font(None) грузит шрифт долго, поэтому только при первом показе
+            self._glyphs = GlyphCache(pygame.font.Font(None, FONT_SIZE),
+                                      TEXT_COLOR, PANEL_COLOR)
+        glyphs = self._glyphs
+        rows = self._rows()
+        # шрифт не моноширинный: колонки выравниваем по правому краю
+        name_width = max(glyphs.size(name)[0] for name, values in rows)
+        column_width = max(glyphs.size(value)[0] for name, values in rows
+                           for value in values) + MARGIN
+        width = max(name_width + 3 * column_width, self.history)
+        height = glyphs.height * len(rows)
+        panel = pygame.Surface((width + 2 * MARGIN,
+                                height + GRAPH_HEIGHT + 3 * MARGIN))
+        panel.fill(PANEL_COLOR)
+        for idx, (name, values) in enumerate(rows):
+            y = MARGIN + idx * glyphs.height
+            glyphs.draw(panel, name, (MARGIN, y))
+            right = MARGIN + name_width
+            for value in values:
+                right += column_width
+                glyphs.draw(panel, value, (right - glyphs.size(value)[0], y))
+        self._panel = _display_format(panel)
+        self._panel.set_alpha(PANEL_ALPHA)
+
+    def _bar(self, graph, x, seconds):
+        # столбик графика для одного кадра, бюджет кадра - половина высоты
+        height = min(GRAPH_HEIGHT, max(1, int(seconds * GRAPH_HEIGHT /
+                                              (2 * FRAME_BUDGET))))
+        if seconds > FRAME_BUDGET:
+            color = GRAPH_SLOW_COLOR
+        else:
+            color = GRAPH_COLOR
+        graph.fill(PANEL_COLOR, (x, 0, 1, GRAPH_HEIGHT))
+        graph.fill(color, (x, GRAPH_HEIGHT - height, 1, height))
+        graph.fill(GRAPH_BUDGET_COLOR, (x, GRAPH_HEIGHT // 2, 1, 1))
+
+    def _update_graph(self):
+        # график сдвигается влево на новые кадры, старые не перерисовываются
+        new = self.count - self._graph_count
+        if self._graph is None or new >= self.history:
+            self._graph = _display_format(
+                pygame.Surface((self.history, GRAPH_HEIGHT)))
+            self._graph.fill(PANEL_COLOR)
+            new = min(self.count, self.history)
+        elif new:
+            self._graph.scroll(-new, 0)
+        for offset in range(new):
+            index = (self._index - new + offset) % self.history
+            self._bar(self._graph, self.history - new + offset,
+                      self._frames[index])
+        self._graph_count = self.count
+
+    def draw(self, surface, pos=(0, 0)):
+        # рисует оверлей, если он включен
+        if not self.visible:
+            return
+        if self._panel is None:
+            self._make_panel()
+        self._update_graph()
+        panel = self._panel
+        surface.blit(panel, pos)
+        surface.blit(self._graph, (pos[0] + MARGIN, pos[1] +
+                                   panel.get_height() - MARGIN - GRAPH_HEIGHT))
+
+
+def _display_format(surface):
+    # в формате экрана Surface рисуется быстрее
+    if pygame.display.get_surface() is None:
+        return surface
+    return surface.convert()
+
+
+def _stats(samples):
+    if not samples:
+        return 0.0, 0.0, 0.0
+    ordered = sorted(samples)
+    p95 = ordered[int(0.95 * (len(ordered) - 1))]
+    return sum(ordered) / len(ordered), p95, ordered[-1]
+
+
+class StutterDetector(object):
+    # Ищет рывки: если кадр FrameProfiler дольше threshold, через after
+    # кадров окно вокруг него сохраняется в Chrome trace-event JSON
+    # (открывается в Perfetto или chrome://tracing).
+    # annotate() возвращает словарь с подробностями (уровень, позиция
+    # героя, число объектов), он вызывается в момент рывка.
+    # Окна не рисует, поэтому работает и без дисплея (replay.py
+    # --trace-stutters). В конце уровня нужен flush().
+
+    def __init__(self, frame_profiler, threshold=STUTTER_THRESHOLD,
+                 before=STUTTER_BEFORE, after=STUTTER_AFTER,
+                 trace_dir=TRACE_DIR, max_traces=STUTTER_MAX_TRACES,
+                 annotate=None):
+        if before + after + 1 > frame_profiler.history:
+            raise ValueError(u'window of %d frames does not fit in the '
+                             u'profiler history of %d frames' % (
+                                 before + after + 1, frame_profiler.history))
+        self.frame_profiler = frame_profiler
+        self.threshold = threshold
+        self.before = before
+        self.after = after
+        self.trace_dir = trace_dir
+        self.max_traces = max_traces
+        self.annotate = annotate
+        self.traces = []  # уже записанные файлы
+        self._pending = []  # [(номер кадра, секунды, подробности)]
+
+    def check(self):
+        # вызывается после FrameProfiler.end_frame(), возвращает имя
+        # записанного файла или None
+        frame_profiler = self.frame_profiler
+        seconds = frame_profiler.last_frame()
+        if seconds > self.threshold and len(self.traces) < self.max_traces:
+            info = self.annotate() if self.annotate is not None else {}
+            self._pending.append((frame_profiler.count - 1, seconds, info))
+        if not self._pending:
+            return None
+        if frame_profiler.count - 1 - self._pending[0][0] < self.after:
+            return None
+        # все рывки, попавшие в окно первого, идут в один файл
+        return self.dump()
+
+    def flush(self):
+        # в конце уровня и на выходе: рывок из последних after кадров
+        # иначе не попал бы в файл, пишем его с тем окном, что есть
+        if not self._pending:
+            return None
+        return self.dump()
+
+    def dump(self):
+        # пишет окно вокруг рывков из _pending в trace файл
+        stutters, self._pending = self._pending, []
+        first = stutters[0][0]
+        last_frame = self.frame_profiler.count - 1
+        count = min(last_frame - first + 1 + self.before,
+                    self.frame_profiler.history)
+        trace = chrome_trace(self.frame_profiler.frames(count), stutters)
+        if not os.path.isdir(self.trace_dir):
+            os.makedirs(self.trace_dir)
+        file_name = os.path.join(self.trace_dir, 'stutter-%s-frame%d.json' % (
+            time.strftime('%Y%m%d-%H%M%S'), first))
+        trace_file = open(file_name, 'w')
+        try:
+            json.dump(trace, trace_file)
+        finally:
+            trace_file.close()
+        self.traces.append(file_name)
+        return file_name
+
+
+def chrome_trace(frames, stutters=(), process_name=u'Super Mario Boy'):
+    # Кадры FrameProfiler.frames() -> словарь Chrome trace-event формата:
+    # кадр - это span "frame N", этапы вложены в него, рывок - отметка
+    # "stutter" с подробностями из annotate().
+    if not frames:
+        return {'traceEvents': []}
+    origin = frames[0][1]
+
+    def us(seconds):  # время в trace - микросекунды от начала окна
+        return int(round((seconds - origin) * 1000000))
+
+    events = [
+        {'name': 'process_name', 'ph': 'M', 'pid': 1,
+         'args': {'name': process_name}},
+        {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 1,
+         'args': {'name': u'main loop'}},
+    ]
+    slow = dict((frame, (seconds, info)) for frame, seconds, info in stutters)
+    for frame, start, end, spans in frames:
+        args = {'frame': frame, 'ms': round((end - start) * 1000, 3)}
+        if frame in slow:
+            args.update(slow[frame][1])
+        events.append({'name': 'frame %d' % frame, 'cat': 'frame', 'ph': 'X',
+                       'ts': us(start), 'dur': us(end) - us(start),
+                       'pid': 1, 'tid': 1, 'args': args})
+        for phase, span_start, span_end in spans:
+            events.append({'name': phase, 'cat': 'phase', 'ph': 'X',
+                           'ts': us(span_start),
+                           'dur': us(span_end) - us(span_start),
+                           'pid': 1, 'tid': 1})
+        if frame in slow:
+            events.append({'name': 'stutter', 'cat': 'stutter', 'ph': 'i',
+                           's': 'g', 'ts': us(start), 'pid': 1, 'tid': 1,
+                           'args': args})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
@@ -15,7 +15,7 @@
 
 # TODO: Feature idea: if the same image file is specified, re-use the Surface object. (Make this optional though.)
 
-import pygame, time
+import pygame, time, math
 
 # setting up constants
 PLAYING = 'playing'
@@ -33,6 +33,9 @@ SOUTHWEST = 'southwest'
 SOUTH = 'south'
 SOUTHEAST = 'southeast'
 
+# Slots per second of animation time in the compile() lookup table.
+COMPILE_RATE = 100
+
 
 class PygAnimation(object):
     def __init__(self, frames, loop=True):
@@ -68,6 +71,13 @@ class PygAnimation(object):
         self._loop = loop # If True, the animation will keep looping. If False, the animation stops after playing once.
         self._rate = 1.0 # 2.0 means play the animation twice as fast, 0.5 means twice as slow
         self._visibility = True # If False, then nothing is drawn when the blit() methods are called
+        self.lastFrameNum = None # The frame drawn by the last blit() call, None if it drew nothing
+
+        # compile() fills these: _frameTable[slot] is the frame shown during
+        # that 1/_compileRate second slot of one pass through the animation.
+        self._frameTable = None
+        self._compileRate = None
+        self._tablePeriod = None # one pass in slots, may end mid-slot
 
         self._playingStartTime = 0 # the time that the play() function was last called.
         self._pausedStartTime = 0 # the time that the pause() function was last called.
@@ -103,6 +113,38 @@ class PygAnimation(object):
         self._images.reverse()
         self._transformedImages.reverse()
         self._durations.reverse()
+        self._startTimes = self._getStartTimes()
+        if self._frameTable is not None:
+            self.compile(self._compileRate)
+
+
+    def compile(self, rate=COMPILE_RATE):
+        # Precomputes which frame is shown in each 1/rate second slot of the
+        # animation, so that blit() finds the current frame with a single list
+        # lookup instead of the elapsed property and a binary search, and
+        # frameNumAtTick() needs no clock at all. Frame changes are rounded to
+        # the slot, so frame durations should be multiples of 1/rate. If the
+        # total is not, the last slot is only partly used: looping still
+        # wraps at the exact total, so frames do not drift.
+        # The table is in animation time, so the rate property and looping
+        # still apply; reverse() rebuilds it.
+        self._compileRate = rate
+        # rounded so that float noise (0.4 * 100 = 40.00000000000001) does
+        # not add a slot
+        period = round(self._startTimes[-1] * rate, 9)
+        self._tablePeriod = period
+        slots = max(1, int(math.ceil(period)))
+        self._frameTable = [findStartTime(self._startTimes, (i + 0.5) / rate)
+                            for i in range(slots)]
+
+
+    def frameNumAtTick(self, tick):
+        # Returns the frame shown tick slots (1/rate seconds each, see
+        # compile()) after the animation started playing, at the current
+        # playback rate. Does not look at the clock or the playing state.
+        if self._frameTable is None:
+            raise ValueError('compile() the animation first')
+        return self._tableFrame(tick * self._rate)
 
 
     def getCopy(self):
@@ -130,6 +172,10 @@ class PygAnimation(object):
             newAnim._durations = self._durations[:]
             newAnim._startTimes = self._startTimes[:]
             newAnim.numFrames = self.numFrames
+            if self._frameTable is not None:
+                newAnim._frameTable = self._frameTable
+                newAnim._compileRate = self._compileRate
+                newAnim._tablePeriod = self._tablePeriod
             retval.append(newAnim)
         return retval
 
@@ -146,12 +192,45 @@ class PygAnimation(object):
         #     The position to draw the frame. This is passed to Pygame's Surface's
         #     blit() function, so it can be either a (top, left) tuple or a Rect
         #     object.
-        if self.isFinished():
-            self.state = STOPPED
-        if not self.visibility or self.state == STOPPED:
-            return
-        frameNum = findStartTime(self._startTimes, self.elapsed)
-        destSurface.blit(self.getFrame(frameNum), dest)
+        if self._frameTable is not None:
+            frameNum = self._compiledFrameNum()
+        else:
+            if self.isFinished():
+                self.state = STOPPED
+            if not self.visibility or self.state == STOPPED:
+                frameNum = None
+            else:
+                frameNum = findStartTime(self._startTimes, self.elapsed)
+        self.lastFrameNum = frameNum
+        if frameNum is not None:
+            destSurface.blit(self.getFrame(frameNum), dest)
+
+
+    def _compiledFrameNum(self):
+        # blit() of a compiled animation: the frame to draw right now, or None
+        # if nothing is drawn. Same rules as isFinished() and elapsed, with
+        # the clock read once.
+        state = self._state
+        if state == STOPPED or not self._visibility:
+            return None
+        if state == PLAYING:
+            elapsed = (time.time() - self._playingStartTime) * self._rate
+        else:
+            elapsed = (self._pausedStartTime - self._playingStartTime) * self._rate
+        if not self._loop and elapsed >= self._startTimes[-1]:
+            self._state = STOPPED
+            return None
+        return self._tableFrame(elapsed * self._compileRate)
+
+
+    def _tableFrame(self, position):
+        # The frame at position (in slots, may be fractional) from the start
+        # of the animation, wrapped around the exact length of one pass if
+        # looping.
+        table = self._frameTable
+        if self._loop:
+            position %= self._tablePeriod
+        return table[getInBetweenValue(0, int(position), len(table) - 1)]
 
 
     def getFrame(self, frameNum):
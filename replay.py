@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Запись и воспроизведение ввода для повторяемых замеров.
+#
+#   python platformerhabrahabr.py --record run.json   # играем и пишем ввод
+#   python platformerhabrahabr.py --replay run.json   # то же самое в окне
+#   python replay.py run.json                         # без окна и без рендера
+#
+# На каждом кадре пишется состояние клавиш (left, right, up, running) -
+# четыре бита. Подряд идущие одинаковые кадры сжимаются в пары
+# [биты, сколько кадров], так что минута игры занимает сотню чисел.
+# В конце уровня сохраняется его итоговое состояние (герой и монстры);
+# при воспроизведении оно сверяется, и расхождение сразу видно.
+# Симуляция не зависит от часов, поэтому воспроизведение идет без
+# ограничения в 60 кадров в секунду.
+
+import sys
+import json
+import hashlib
+from timeit import default_timer
+
+import simulation
+
+VERSION = 1
+
+# биты состояния клавиш
+LEFT = 1
+RIGHT = 2
+UP = 4
+RUNNING = 8
+
+
+def pack(left, right, up, running):
+    return ((LEFT if left else 0) | (RIGHT if right else 0) |
+            (UP if up else 0) | (RUNNING if running else 0))
+
+
+def unpack(bits):
+    return (bool(bits & LEFT), bool(bits & RIGHT),
+            bool(bits & UP), bool(bits & RUNNING))
+
+
+def inputs(runs):
+    # [[биты, кадров], ...] -> (left, right, up, running) на каждый кадр
+    for bits, count in runs:
+        keys = unpack(bits)
+        for tick in xrange(count):
+            yield keys
+
+
+def ticks(runs):
+    return sum(count for bits, count in runs)
+
+
+def state(world, tick_count):
+    # итоговое состояние уровня для сверки
+    hero = world.hero
+    monsters = hashlib.md5()
+    for monster in sorted(world.monsters, key=lambda m: (m.startX, m.startY)):
+        monsters.update('%d %d %d %d;' % (monster.rect.x, monster.rect.y,
+                                          monster.xvel, monster.yvel))
+    return {
+        'ticks': tick_count,
+        'hero': [hero.rect.x, hero.rect.y, hero.xvel, hero.yvel,
+                 hero.onGround, hero.winner],
+        'monsters': monsters.hexdigest(),
+    }
+
+
+def check(expected, world, tick_count):
+    # список расхождений с записанным состоянием, пустой - все совпало
+    actual = state(world, tick_count)
+    return [u'%s: %s != %s' % (key, actual.get(key), expected[key])
+            for key in sorted(expected) if actual.get(key) != expected[key]]
+
+
+class Recorder(object):
+    # Пишет ввод по уровням: start_level(), record() на каждом кадре,
+    # finish_level() в конце уровня, save() - в файл.
+
+    def __init__(self):
+        self.levels = []
+        self._runs = None
+        self._ticks = 0
+
+    def start_level(self, name):
+        self._runs = []
+        self._ticks = 0
+        self.levels.append({'level': name, 'inputs': self._runs})
+
+    def record(self, left, right, up, running):
+        bits = pack(left, right, up, running)
+        runs = self._runs
+        if runs and runs[-1][0] == bits:
+            runs[-1][1] += 1
+        else:
+            runs.append([bits, 1])
+        self._ticks += 1
+
+    def finish_level(self, world):
+        self.levels[-1]['final'] = state(world, self._ticks)
+
+    def save(self, file_name):
+        out = open(file_name, 'w')
+        try:
+            json.dump({'version': VERSION, 'levels': self.levels}, out,
+                      separators=(',', ':'))
+        finally:
+            out.close()
+
+
+def load(file_name):
+    # -> [{'level': имя, 'inputs': [[биты, кадров]], 'final': состояние}]
+    replay_file = open(file_name)
+    try:
+        data = json.load(replay_file)
+    finally:
+        replay_file.close()
+    if data.get('version') != VERSION:
+        raise ValueError(u'%s: unsupported replay version %r' % (
+            file_name, data.get('version')))
+    return data['levels']
+
+
+def run(level, mark=None, stutter=None):
+    # Воспроизводит один уровень без окна, возвращает (world, кадров).
+    # Бесконечные карты подгружают тела вокруг камеры, а камеры здесь
+    # нет, их можно воспроизвести только в окне.
+    # stutter - profiler.StutterDetector: тогда каждый кадр идет через
+    # его FrameProfiler, а долгие кадры пишутся в trace файлы.
+    world_map = simulation.load_map(simulation.level_file(level['level']))
+    if world_map.infinite:
+        raise ValueError(u'%s: infinite maps replay only in the game window'
+                         % level['level'])
+    world = simulation.World(world_map)
+    hero = world.spawn_hero()
+    tick_count = 0
+    if stutter is None:
+        for left, right, up, running in inputs(level['inputs']):
+            world.step(left, right, up, running, mark)
+            tick_count += 1
+        return world, tick_count
+
+    def annotate():  # подробности для trace файла в момент рывка
+        return {'level': level['level'], 'tick': tick_count,
+                'player': [hero.rect.x, hero.rect.y],
+                'monsters': len(world.monsters),
+                'platforms': len(world.platforms)}
+    stutter.annotate = annotate
+    frame_profiler = stutter.frame_profiler
+    for left, right, up, running in inputs(level['inputs']):
+        frame_profiler.begin_frame()
+        world.step(left, right, up, running, frame_profiler.mark)
+        tick_count += 1
+        frame_profiler.end_frame()
+        stutter.check()
+    stutter.flush()
+    return world, tick_count
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description=u'Воспроизведение записанного ввода без окна')
+    parser.add_argument('replay', help=u'файл записи (--record в игре)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help=u'сколько раз прогнать каждый уровень')
+    parser.add_argument('--trace-stutters', metavar='DIR',
+                        help=u'долгие кадры писать в trace файлы в DIR '
+                        u'(Perfetto, chrome://tracing)')
+    args = parser.parse_args(argv)
+
+    import player
+    player.DIE_DELAY = 0  # без паузы после смерти героя
+    stutter = None
+    if args.trace_stutters:
+        import profiler
+        stutter = profiler.StutterDetector(profiler.FrameProfiler(),
+                                           trace_dir=args.trace_stutters)
+    failed = False
+    for level in load(args.replay):
+        for i in range(args.repeat):
+            start = default_timer()
+            world, tick_count = run(level, stutter=stutter)
+            seconds = default_timer() - start
+            errors = check(level['final'], world, tick_count)
+            failed = failed or bool(errors)
+            # utf-8 явно: вывод часто идет в pipe, и ascii по умолчанию
+            # на кириллице падает
+            line = u'%-20s %6d кадров %8.1f мс %8.0f кадров/с  %s' % (
+                level['level'], tick_count, seconds * 1000,
+                tick_count / max(seconds, 1e-9),
+                u'OK' if not errors else u'РАСХОЖДЕНИЕ')
+            print(line.encode('utf-8'))
+            for error in errors:
+                print((u'    ' + error).encode('utf-8'))
+    if stutter is not None:
+        for file_name in stutter.traces:
+            print('-> %s' % file_name)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# VectorEnv, разложенный по процессам, с наблюдениями в общей памяти.
+#
+#   envs = sharedenv.SharedVectorEnv(64, ['levels/map_1'], workers=8,
+#                                    frame_size=(84, 84), grayscale=True)
+#   obs = envs.reset()
+#   obs, rewards, dones, infos = envs.step([replay.RIGHT] * 64)
+#   envs.step_async(actions)   # процессы шагают, а мы пока учимся на obs
+#   obs, rewards, dones, infos = envs.step_wait()
+#   envs.close()
+#
+# Среды (gameenv.GameEnv) делятся между процессами поровну. Наблюдения,
+# награды, итоги эпизодов и действия лежат в одной анонимной mmap, общей
+# для всех процессов, по кольцу из ring слотов: шаг пишет в следующий
+# слот, так что наблюдение прошлого шага остается целым, пока идет
+# step_async. По трубам ходят только номер слота и команда, ничего не
+# сериализуется. Наблюдение - словарь ctypes массивов поверх слота
+# (numpy.frombuffer тоже читает их без копирования), поля как у VectorEnv,
+# кроме монстров: это таблица по max_monsters пар (dx, dy) на среду и
+# число монстров в monster_counts.
+# Слот переписывается через ring шагов: что нужно дольше, надо
+# скопировать. Анонимная mmap наследуется только при fork, то есть
+# только на Unix.
+
+import os
+import sys
+import mmap
+import ctypes
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # окно не нужно
+
+import gameenv
+import replay
+import framebuffer
+
+RING = 2  # слотов: в один пишут процессы, из другого читает ученик
+MAX_MONSTERS = 8  # монстров на среду в наблюдении, ближние первыми
+ALIGN = 8  # поля слота выравниваются под double
+
+
+def slot_fields(count, view_radius, max_monsters):
+    # [(имя, ctypes тип, значений на среду)], кадры идут после них
+    side = 2 * view_radius + 1
+    return [
+        ('actions', ctypes.c_ubyte, 1),
+        ('positions', ctypes.c_int, 2),
+        ('velocities', ctypes.c_double, 2),
+        ('on_ground', ctypes.c_ubyte, 1),
+        ('tiles', ctypes.c_ubyte, side * side),
+        ('monster_counts', ctypes.c_int, 1),
+        ('monsters', ctypes.c_int, 2 * max_monsters),
+        ('rewards', ctypes.c_double, 1),
+        ('dones', ctypes.c_ubyte, 1),
+        # итог законченного эпизода, из него собираются infos
+        ('completed', ctypes.c_ubyte, 1),
+        ('deaths', ctypes.c_int, 1),
+        ('steps', ctypes.c_int, 1),
+    ]
+
+
+def _aligned(size):
+    return (size + ALIGN - 1) // ALIGN * ALIGN
+
+
+def slot_size(count, view_radius, max_monsters, frame_size, grayscale):
+    size = sum(_aligned(ctypes.sizeof(ctype) * count * per_env)
+               for name, ctype, per_env
+               in slot_fields(count, view_radius, max_monsters))
+    if frame_size is not None:
+        size += (frame_size[0] * frame_size[1] * (1 if grayscale else 4) *
+                 count)
+    return _aligned(size)
+
+
+class Slot(object):
+    # Один слот кольца: поля из slot_fields - ctypes массивы поверх общей
+    # памяти, frames - framebuffer.FrameBuffer всех сред.
+
+    def __init__(self, memory, offset, count, view_radius, max_monsters,
+                 frame_size, grayscale):
+        self.side = 2 * view_radius + 1
+        self.max_monsters = max_monsters
+        for name, ctype, per_env in slot_fields(count, view_radius,
+                                                max_monsters):
+            field = (ctype * (count * per_env)).from_buffer(memory, offset)
+            setattr(self, name, field)
+            offset += _aligned(ctypes.sizeof(field))
+        self.frames = None
+        self.observation = {
+            'position': self.positions,
+            'velocity': self.velocities,
+            'onGround': self.on_ground,
+            'tiles': self.tiles,
+            'monsters': self.monsters,
+            'monster_counts': self.monster_counts,
+        }
+        if frame_size is not None:
+            self.frames = framebuffer.FrameBuffer(
+                frame_size[0], frame_size[1], grayscale, count, memory,
+                offset)
+            self.observation['frame'] = self.frames.frame()
+
+    def write(self, i, env):
+        # наблюдение среды i, как VectorEnv._write
+        hero = env.hero
+        self.positions[2 * i] = hero.rect.x
+        self.positions[2 * i + 1] = hero.rect.y
+        self.velocities[2 * i] = hero.xvel
+        self.velocities[2 * i + 1] = hero.yvel
+        self.on_ground[i] = hero.onGround
+        env.tiles(self.tiles, i * self.side * self.side)
+        near = env.monsters()[:self.max_monsters]
+        self.monster_counts[i] = len(near)
+        start = 2 * self.max_monsters * i
+        for dx, dy in near:
+            self.monsters[start] = dx
+            self.monsters[start + 1] = dy
+            start += 2
+        if env.renderer is not None:
+            env.renderer.set_target(self.frames.target(i))
+            env.renderer.render()
+
+    def finish(self, i, env):
+        # итог эпизода среды i перед ее сбросом
+        info = env.info()
+        self.completed[i] = info['completed']
+        self.deaths[i] = info['deaths']
+        self.steps[i] = info['steps']
+
+    def info(self, i):
+        return {'completed': bool(self.completed[i]),
+                'deaths': self.deaths[i], 'steps': self.steps[i]}
+
+
+def _worker(conn, memory, first, levels, max_steps, config, ring):
+    # Процесс со средами first..first + len(levels) - 1. Команды:
+    # ('reset', слот, уровни или None), ('step', слот), ('close', None).
+    # Отвечает None или текстом ошибки.
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C ловит главный
+    count, view_radius, max_monsters, frame_size, grayscale = config
+    size = slot_size(*config)
+    slots = [Slot(memory, index * size, *config) for index in xrange(ring)]
+    envs = [gameenv.GameEnv(level, max_steps, view_radius)
+            for level in levels]
+    if frame_size is not None:
+        for i, env in enumerate(envs, first):
+            env.attach_frames(slots[0].frames, i)
+    while True:
+        message = conn.recv()
+        command, slot = message[0], slots[message[1]]
+        if command == 'close':
+            break
+        try:
+            for i, env in enumerate(envs, first):
+                if command == 'reset':
+                    new_levels = message[2]
+                    env.reset(new_levels[i % len(new_levels)]
+                              if new_levels else None)
+                    slot.rewards[i] = 0.0
+                    slot.dones[i] = False
+                else:
+                    slot.rewards[i] = env._advance(slot.actions[i])
+                    slot.dones[i] = env.done
+                    if env.done:
+                        slot.finish(i, env)
+                        env.reset()
+                slot.write(i, env)
+        except Exception as e:
+            conn.send(u'%s: %s' % (e.__class__.__name__, e))
+        else:
+            conn.send(None)
+    conn.close()
+
+
+class SharedVectorEnv(object):
+    # Как gameenv.VectorEnv, но среды шагают в workers процессах, а
+    # наблюдения приходят через общую память.
+
+    def __init__(self, count, levels=(gameenv.DEFAULT_LEVEL,),
+                 max_steps=gameenv.MAX_STEPS, view_radius=gameenv.VIEW_RADIUS,
+                 frame_size=None, grayscale=False, workers=None, ring=RING,
+                 max_monsters=MAX_MONSTERS):
+        import multiprocessing
+        if isinstance(levels, basestring):
+            levels = [levels]
+        if ring < 1:
+            raise ValueError(u'ring must have at least one slot')
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        workers = max(1, min(workers, count))
+        self.count = count
+        self.workers = workers
+        self.ring = ring
+        config = (count, view_radius, max_monsters, frame_size, grayscale)
+        size = slot_size(*config)
+        self.memory = mmap.mmap(-1, size * ring)
+        self.slots = [Slot(self.memory, index * size, *config)
+                      for index in xrange(ring)]
+        self._slot = ring - 1  # первый reset пишет в слот 0
+        self._waiting = False
+        self._pipes = []
+        self._processes = []
+        for w in xrange(workers):
+            first, stop = count * w // workers, count * (w + 1) // workers
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker,
+                args=(child, self.memory, first,
+                      [levels[i % len(levels)] for i in xrange(first, stop)],
+                      max_steps, config, ring))
+            process.daemon = True
+            process.start()
+            child.close()
+            self._pipes.append(parent)
+            self._processes.append(process)
+
+    def _send(self, message):
+        for pipe in self._pipes:
+            pipe.send(message)
+
+    def _wait(self):
+        errors = [error for error in [pipe.recv() for pipe in self._pipes]
+                  if error is not None]
+        if errors:
+            raise RuntimeError(u'worker failed: %s' % errors[0])
+
+    def _next_slot(self):
+        if self._waiting:
+            raise ValueError(u'step_async() is pending, call step_wait()')
+        self._slot = (self._slot + 1) % self.ring
+        return self.slots[self._slot]
+
+    def reset(self, levels=None):
+        slot = self._next_slot()
+        self._send(('reset', self._slot, levels))
+        self._wait()
+        return slot.observation
+
+    def step_async(self, actions):
+        # отдает действия процессам и сразу возвращается
+        slot = self._next_slot()
+        for i in xrange(self.count):
+            action = actions[i]
+            slot.actions[i] = (replay.pack(*action)
+                               if isinstance(action, tuple) else action)
+        self._send(('step', self._slot))
+        self._waiting = True
+
+    def step_wait(self):
+        # -> (наблюдения, награды, закончены, infos), как VectorEnv.step
+        self._waiting = False
+        self._wait()
+        slot = self.slots[self._slot]
+        infos = [slot.info(i) if slot.dones[i] else None
+                 for i in xrange(self.count)]
+        return slot.observation, slot.rewards, slot.dones, infos
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self._waiting:
+            self.step_wait()
+        self._send(('close', 0))
+        for process in self._processes:
+            process.join()
+        for pipe in self._pipes:
+            pipe.close()
+        self._processes = []
+        self._pipes = []
+
+
+def main(argv=None):
+    # замер скорости:
+    # python sharedenv.py [сред] [шагов] [процессов] [ширина высота]
+    import random
+    from timeit import default_timer
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 16
+    steps = int(argv[1]) if len(argv) > 1 else 2000
+    workers = int(argv[2]) if len(argv) > 2 else None
+    frame_size = None
+    if len(argv) > 4:
+        frame_size = (int(argv[3]), int(argv[4]))
+    envs = SharedVectorEnv(count,
+                           ['levels/map_%d' % lvl for lvl in range(1, 4)],
+                           frame_size=frame_size, workers=workers)
+    try:
+        envs.reset()
+        rnd = random.Random(1)
+        actions = [rnd.randrange(gameenv.ACTIONS) for i in xrange(count)]
+        start = default_timer()
+        for step in xrange(steps):
+            if step % 20 == 0:
+                actions = [rnd.randrange(gameenv.ACTIONS)
+                           for i in xrange(count)]
+            envs.step(actions)
+        seconds = default_timer() - start
+    finally:
+        envs.close()
+    line = u"%d сред x %d шагов в %d процессах: %.2f с, %.0f шагов/с" % (
+        count, steps, envs.workers, seconds, count * steps / seconds)
+    print(line.encode('utf-8'))  # utf-8 и в pipe, где по умолчанию ascii
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Ядро симуляции: уровень без окна и без отрисовки тайловых слоев.
+# World загружает тела для столкновений, телепорты, принцесс, монстров и
+# героя и двигает их по кадрам. Импорт этого модуля не тянет за собой
+# рендер карт (helperspygame) и XML парсер: tmxreader импортирует minidom,
+# только когда читает tmx файл, а textlevel - только для .txt уровней.
+
+import os
+
+from pygame import sprite, Rect
+
+import tmxreader
+from blocks import Platform, BlockDie, BlockTeleport, Princess, make_bodies
+from blocks import PLATFORM_WIDTH, PLATFORM_HEIGHT
+from monsters import Monster, Patrol
+import player
+from player import Player
+
+# Слои карты по порядку: 0 - фон, 1 - блоки, 2 - смертельные блоки,
+# 3 - объекты монстров, 4 - объекты телепортов
+PLATFORMS_LAYER = 1
+DIE_BLOCKS_LAYER = 2
+MONSTERS_LAYER = 3
+TELEPORTS_LAYER = 4
+
+# Схемы объектных слоев: {имя объекта: ((свойство, тип), ...)},
+# None - все остальные объекты слоя, тип - как в модуле array
+MONSTERS_SCHEMA = {
+    u"Player": (),
+    u"Princess": (),
+    None: ((u"left", "i"), (u"up", "i"), (u"maxLeft", "i"), (u"maxUp", "i")),
+}
+TELEPORTS_SCHEMA = {
+    None: ((u"goX", "i"), (u"goY", "i")),
+}
+
+DEFAULT_PLAYER_POS = (65, 65)  # если на карте нет героя
+GAME_DIR = os.path.dirname(os.path.realpath(__file__))
+
+_maps = {}  # {уровень: карта}, см. load_level
+
+
+def level_file(name):
+    # имя уровня, как его передают в loadLevel ("levels/map_1" или
+    # "levels/1.txt"), -> путь к файлу карты
+    if not name.endswith('.txt'):
+        name += '.tmx'
+    return os.path.join(GAME_DIR, name)
+
+
+def load_map(file_name, chunked=None):
+    # tmx карта или уровень в старом текстовом формате; большие текстовые
+    # уровни делятся на чанки, если chunked не False (см. textlevel)
+    if file_name.endswith('.txt'):
+        import textlevel
+        return textlevel.parse(file_name, chunked)
+    return tmxreader.TileMapParser().parse_decode(file_name)
+
+
+def load_level(name):
+    # Карта уровня для прогонов без окна (batchsim, gameenv): каждая карта
+    # читается один раз на процесс, World ее не меняет. Тела бесконечных
+    # карт подгружаются вокруг камеры, без окна их не бывает, поэтому
+    # текстовые уровни здесь целиком, без чанков.
+    world_map = _maps.get(name)
+    if world_map is None:
+        world_map = load_map(level_file(name), chunked=False)
+        if world_map.infinite:
+            raise ValueError(u'%s: infinite maps need a camera, they are '
+                             u'not simulated headless' % name)
+        _maps[name] = world_map
+    return world_map
+
+
+def reachable(hero, rects, exits):
+    # Номера тел из rects, которых герой может коснуться за один update,
+    # по порядку: рядом с ним, у точки появления (после смерти) и у
+    # выходов телепортов exits - туда он переносится посреди проверки
+    # столкновений. Проверка только этих тел дает тот же результат, что
+    # и проверка всех, а отбор идет в C (Rect.collidelistall).
+    dx = max(abs(hero.xvel), player.MOVE_SPEED + player.MOVE_EXTRA_SPEED) + 2
+    dy = max(abs(hero.yvel) + player.GRAVITY,
+             player.JUMP_POWER + player.JUMP_EXTRA_POWER) + 2
+    dx, dy = 2 * int(dx), 2 * int(dy)
+    near = set(hero.rect.inflate(dx, dy).collidelistall(rects))
+    width, height = hero.rect.size
+    for x, y in [(hero.startX, hero.startY)] + exits:
+        near.update(Rect(x, y, width, height).inflate(dx, dy).collidelistall(
+            rects))
+    return sorted(near)
+
+
+def tile_rows(layer):
+    # тайловый слой -> строки клеток для make_bodies, пустая клетка - None
+    # (content2D у tmxreader.TileLayer - это столбцы)
+    return [[gid or None for gid in row] for row in zip(*layer.content2D)]
+
+
+class World(object):
+
+    def __init__(self, world_map):
+        self.world_map = world_map
+        # Группы с порядком добавления: обычная sprite.Group перебирает
+        # спрайты в порядке их id(), и столкнувшиеся монстры от запуска к
+        # запуску обновлялись бы по-разному - запись ввода (replay.py)
+        # тогда не воспроизводится
+        self.entities = sprite.OrderedUpdates()  # Все объекты
+        # все анимированные объекты, за исключением героя
+        self.animatedEntities = sprite.OrderedUpdates()
+        self.monsters = sprite.OrderedUpdates()  # Все передвигающиеся объекты
+        self.platforms = []  # то, во что мы будем врезаться или опираться
+        self.objects = []  # объекты с объектных слоев, кроме героя
+        self.playerX = None  # где герой стоит на карте
+        self.playerY = None
+        self.hero = None
+        self.monster_tick = 0  # сколько раз двигались монстры
+        self._stepping = []  # rect монстров, которые ходят через update
+        # размеры уровня в пикселях
+        self.width = world_map.width * PLATFORM_WIDTH
+        self.height = world_map.height * PLATFORM_HEIGHT
+
+        layers = world_map.layers
+        # у бесконечных карт тела для столкновений создает
+        # streaming.StreamingWorld по мере подгрузки чанков
+        if not world_map.infinite:
+            # соседние тайлы объединяем в большие прямоугольники,
+            # так тел для столкновений становится в разы меньше
+            self.platforms.extend(make_bodies(
+                tile_rows(layers[PLATFORMS_LAYER]), Platform))
+            self.platforms.extend(make_bodies(
+                tile_rows(layers[DIE_BLOCKS_LAYER]), BlockDie))
+        self._spawn_objects(layers[MONSTERS_LAYER], layers[TELEPORTS_LAYER])
+        self._plan_patrols(world_map.infinite)
+
+    def _spawn_objects(self, monsters_layer, teleports_layer):
+        # объектные слои проверяются целиком до создания объектов:
+        # на сломанной карте сразу будет понятная ошибка, а не пропуск
+        teleports = teleports_layer.compile(TELEPORTS_SCHEMA)
+        monsters_table = monsters_layer.compile(MONSTERS_SCHEMA)
+
+        # y у объектов-тайлов - это нижний край, цель телепорта задана в тайлах
+        tps = [BlockTeleport(x, y - PLATFORM_HEIGHT,
+                             goX * PLATFORM_WIDTH, goY * PLATFORM_HEIGHT)
+               for x, y, goX, goY in teleports.records(None, u"goX", u"goY")]
+        self.entities.add(tps)
+        self.platforms.extend(tps)
+        self.animatedEntities.add(tps)
+        self.objects.extend(tps)
+
+        for x, y in monsters_table.records(u"Player"):
+            self.playerX = x
+            self.playerY = y - PLATFORM_HEIGHT
+
+        prs = [Princess(x, y - PLATFORM_HEIGHT)
+               for x, y in monsters_table.records(u"Princess")]
+        self.platforms.extend(prs)
+        self.entities.add(prs)
+        self.animatedEntities.add(prs)
+        self.objects.extend(prs)
+
+        mns = [Monster(x, y - PLATFORM_HEIGHT, left, up, maxLeft, maxUp)
+               for x, y, left, up, maxLeft, maxUp in monsters_table.records(
+                   None, u"left", u"up", u"maxLeft", u"maxUp")]
+        self.entities.add(mns)
+        self.platforms.extend(mns)
+        self.monsters.add(mns)
+        self.objects.extend(mns)
+
+    def _plan_patrols(self, infinite):
+        # Монстрам, которым на пути ничего не попадется, ставим Patrol: их
+        # место считается по номеру кадра, без проверки столкновений.
+        # Мешают тела уровня в box и монстры с пересекающимся box. У
+        # бесконечных карт тела появляются по ходу игры, там ходят все.
+        monsters = self.monsters.sprites()
+        if not infinite:
+            bodies = [p.rect for p in self.platforms
+                      if not isinstance(p, Monster)]
+            free = []
+            for monster in monsters:
+                patrol = Patrol.from_monster(monster)
+                if patrol is not None and \
+                        patrol.box.collidelist(bodies) == -1:
+                    free.append((monster, patrol))
+            boxes = [patrol.box for monster, patrol in free]
+            for monster, patrol in free:
+                if len(patrol.box.collidelistall(boxes)) == 1:  # только свой
+                    monster.patrol = patrol
+        self._stepping = [m.rect for m in monsters if m.patrol is None]
+
+    def update_monsters(self, animate=True):
+        # кадр всех монстров: то же, что self.monsters.update(platforms).
+        # Монстр с Patrol сталкивается только с монстрами без Patrol (они
+        # могут уйти со своего пути): тогда шаг переделывается через
+        # update, и дальше он ходит сам.
+        self.monster_tick += 1
+        tick = self.monster_tick
+        stepping = self._stepping
+        for monster in self.monsters:
+            patrol = monster.patrol
+            if patrol is None:
+                monster.update(self.platforms)
+                continue
+            patrol.place(monster, tick)
+            if stepping and monster.rect.collidelist(stepping) != -1:
+                patrol.place(monster, tick - 1)
+                monster.patrol = None
+                stepping.append(monster.rect)
+                monster.update(self.platforms)
+            elif animate:
+                monster.animate()
+
+    def seek_monsters(self, tick):
+        # монстры через tick кадров от начала уровня: с Patrol - сразу в
+        # любую сторону, иначе шагами вперед без анимации
+        if not self._stepping:
+            for monster in self.monsters:
+                monster.patrol.place(monster, tick)
+            self.monster_tick = tick
+            return
+        if tick < self.monster_tick:
+            raise ValueError(u'cannot rewind monsters from tick %d to %d: '
+                             u'some of them collide with the level'
+                             % (self.monster_tick, tick))
+        while self.monster_tick < tick:
+            self.update_monsters(animate=False)
+
+    def spawn_hero(self):
+        # создаем героя по (x,y) координатам с карты
+        self.hero = self.spawn_player()
+        return self.hero
+
+    def spawn_player(self):
+        # еще один герой в точке появления; героев по сети (netgame.py)
+        # двигает step_players
+        if self.playerX is None:
+            print(u"Не удалось на карте найти героя,"
+                  u" взяты координаты по-умолчанию")
+            hero = Player(*DEFAULT_PLAYER_POS)
+        else:
+            hero = Player(self.playerX, self.playerY)
+        self.entities.add(hero)
+        return hero
+
+    def remove_player(self, player):
+        self.entities.remove(player)
+
+    def step(self, left, right, up, running, mark=None, animate=True):
+        # один кадр симуляции
+        # mark(этап) - отметка конца этапа для profiler.FrameProfiler
+        # animate=False - без анимации телепортов и принцесс, она нужна
+        # только для картинки
+        if animate:
+            self.animatedEntities.update()  # показываеaм анимацию
+            if mark:
+                mark('animatedEntities.update')
+        self.update_monsters()  # передвигаем всех монстров
+        if mark:
+            mark('monsters.update')
+        self.hero.update(left, right, up, running, self.platforms)  # передвижение
+        if mark:
+            mark('hero.update')
+
+    def step_players(self, players, animate=True):
+        # кадр с несколькими героями: players - [(Player, (left, right,
+        # up, running))]. Герои друг с другом не сталкиваются, монстры
+        # двигаются один раз на всех.
+        if animate:
+            self.animatedEntities.update()
+        self.update_monsters()
+        platforms = self.platforms
+        rects = [p.rect for p in platforms]
+        exits = [(p.goX, p.goY) for p in self.objects
+                 if isinstance(p, BlockTeleport)]
+        for hero, (left, right, up, running) in players:
+            near = [platforms[i] for i in reachable(hero, rects, exits)]
+            hero.update(left, right, up, running, near)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Профилировщик запуска игры: python platformerhabrahabr.py --profile-startup
+# Печатает, сколько заняли импорты модулей и этапы до первого кадра
+# (инициализация pygame, загрузка картинок, загрузка уровня, первый кадр),
+# и выходит. Без ключа все функции здесь почти ничего не делают.
+# Модуль специально не импортирует ничего тяжелого: его надо подключать
+# первым, до pygame.
+
+import sys
+import time
+import __builtin__
+
+PROFILE_FLAG = '--profile-startup'
+TOP_IMPORTS = 25  # сколько самых долгих импортов показывать
+
+enabled = False
+_start = time.time()
+_last = _start
+_imports = []  # [(модуль, секунды с учетом вложенных импортов, глубина)]
+_phases = []  # [(этап, секунды)]
+_depth = [0]
+_original_import = __builtin__.__import__
+
+
+def _timed_import(name, *args, **kwargs):
+    # первый импорт модуля засекаем, повторные идут как обычно
+    if name in sys.modules:
+        return _original_import(name, *args, **kwargs)
+    depth = _depth[0]
+    _depth[0] = depth + 1
+    start = time.time()
+    try:
+        return _original_import(name, *args, **kwargs)
+    finally:
+        _depth[0] = depth
+        _imports.append((name, time.time() - start, depth))
+
+
+def install(argv=None):
+    # включает профилирование, если в argv есть ключ --profile-startup
+    global enabled, _start, _last
+    if argv is None:
+        argv = sys.argv
+    if PROFILE_FLAG not in argv or enabled:
+        return enabled
+    enabled = True
+    _start = _last = time.time()
+    __builtin__.__import__ = _timed_import
+    return enabled
+
+
+def phase(name):
+    # отмечает конец этапа запуска: время с прошлой отметки
+    global _last
+    if not enabled:
+        return
+    now = time.time()
+    _phases.append((name, now - _last))
+    _last = now
+
+
+def _write(line):
+    # utf-8 явно: в pipe или файл Python 2 пишет unicode как ascii и на
+    # кириллице падает
+    print(line.encode('utf-8'))
+
+
+def report():
+    # печатает импорты и этапы, возвращает время до первого кадра
+    __builtin__.__import__ = _original_import
+    total = time.time() - _start
+    _write(u"Импорты (самые долгие, с учетом вложенных):")
+    for name, seconds, depth in sorted(_imports, key=lambda i: -i[1])[
+            :TOP_IMPORTS]:
+        _write(u"  %8.1f мс  %s%s" % (seconds * 1000, u"  " * depth, name))
+    _write(u"Этапы до первого кадра:")
+    for name, seconds in _phases:
+        _write(u"  %8.1f мс  %s" % (seconds * 1000, name))
+    _write(u"  %8.1f мс  всего" % (total * 1000))
+    return total
+
+
+def first_frame():
+    # вызывается после первого pygame.display.update()
+    if not enabled:
+        return
+    phase('first frame')
+    report()
+    sys.exit(0)
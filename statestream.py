@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Запись состояния уровня по кадрам и ее просмотр без симуляции: для
+# зрителей и для "призраков" прошлых забегов.
+#
+#   python platformerhabrahabr.py --stream run.smbs   # играем и пишем
+#   python statestream.py run.smbs                    # смотрим
+#   python statestream.py run.smbs --level 2 --tick 1800
+#
+# В отличие от replay.py (пишет нажатия, при просмотре мир симулируется
+# заново), здесь на каждом кадре пишется, где стоит герой и в какой позе
+# (player.POSE_*) и где монстры. Координаты - целые пиксели, каждый кадр
+# хранит разницу с прошлым, zigzag varint. Кадры режутся на куски по
+# CHUNK_TICKS, каждый кусок начинается с полного кадра и сжат zlib
+# отдельно, так что любой кадр достается распаковкой одного куска.
+# Кодирует и пишет фоновый поток: игра на кадре только складывает числа
+# в список.
+#
+# Файл: MAGIC, VERSION, затем записи подряд:
+#   'L', длина имени, имя уровня в utf-8, число монстров - начало уровня
+#   'C', кадров, длина сжатых данных, данные - кусок кадров уровня
+# Кадр - x, y, поза героя, затем x, y каждого монстра в порядке
+# World.monsters.
+
+import os
+import zlib
+import struct
+import threading
+from Queue import Queue
+
+MAGIC = 'SMBS'
+VERSION = 1
+CHUNK_TICKS = 256  # кадров в куске: чем больше, тем лучше сжатие и тем
+#                    дольше распаковка при перемотке
+COMPRESSION = 6
+FILE_HEADER = struct.Struct('!4sB')
+# после байта 'L' или 'C'
+LEVEL_HEADER = struct.Struct('!H')  # длина имени, дальше имя
+LEVEL_MONSTERS = struct.Struct('!I')
+CHUNK_HEADER = struct.Struct('!II')  # кадров, байт сжатых данных
+SEEK_TICKS = 5 * 60  # перемотка стрелками в просмотре, кадров
+
+
+def tick_values(world):
+    # кадр: (x, y, поза героя, x, y монстров...)
+    hero = world.hero
+    values = [hero.rect.x, hero.rect.y, hero.pose]
+    for monster in world.monsters:
+        rect = monster.rect
+        values.append(rect.x)
+        values.append(rect.y)
+    return values
+
+
+def encode_chunk(ticks):
+    # [кадр] -> байты: первый кадр целиком, дальше разница с прошлым
+    out = bytearray()
+    append = out.append
+    previous = [0] * len(ticks[0])
+    for values in ticks:
+        for i, value in enumerate(values):
+            delta = value - previous[i]
+            delta = (delta << 1) ^ (delta >> 63)  # zigzag: -1 -> 1, 1 -> 2
+            while delta > 0x7F:
+                append(0x80 | (delta & 0x7F))
+                delta >>= 7
+            append(delta)
+        previous = values
+    return zlib.compress(str(out), COMPRESSION)
+
+
+def decode_chunk(data, ticks, width):
+    # байты куска -> [кадр], width - чисел в кадре
+    raw = bytearray(zlib.decompress(data))
+    result = []
+    values = [0] * width
+    pos = 0
+    for tick in xrange(ticks):
+        values = list(values)
+        for i in xrange(width):
+            shift = delta = 0
+            while True:
+                byte = raw[pos]
+                pos += 1
+                delta |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+            values[i] += (delta >> 1) ^ -(delta & 1)
+        result.append(values)
+    return result
+
+
+class StateRecorder(object):
+    # Пишет кадры в файл: start_level(name, world) в начале уровня,
+    # record(world) после каждого шага, close() в конце.
+    # Кодирует и пишет фоновый поток, record только копит числа.
+
+    def __init__(self, file_name, chunk_ticks=CHUNK_TICKS):
+        self.file_name = file_name
+        self.chunk_ticks = chunk_ticks
+        self._ticks = None
+        self._queue = Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._write_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def start_level(self, name, world):
+        self._flush()
+        self._queue.put(('L', name, len(world.monsters)))
+        self._ticks = []
+
+    def record(self, world):
+        self._ticks.append(tick_values(world))
+        if len(self._ticks) >= self.chunk_ticks:
+            self._flush()
+
+    def _flush(self):
+        if self._ticks:
+            self._queue.put(('C', self._ticks))
+            self._ticks = []
+
+    def close(self):
+        # дописывает последний кусок и ждет фоновый поток
+        self._flush()
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise IOError(u'%s: %s' % (self.file_name, self._error))
+
+    def _write_loop(self):
+        out = open(self.file_name, 'wb')
+        try:
+            out.write(FILE_HEADER.pack(MAGIC, VERSION))
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                if self._error is not None:
+                    continue  # уже сломались, просто разбираем очередь
+                try:
+                    if item[0] == 'L':
+                        name = item[1].encode('utf-8')
+                        out.write('L' + LEVEL_HEADER.pack(len(name)) +
+                                  name + LEVEL_MONSTERS.pack(item[2]))
+                    else:
+                        data = encode_chunk(item[1])
+                        out.write('C' + CHUNK_HEADER.pack(len(item[1]),
+                                                          len(data)) + data)
+                except Exception as e:
+                    self._error = e
+        finally:
+            out.close()
+
+
+class StreamLevel(object):
+    # уровень в файле: имя, число монстров, куски [(первый кадр, кадров,
+    # смещение данных, длина)]
+
+    def __init__(self, name, monsters):
+        self.name = name
+        self.monsters = monsters
+        self.width = 3 + 2 * monsters  # чисел в кадре
+        self.chunks = []
+        self.ticks = 0
+
+
+class StateStream(object):
+    # Чтение записи с произвольным доступом: state(уровень, кадр).
+    # При открытии читаются только заголовки, куски распаковываются по
+    # мере надобности, последний распакованный помнится.
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.levels = []
+        self._file = open(file_name, 'rb')
+        self._chunk = (None, None)  # (ключ, кадры) последнего куска
+        try:
+            self._read_index()
+        except Exception:
+            self._file.close()
+            raise
+
+    def _read_index(self):
+        data = self._file.read(FILE_HEADER.size)
+        if len(data) < FILE_HEADER.size:
+            raise ValueError(u'%s: not a state stream' % self.file_name)
+        magic, version = FILE_HEADER.unpack(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(u'%s: not a state stream or unsupported '
+                             u'version %r' % (self.file_name, version))
+        read = self._file.read
+        size = os.fstat(self._file.fileno()).st_size
+        # запись, оборванную на середине (игру убили), пропускаем: кадры
+        # до нее целы
+        while True:
+            kind = read(1)
+            if not kind:
+                break
+            if kind == 'L':
+                data = read(LEVEL_HEADER.size)
+                if len(data) < LEVEL_HEADER.size:
+                    break
+                name = read(LEVEL_HEADER.unpack(data)[0])
+                data = read(LEVEL_MONSTERS.size)
+                if len(data) < LEVEL_MONSTERS.size:
+                    break
+                self.levels.append(StreamLevel(name.decode('utf-8'),
+                                               LEVEL_MONSTERS.unpack(data)[0]))
+            elif kind == 'C' and self.levels:
+                data = read(CHUNK_HEADER.size)
+                if len(data) < CHUNK_HEADER.size:
+                    break
+                ticks, length = CHUNK_HEADER.unpack(data)
+                offset = self._file.tell()
+                if offset + length > size:
+                    break
+                level = self.levels[-1]
+                level.chunks.append((level.ticks, ticks, offset, length))
+                level.ticks += ticks
+                self._file.seek(length, 1)
+            else:
+                raise ValueError(u'%s: broken record at byte %d' % (
+                    self.file_name, self._file.tell() - 1))
+
+    def state(self, level_index, tick):
+        # -> кадр (x, y, поза героя, x, y монстров...) уровня level_index
+        level = self.levels[level_index]
+        if not 0 <= tick < level.ticks:
+            raise IndexError(u'tick %d out of 0..%d' % (tick, level.ticks - 1))
+        # куски идут подряд, ищем делением пополам
+        chunks = level.chunks
+        low, high = 0, len(chunks) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if chunks[middle][0] <= tick:
+                low = middle
+            else:
+                high = middle - 1
+        first, ticks, offset, length = chunks[low]
+        key = (level_index, first)
+        if self._chunk[0] != key:
+            self._file.seek(offset)
+            self._chunk = (key, decode_chunk(self._file.read(length), ticks,
+                                             level.width))
+        return self._chunk[1][tick - first]
+
+    def close(self):
+        self._file.close()
+
+
+def show_state(world, values):
+    # расставляет героя и монстров World по кадру записи
+    hero = world.hero
+    hero.rect.x, hero.rect.y = values[0], values[1]
+    hero.draw_pose(values[2])
+    for i, monster in enumerate(world.monsters):
+        monster.rect.x = values[3 + 2 * i]
+        monster.rect.y = values[4 + 2 * i]
+        monster.animate()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description=u'Просмотр записи состояния без симуляции')
+    parser.add_argument('stream', help=u'файл записи (--stream в игре)')
+    parser.add_argument('--level', type=int, default=1,
+                        help=u'с какого уровня записи начать (с 1)')
+    parser.add_argument('--tick', type=int, default=0,
+                        help=u'с какого кадра начать')
+    args = parser.parse_args(argv)
+
+    import pygame
+    from pygame import QUIT, KEYDOWN, K_SPACE, K_LEFT, K_RIGHT, K_ESCAPE
+    import assets
+    import simulation
+    import framebuffer
+    from camera import WIN_WIDTH, WIN_HEIGHT
+    stream = StateStream(args.stream)
+    if not 1 <= args.level <= len(stream.levels):
+        parser.error(u'level must be 1..%d' % len(stream.levels))
+    pygame.init()
+    screen = pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT), 0, 32)
+    pygame.display.set_caption("Super Mario Boy")
+    assets.warm_up()
+    renderer = framebuffer.FrameRenderer(screen)  # слои - RendererPygame
+    timer = pygame.time.Clock()
+    tick = args.tick
+    paused = False
+    try:
+        for index in xrange(args.level - 1, len(stream.levels)):
+            level = stream.levels[index]
+            world = simulation.World(simulation.load_level(level.name))
+            world.spawn_hero()
+            if len(world.monsters) != level.monsters:
+                raise ValueError(u'%s: recorded %d monsters, level has %d'
+                                 % (level.name, level.monsters,
+                                    len(world.monsters)))
+            renderer.reset(level.name, world)
+            while tick < level.ticks:
+                timer.tick(60)
+                for e in pygame.event.get():
+                    if e.type == QUIT or (e.type == KEYDOWN and
+                                          e.key == K_ESCAPE):
+                        return
+                    if e.type == KEYDOWN and e.key == K_SPACE:
+                        paused = not paused
+                    if e.type == KEYDOWN and e.key == K_LEFT:
+                        tick = max(0, tick - SEEK_TICKS)
+                    if e.type == KEYDOWN and e.key == K_RIGHT:
+                        tick = min(level.ticks - 1, tick + SEEK_TICKS)
+                show_state(world, stream.state(index, tick))
+                world.animatedEntities.update()
+                renderer.render()
+                pygame.display.set_caption(u"%s  %d / %d" % (
+                    level.name, tick, level.ticks))
+                pygame.display.update()
+                if not paused:
+                    tick += 1
+            tick = 0
+    finally:
+        stream.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Потоковая подгрузка бесконечных карт (Tiled infinite maps).
+# В памяти держим только чанки вокруг камеры: тайлы, тела для столкновений,
+# монстров и прочие объекты. Остальное выгружаем.
+
+from pygame import Rect
+from blocks import Platform, BlockDie, make_bodies
+
+
+class StreamingWorld(object):
+
+    def __init__(self, sprite_layers, platforms_layer, dieBlocks_layer,
+                 platforms):
+        # все чанковые слои, их окна двигаются вместе с камерой
+        self.chunk_layers = [l for l in sprite_layers
+                             if not l.is_object_group and hasattr(l, "resident")]
+        self.platforms_layer = platforms_layer
+        self.dieBlocks_layer = dieBlocks_layer
+        self.platforms = platforms  # общий список того, во что врезаемся
+        self.bodies = {}  # {(слой, чанк): [тела для столкновений]}
+        self.objects = []  # [(объект, его группы, лежит ли в platforms)]
+        self.resident_rect = Rect(0, 0, 0, 0)
+
+        # границы уровня по всем чанкам, в тайлах
+        bounds = [l.bounds for l in self.chunk_layers]
+        left = min(b[0] for b in bounds)
+        top = min(b[1] for b in bounds)
+        right = max(b[2] for b in bounds)
+        bottom = max(b[3] for b in bounds)
+        tw = platforms_layer.tilewidth
+        th = platforms_layer.tileheight
+        self.level_rect = Rect(left * tw, top * th,
+                               (right - left) * tw, (bottom - top) * th)
+
+    def adopt(self, objects):
+        # объекты с объектных слоев (монстры, телепорты, принцесса)
+        # запоминаем, в каких группах они были, чтобы потом вернуть
+        for obj in objects:
+            self.objects.append((obj, obj.groups(), obj in self.platforms))
+
+    def update(self, view_rect):
+        # view_rect - видимая часть мира в пикселях
+        changed = False
+        for layer in self.chunk_layers:
+            loaded, evicted = layer.update_window(view_rect)
+            if not (loaded or evicted):
+                continue
+            changed = True
+            for key in evicted:
+                for body in self.bodies.pop((layer, key), []):
+                    self.platforms.remove(body)
+            if layer is self.platforms_layer:
+                self._load_bodies(layer, loaded, Platform)
+            elif layer is self.dieBlocks_layer:
+                self._load_bodies(layer, loaded, BlockDie)
+        if changed:
+            layer = self.platforms_layer
+            self.resident_rect = Rect(layer.origin_x * layer.tilewidth,
+                                      layer.origin_y * layer.tileheight,
+                                      layer.num_tiles_x * layer.tilewidth,
+                                      layer.num_tiles_y * layer.tileheight)
+            self._update_objects()
+        return changed
+
+    def _load_bodies(self, layer, keys, cls):
+        for key in keys:
+            # тайлы объединяются только в пределах одного чанка
+            bodies = make_bodies(layer.resident[key], cls, key[0], key[1])
+            self.bodies[(layer, key)] = bodies
+            self.platforms.extend(bodies)
+
+    def _update_objects(self):
+        # монстры и объекты вне окна не обновляются и не рисуются
+        for obj, groups, is_platform in self.objects:
+            if self.resident_rect.colliderect(obj.rect):
+                if not obj.alive():
+                    obj.add(*groups)
+                    if is_platform:
+                        self.platforms.append(obj)
+            elif obj.alive():
+                obj.kill()
+                if is_platform:
+                    self.platforms.remove(obj)
@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+
+# Тесты без окна и без часов, запускаются из корня репозитория:
+#
+#   python -m unittest discover
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import json
+import unittest
+
+import benchmark
+
+
+class MeasureTest(unittest.TestCase):
+
+    def test_measure(self):
+        calls = []
+        times = benchmark.measure(lambda arg: calls.append(arg), 3,
+                                  warm_up=2, setup=lambda: len(calls))
+        # прогрев не попадает в замер, setup - перед каждым прогоном
+        self.assertEqual(len(times), 3)
+        self.assertEqual(calls, [0, 1, 2, 3, 4])
+        self.assertTrue(all(seconds >= 0 for seconds in times))
+
+    def test_summary(self):
+        result = benchmark.summary('x', {'n': 1}, [3.0, 1.0, 2.0, 6.0],
+                                   items=4)
+        self.assertEqual((result['min'], result['median'], result['mean'],
+                          result['max']), (1.0, 3.0, 3.0, 6.0))
+        self.assertEqual(result['per_item'], 0.75)
+        self.assertEqual(result['times'], [3.0, 1.0, 2.0, 6.0])
+
+
+class RunAllTest(unittest.TestCase):
+
+    def test_every_benchmark_reports(self):
+        reported = []
+        data = benchmark.run_all(columns=(100,), entities=(10,), repeat=1,
+                                 report=reported.append)
+        results = data['results']
+        self.assertEqual(results, reported)
+        self.assertEqual(
+            [result['name'] for result in results],
+            ['parse_decode', 'ResourceLoaderPygame.load',
+             'get_layers_from_map', 'RendererPygame.render_layer',
+             'Player.update', 'Player.collide', 'Monster.update',
+             'PygAnimation.blit', 'PygAnimation.blit'])
+        for result in results:
+            self.assertEqual(len(result['times']), 1)
+            self.assertTrue(result['median'] > 0)
+        self.assertEqual(results[0]['params'], {'columns': 100,
+                                                'rows': benchmark.ROWS})
+        self.assertEqual(results[-1]['params']['animations'], 10)
+        self.assertEqual(data['meta']['repeat'], 1)
+        json.dumps(data)  # то, что пишет main()
+
+    def test_only(self):
+        data = benchmark.run_all(columns=(100,), entities=(10,), repeat=1,
+                                 only=['parse_decode'])
+        self.assertEqual([result['name'] for result in data['results']],
+                         ['parse_decode'])
+
+
+if __name__ == '__main__':
+    unittest.main()
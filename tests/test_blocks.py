@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+from pygame import Rect
+
+from blocks import Platform, BlockDie, merge_cells, make_bodies
+from blocks import PLATFORM_WIDTH, PLATFORM_HEIGHT
+from monsters import Monster
+
+
+def grid(text):
+    # '#' - тайл, остальное - пусто; строки могут быть разной длины
+    return [[1 if c == '#' else None for c in line]
+            for line in text.split('\n')]
+
+
+def covered(rects):
+    # {(x, y)} клеток под прямоугольниками; каждая клетка - один раз
+    cells = []
+    for x, y, w, h in rects:
+        cells.extend((xx, yy) for yy in range(y, y + h)
+                     for xx in range(x, x + w))
+    return cells
+
+
+def filled(rows):
+    return set((x, y) for y, row in enumerate(rows)
+               for x, cell in enumerate(row) if cell is not None)
+
+
+class MergeCellsTest(unittest.TestCase):
+
+    def check_cover(self, rows):
+        cells = covered(merge_cells(rows))
+        self.assertEqual(len(cells), len(set(cells)))  # без наложений
+        self.assertEqual(set(cells), filled(rows))
+
+    def test_empty(self):
+        self.assertEqual(merge_cells([]), [])
+        self.assertEqual(merge_cells(grid('   \n   ')), [])
+
+    def test_full_grid_is_one_rect(self):
+        self.assertEqual(merge_cells(grid('###\n###\n###')), [(0, 0, 3, 3)])
+
+    def test_hole(self):
+        rows = grid('###\n# #\n###')
+        self.assertEqual(merge_cells(rows), [(0, 0, 3, 1), (0, 1, 1, 2),
+                                             (2, 1, 1, 2), (1, 2, 1, 1)])
+        self.check_cover(rows)
+
+    def test_ragged_rows(self):
+        # нижние строки короче: прямоугольник не растягивается за их конец
+        rows = grid('###\n# #\n####\n#')
+        self.assertEqual(merge_cells(rows), [(0, 0, 3, 1), (0, 1, 1, 3),
+                                             (2, 1, 1, 2), (1, 2, 1, 1),
+                                             (3, 2, 1, 1)])
+        self.check_cover(rows)
+
+    def test_random_grids(self):
+        rnd = random.Random(1)
+        for case in range(200):
+            rows = [[1 if rnd.random() < 0.6 else None
+                     for x in range(rnd.randrange(0, 12))]
+                    for y in range(rnd.randrange(0, 10))]
+            self.check_cover(rows)
+
+
+class MakeBodiesTest(unittest.TestCase):
+
+    def test_bodies_in_pixels(self):
+        bodies = make_bodies(grid('##\n##'), Platform, 2, 1)
+        self.assertEqual([tuple(body.rect) for body in bodies],
+                         [(2 * PLATFORM_WIDTH, PLATFORM_HEIGHT,
+                           2 * PLATFORM_WIDTH, 2 * PLATFORM_HEIGHT)])
+
+    def test_tiles_hit(self):
+        body = make_bodies(grid('###\n###'), Platform)[0]
+        self.assertEqual(body.tiles_hit(body.rect), 6)
+        self.assertEqual(body.tiles_hit(Rect(16, 0, 32, 32)), 2)
+        self.assertEqual(body.tiles_hit(Rect(16, 16, 32, 32)), 4)
+        self.assertEqual(body.tiles_hit(Rect(0, 100, 32, 32)), 0)
+        # у смертельных блоков между тайлами щели, а тело одно
+        die = make_bodies(grid('##'), BlockDie)[0]
+        gap = Rect(26, 0, 12, 32)
+        self.assertTrue(die.rect.colliderect(gap))
+        self.assertEqual(die.tiles_hit(gap), 0)
+
+    def test_monster_turns_as_with_tile_bodies(self):
+        # монстр задевает столбик из двух тайлов: два поворота гасят друг
+        # друга, как и с отдельными телами тайлов
+        rows = grid('#\n#\n#')
+        for y in range(-20, 3 * PLATFORM_HEIGHT + 20, 3):
+            turns = []
+            for bodies in (make_bodies(rows, Platform),
+                           [Platform(0, yy * PLATFORM_HEIGHT)
+                            for yy in range(3)]):
+                monster = Monster(PLATFORM_WIDTH - 4, y, 2, 0, 100, 0)
+                monster.collide(bodies)
+                turns.append(monster.xvel)
+            self.assertEqual(turns[0], turns[1], y)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+from pygame import KEYDOWN, KEYUP, QUIT
+
+import controls
+from controls import Controls, parse_bindings, BINDINGS
+
+
+def post(event_type, **attributes):
+    pygame.event.post(pygame.event.Event(event_type, **attributes))
+
+
+class BindingsTest(unittest.TestCase):
+
+    def test_parse(self):
+        bindings = parse_bindings('left=a, up=w+space')
+        self.assertEqual(bindings[pygame.K_a], 'left')
+        self.assertEqual(bindings[pygame.K_w], 'up')
+        self.assertEqual(bindings[pygame.K_SPACE], 'up')
+        # старые клавиши переназначенных действий больше не работают
+        self.assertFalse(pygame.K_LEFT in bindings)
+        self.assertFalse(pygame.K_UP in bindings)
+        # остальные действия на своих местах
+        self.assertEqual(bindings[pygame.K_RIGHT], 'right')
+        self.assertEqual(bindings[pygame.K_LSHIFT], 'running')
+
+    def test_errors(self):
+        self.assertRaises(ValueError, parse_bindings, 'jump=w')
+        self.assertRaises(ValueError, parse_bindings, 'left')
+        self.assertRaises(ValueError, parse_bindings, 'left=nosuchkey')
+
+
+class PollTest(unittest.TestCase):
+    # события pygame.event.post не меняют key.get_pressed(): для poll()
+    # это нажатие, отпущенное до конца кадра
+
+    def setUp(self):
+        pygame.display.init()
+        self.controls = Controls(parse_bindings('up=w,running=z'))
+        self.controls.install()
+        pygame.event.clear()
+
+    def test_keydown_is_latched(self):
+        post(KEYDOWN, key=pygame.K_w)
+        post(KEYUP, key=pygame.K_w)
+        self.assertEqual(self.controls.poll(), (False, False, True, False))
+        # в следующем кадре нажатия уже нет
+        self.assertEqual(self.controls.poll(), (False, False, False, False))
+
+    def test_rebound_keys(self):
+        post(KEYDOWN, key=pygame.K_UP)  # больше не прыжок
+        post(KEYDOWN, key=pygame.K_z)
+        post(KEYDOWN, key=pygame.K_LEFT)
+        self.assertEqual(self.controls.poll(), (True, False, False, True))
+
+    def test_bind(self):
+        self.controls.bind(BINDINGS)
+        post(KEYDOWN, key=pygame.K_UP)
+        post(KEYDOWN, key=pygame.K_w)
+        self.assertEqual(self.controls.poll(), (False, False, True, False))
+        self.assertEqual(self.controls._keys[controls.ACTIONS.index('up')],
+                         [pygame.K_UP])
+
+    def test_commands_and_quit(self):
+        calls = []
+        self.controls.commands[pygame.K_F3] = lambda: calls.append('F3')
+        post(KEYDOWN, key=pygame.K_F3)
+        post(KEYDOWN, key=pygame.K_F3)
+        self.assertEqual(self.controls.poll(), (False,) * 4)
+        self.assertEqual(calls, ['F3', 'F3'])
+        self.assertFalse(self.controls.quit)
+        post(QUIT)
+        self.controls.poll()
+        self.assertTrue(self.controls.quit)
+
+    def test_install(self):
+        self.assertFalse(pygame.event.get_blocked(KEYDOWN))
+        self.assertFalse(pygame.event.get_blocked(QUIT))
+        self.assertTrue(pygame.event.get_blocked(KEYUP))
+        self.assertTrue(pygame.event.get_blocked(pygame.MOUSEMOTION))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+import pygame
+
+import framebuffer
+
+# (цвет, яркость): серый остается собой, а не цветом палитры 3-3-2
+PIXELS = [((128, 128, 128), 128), ((200, 200, 200), 200),
+          ((100, 100, 100), 100), ((0, 0, 0), 0), ((255, 255, 255), 255),
+          ((255, 0, 0), 76), ((0, 255, 0), 150), ((0, 0, 255), 29),
+          ((10, 20, 30), 18)]
+
+
+def source(width, height):
+    # 32-битная Surface: пиксели PIXELS по строкам
+    surface = pygame.Surface((width, height), 0, 32)
+    for i, (color, luma) in enumerate(PIXELS):
+        surface.set_at((i % width, i // width), color)
+    return surface
+
+
+class GrayscaleTest(unittest.TestCase):
+
+    def test_gray_bytes(self):
+        gray = bytearray(framebuffer.gray_bytes(source(len(PIXELS), 1)))
+        self.assertEqual(list(gray), [luma for color, luma in PIXELS])
+
+    def test_blit_gray_into_buffer(self):
+        width, height = 3, 3
+        frames = framebuffer.FrameBuffer(width, height, grayscale=True,
+                                         count=2)
+        framebuffer.blit_gray(source(width, height), frames.target(1))
+        self.assertEqual(list(bytearray(frames.view(1).tobytes())),
+                         [luma for color, luma in PIXELS])
+        self.assertEqual(list(bytearray(frames.view(0).tobytes())),
+                         [0] * width * height)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+import os
+import array
+import shutil
+import tempfile
+import unittest
+
+import pygame
+
+import helperspygame
+import simulation
+import textlevel
+from helperspygame import TilesetCache, ResourceLoaderPygame
+
+
+class TilesetCacheTest(unittest.TestCase):
+
+    def test_reference_counting(self):
+        cache = TilesetCache()
+        created = []
+
+        def create():
+            created.append(object())
+            return [created[-1]]
+
+        key = ('tiles.png', 1.0)
+        self.assertEqual(cache.acquire(key, create), [created[0]])
+        self.assertEqual(cache.acquire(key, create), [created[0]])
+        self.assertEqual((len(created), cache.misses, cache.hits), (1, 1, 1))
+        self.assertEqual(cache.get_ref_count(key), 2)
+        cache.release(key)
+        self.assertEqual(cache.evict(), 0)  # еще используется
+        cache.release(key)
+        cache.release(key)  # лишний release не уводит счетчик ниже нуля
+        self.assertEqual(cache.get_ref_count(key), 0)
+        self.assertTrue(key in cache)  # без evict остается в кэше
+        self.assertEqual(cache.evict(), 1)
+        self.assertFalse(key in cache)
+        self.assertEqual(cache.get_ref_count(key), 0)
+
+    def test_evict_one_key(self):
+        cache = TilesetCache()
+        cache.acquire('a', list)
+        cache.acquire('b', list)
+        cache.release('a')
+        cache.release('b')
+        self.assertEqual(cache.evict('a'), 1)
+        self.assertEqual(len(cache), 1)
+        self.assertTrue('b' in cache)
+
+    def test_key_follows_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'tiles.png')
+            self.assertEqual(TilesetCache.make_key(filename, 0), None)
+            open(filename, 'wb').close()
+            os.utime(filename, (1000, 1000))
+            key = TilesetCache.make_key(filename, 0)
+            self.assertEqual(TilesetCache.make_key(filename, 0), key)
+            self.assertNotEqual(TilesetCache.make_key(filename, 1), key)
+            os.utime(filename, (2000, 2000))  # файл поменялся
+            self.assertNotEqual(TilesetCache.make_key(filename, 0), key)
+        finally:
+            shutil.rmtree(directory)
+
+
+class LoaderCacheTest(unittest.TestCase):
+
+    def loader(self, cache):
+        loader = helperspygame.ResourceLoaderPygame(use_subsurfaces=True,
+                                                    tileset_cache=cache)
+        loader.load(simulation.load_map(simulation.level_file(
+            'levels/map_1')))
+        return loader
+
+    def test_loaders_share_tilesets(self):
+        cache = TilesetCache()
+        first = self.loader(cache)
+        tilesets = len(cache)
+        self.assertTrue(tilesets > 0)
+        second = self.loader(cache)
+        self.assertEqual(len(cache), tilesets)
+        self.assertEqual((cache.misses, cache.hits), (tilesets, tilesets))
+        for gid, (offx, offy, image) in first.indexed_tiles.items():
+            self.assertTrue(second.indexed_tiles[gid][2] is image)
+
+        first.release()
+        self.assertEqual(cache.evict(), 0)  # second еще держит тайлсеты
+        second.release()
+        second.release()  # повторный release ничего не отдает
+        self.assertEqual(cache.evict(), tilesets)
+        self.assertEqual(len(cache), 0)
+
+    def test_without_cache(self):
+        loader = self.loader(None)
+        self.assertTrue(loader.indexed_tiles)
+        loader.release()
+
+
+class SubsurfaceTest(unittest.TestCase):
+
+    def loader(self, use_subsurfaces):
+        loader = helperspygame.ResourceLoaderPygame(
+            use_subsurfaces=use_subsurfaces, tileset_cache=None)
+        loader.load(simulation.load_map(simulation.level_file(
+            'levels/map_1')))
+        return loader
+
+    def test_tiles_share_the_tileset(self):
+        views = self.loader(True).indexed_tiles
+        copies = self.loader(False).indexed_tiles
+        self.assertEqual(sorted(views), sorted(copies))
+        parents = set()
+        for gid, (offx, offy, img) in views.items():
+            parents.add(img.get_parent())
+            self.assertEqual(copies[gid][:2], (offx, offy))
+            self.assertEqual(img.get_size(), copies[gid][2].get_size())
+        # все тайлы - окна в одну картинку tiles.png, без копий пикселей
+        self.assertEqual(len(parents), 1)
+        parent = parents.pop()
+        self.assertTrue(parent is not None)
+        self.assertEqual(parent.get_size(), (417, 288))
+        gid = min(views)
+        self.assertEqual(copies[gid][2].get_parent(), None)
+
+        # пиксели те же, что у копии, и меняются вместе с картинкой
+        img = views[gid][2]
+        x, y = img.get_offset()
+        self.assertEqual(img.get_at((5, 5)), copies[gid][2].get_at((5, 5)))
+        parent.set_at((x + 5, y + 5), (1, 2, 3))
+        self.assertEqual(img.get_at((5, 5))[:3], (1, 2, 3))
+
+
+class FlippedTileTest(unittest.TestCase):
+
+    FLIP_X = ResourceLoaderPygame.FLIP_X
+    FLIP_Y = ResourceLoaderPygame.FLIP_Y
+
+    def loader(self, *gids):
+        # уровень из одной строки платформ, gids - их номера с флагами
+        world_map = textlevel.make_map(
+            '-' * len(gids), len(gids), 1, tileset_image=os.path.join(
+                simulation.GAME_DIR, 'levels', textlevel.TILESET_IMAGE))
+        world_map.named_layers[u'Platforms'].decoded_content[:] = \
+            array.array('I', gids)
+        loader = ResourceLoaderPygame(tileset_cache=None)
+        loader.load(world_map)
+        return loader
+
+    def pixels(self, img):
+        return pygame.image.tostring(img, 'RGBA')
+
+    def test_created_on_first_use(self):
+        gid = textlevel.PLATFORM_GID
+        loader = self.loader(gid, gid | self.FLIP_X,
+                             gid | self.FLIP_X | self.FLIP_Y)
+        self.assertEqual(loader.flipped_gids,
+                         set([gid | self.FLIP_X,
+                              gid | self.FLIP_X | self.FLIP_Y]))
+        self.assertFalse(gid | self.FLIP_X in loader.indexed_tiles)
+
+        tile = loader.get_tile(gid | self.FLIP_X)
+        self.assertTrue(loader.indexed_tiles[gid | self.FLIP_X] is tile)
+        self.assertTrue(loader.get_tile(gid | self.FLIP_X) is tile)
+        self.assertFalse(gid | self.FLIP_X | self.FLIP_Y in
+                         loader.indexed_tiles)
+
+        offx, offy, img = loader.get_tile(gid)
+        self.assertEqual(tile[:2], (offx, offy))
+        self.assertEqual(self.pixels(tile[2]),
+                         self.pixels(pygame.transform.flip(img, True, False)))
+        self.assertEqual(
+            self.pixels(loader.get_tile(gid | self.FLIP_X | self.FLIP_Y)[2]),
+            self.pixels(pygame.transform.flip(img, True, True)))
+
+    def test_unknown_tile(self):
+        self.assertRaises(Exception, self.loader, 500 | self.FLIP_Y)
+
+
+if __name__ == '__main__':
+    unittest.main()
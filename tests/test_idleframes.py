@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+from pygame import Rect
+
+import idleframes
+from camera import Camera, camera_configure
+
+
+class Animation(object):
+    # вместо PygAnimation: look() смотрит только на lastFrameNum
+    lastFrameNum = 0
+
+
+class Entity(object):
+
+    def __init__(self, x, y, animation=None):
+        self.rect = Rect(x, y, 32, 32)
+        if animation is not None:
+            self.boltAnim = animation
+
+
+class ChangedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.idle = idleframes.IdleFrames(idle_after=3)
+        self.camera = Camera(camera_configure, 3200, 800)
+        self.animation = Animation()
+        self.hero = Entity(100, 100)
+        self.far = Entity(3000, 100)  # за экраном
+        self.entities = [self.hero, Entity(200, 100, self.animation),
+                         self.far]
+        self.assertTrue(self.changed())  # первый кадр рисуется всегда
+
+    def changed(self, pressed=False):
+        return self.idle.changed(self.camera, self.entities, pressed)
+
+    def test_same_frame(self):
+        self.assertFalse(self.changed())
+        self.assertEqual(self.idle.skipped, 1)
+        # за экраном ничего не видно
+        self.far.rect.x += 5
+        self.assertFalse(self.changed())
+        self.assertFalse(self.changed())
+        self.assertTrue(self.idle.idle)
+
+    def test_camera_move(self):
+        self.changed()
+        self.camera.update(Entity(1000, 100))
+        self.assertTrue(self.changed())
+        self.assertEqual(self.idle.still, 0)
+
+    def test_entity_move(self):
+        self.hero.rect.x += 1
+        self.assertTrue(self.changed())
+        self.assertFalse(self.changed())
+
+    def test_animation_frame(self):
+        self.animation.lastFrameNum = 1
+        self.assertTrue(self.changed())
+        # картинка сменилась, но все стоит на месте: простой не прерывается
+        self.assertEqual(self.idle.still, 1)
+        self.assertFalse(self.changed())
+
+    def test_pressed(self):
+        self.changed()
+        self.changed()
+        self.assertEqual(self.idle.still, 2)
+        # нажатие прерывает простой, но кадр тот же - рисовать нечего
+        self.assertFalse(self.changed(pressed=True))
+        self.assertEqual(self.idle.still, 0)
+        self.assertFalse(self.idle.idle)
+
+    def test_force_and_reset(self):
+        self.assertTrue(self.idle.changed(self.camera, self.entities,
+                                          force=True))
+        self.idle.reset()
+        self.assertTrue(self.changed())
+
+
+class WaitTest(unittest.TestCase):
+
+    def setUp(self):
+        pygame.display.init()
+        self.idle = idleframes.IdleFrames(idle_after=0)
+        self.idle.install()
+        self.timer = pygame.time.Clock()
+
+    def test_steps_missed_ticks(self):
+        self.assertEqual(self.idle.wait(self.timer), 1)  # первый кадр
+        # полсекунды простоя - это 30 тактов мира при 60 FPS
+        self.idle._tick_time -= 500
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN,
+                                             key=pygame.K_LEFT))
+        ticks = self.idle.wait(self.timer)
+        self.assertTrue(29 <= ticks <= 31, ticks)
+        # нажатие вернулось в очередь для controls.Controls
+        self.assertTrue(pygame.event.get(pygame.KEYDOWN))
+
+    def test_due(self):
+        idle = idleframes.IdleFrames(fps=50)  # такт - 20 мс
+        idle._tick_time = 0
+        self.assertEqual(idle._due(10), 1)  # не меньше такта
+        self.assertEqual(idle._due(110), 4)  # с 20 мс
+        self.assertEqual(idle._due(101), 1)
+        self.assertEqual(idle._tick_time, 120)
+        # доли такта копятся, а не теряются
+        self.assertEqual([idle._due(t) for t in (150, 180, 210, 240)],
+                         [1, 2, 1, 2])
+        self.assertEqual(idle._due(10000), 50)  # больше секунды не догоняем
+        self.assertEqual(idle._tick_time, 10000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import levelgen
+from textlevel import TILE_SIZE
+
+# тесный уровень, чтобы объектам было трудно не налезть друг на друга
+PARAMS = dict(width=40, height=10, platform_density=0.3, monsters=30,
+              teleports=5)
+
+
+def cells(world_map):
+    # [(слой, имя, столбец, строка)] всех объектов и целей телепортов
+    result = []
+    for layer in world_map.layers:
+        for obj in getattr(layer, 'objects', ()):
+            # y у объектов-тайлов - нижний край
+            result.append((layer.name, obj.name, obj.x // TILE_SIZE,
+                           (obj.y - TILE_SIZE) // TILE_SIZE))
+            if 'goX' in obj.properties:
+                result.append((layer.name, u'target',
+                               int(obj.properties['goX']),
+                               int(obj.properties['goY'])))
+    return result
+
+
+class GenerateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, seed):
+        file_name = os.path.join(self.directory, '%d.tmx' % seed)
+        levelgen.write(file_name, seed=seed, **PARAMS)
+        tmx_file = open(file_name, 'rb')
+        try:
+            return tmx_file.read()
+        finally:
+            tmx_file.close()
+
+    def test_deterministic(self):
+        # тот же seed - тот же файл до байта
+        self.assertEqual(self.write(1), self.write(1))
+        self.assertNotEqual(self.write(1), self.write(2))
+
+    def test_objects_on_free_cells(self):
+        for seed in range(10):
+            world_map = levelgen.generate(seed=seed, **PARAMS)
+            named = world_map.named_layers
+            platforms = named[u'Platforms'].content2D  # столбцы
+            die = named[u'DieBlocks'].content2D
+            placed = cells(world_map)
+            self.assertEqual(len(placed), 2 + 30 + 2 * 5)
+            # ни в тайлах, ни друг на друге
+            for layer, name, x, y in placed:
+                self.assertFalse(platforms[x][y], (seed, name, x, y))
+                self.assertFalse(die[x][y], (seed, name, x, y))
+            positions = [(x, y) for layer, name, x, y in placed]
+            self.assertEqual(len(set(positions)), len(positions))
+            # у героя нет ни монстров, ни шипов
+            for layer, name, x, y in placed:
+                if layer == u'Monsters' and name is None:
+                    self.assertTrue(x > levelgen.SPAWN_CLEAR)
+            floor = PARAMS['height'] - 2
+            self.assertFalse([x for x in range(levelgen.SPAWN_CLEAR + 1)
+                              if die[x][floor]])
+
+    def test_no_free_cells(self):
+        self.assertRaises(ValueError, levelgen.generate, width=10, height=6,
+                          platform_density=1, monsters=10)
+        self.assertRaises(ValueError, levelgen.generate, width=4, height=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+import simulation
+import textlevel
+from monsters import Monster, Patrol, patrol_axis, axis_at
+from textlevel import TILE_SIZE
+
+
+def state(monster):
+    return monster.rect.x, monster.rect.y, monster.xvel, monster.yvel
+
+
+def level(monsters):
+    # уровень 20 x 8 тайлов: пол и стены, monsters - как у make_map
+    width, height = 20, 8
+    rows = ['-' + ' ' * (width - 2) + '-'] * (height - 1) + ['-' * width]
+    return textlevel.make_map(''.join(rows), width, height,
+                              (TILE_SIZE, 5 * TILE_SIZE), (), monsters)
+
+
+class PatrolTest(unittest.TestCase):
+
+    def test_period(self):
+        rnd = random.Random(1)
+        for case in range(200):
+            axis = patrol_axis(rnd.randrange(-100, 100),
+                               rnd.choice((-5, -2, -1, 1, 3, 7)),
+                               rnd.randrange(0, 200))
+            start, vel, k = axis
+            for tick in range(0, 8 * k, 3):
+                self.assertEqual(axis_at(axis, tick),
+                                 axis_at(axis, tick + 4 * k))
+            self.assertEqual(axis_at(axis, 4 * k), (start, vel))
+
+    def test_standing_axis(self):
+        self.assertEqual(patrol_axis(10, 0, -5), (10, 0, 0))
+        self.assertEqual(axis_at((10, 0, 0), 12345), (10, 0))
+
+    def test_same_as_update(self):
+        rnd = random.Random(2)
+        for case in range(100):
+            monster = Monster(rnd.randrange(0, 500), rnd.randrange(0, 500),
+                              rnd.choice((-3, -2, 0, 2, 5)),
+                              rnd.choice((-2, 0, 1)), rnd.randrange(0, 200),
+                              rnd.randrange(0, 100))
+            patrol = Patrol.from_monster(monster)
+            for tick in range(1, 600):
+                monster.update([])
+                self.assertEqual(patrol.at(tick), state(monster))
+                self.assertTrue(patrol.box.contains(monster.rect))
+
+    def test_not_periodic(self):
+        # отрицательная длина хода: монстр поворачивает каждый шаг, Patrol
+        # не строится, монстр шагает через update
+        self.assertEqual(patrol_axis(0, 2, -1), None)
+        self.assertEqual(Patrol.from_monster(Monster(0, 0, 2, 0, -1, 0)),
+                         None)
+
+
+class WorldPatrolTest(unittest.TestCase):
+
+    def test_fallback_to_stepping(self):
+        # первый монстр ходит в пустоте, второй упирается в правую стену
+        world = simulation.World(level([
+            (5 * TILE_SIZE, 2 * TILE_SIZE, 2, 0, 2 * TILE_SIZE, 0),
+            (16 * TILE_SIZE, 4 * TILE_SIZE, 3, 0, 4 * TILE_SIZE, 0)]))
+        free, blocked = world.monsters.sprites()
+        self.assertNotEqual(free.patrol, None)
+        self.assertEqual(blocked.patrol, None)
+        self.assertEqual(world._stepping, [blocked.rect])
+
+        reference = simulation.World(level([
+            (5 * TILE_SIZE, 2 * TILE_SIZE, 2, 0, 2 * TILE_SIZE, 0),
+            (16 * TILE_SIZE, 4 * TILE_SIZE, 3, 0, 4 * TILE_SIZE, 0)]))
+        for tick in range(500):
+            world.update_monsters()
+            reference.monsters.update(reference.platforms)
+            self.assertEqual(map(state, world.monsters),
+                             map(state, reference.monsters))
+
+    def test_patrol_meets_stepping_monster(self):
+        # монстр без Patrol заходит в путь монстра с Patrol: тот тоже
+        # начинает шагать, и оба ходят как через update
+        monsters = [(6 * TILE_SIZE, 3 * TILE_SIZE, 2, 0, 2 * TILE_SIZE, 0),
+                    (15 * TILE_SIZE, 3 * TILE_SIZE, -4, 0, 12 * TILE_SIZE, 0)]
+        world = simulation.World(level(monsters))
+        reference = simulation.World(level(monsters))
+        self.assertNotEqual(world.monsters.sprites()[0].patrol, None)
+        for tick in range(500):
+            world.update_monsters()
+            reference.monsters.update(reference.platforms)
+            self.assertEqual(map(state, world.monsters),
+                             map(state, reference.monsters))
+        self.assertEqual(world.monsters.sprites()[0].patrol, None)
+
+    def test_seek(self):
+        monsters = [(5 * TILE_SIZE, 2 * TILE_SIZE, 2, 1, 2 * TILE_SIZE,
+                     TILE_SIZE)]
+        world = simulation.World(level(monsters))
+        reference = simulation.World(level(monsters))
+        world.seek_monsters(777)
+        for tick in range(777):
+            reference.update_monsters()
+        self.assertEqual(map(state, world.monsters),
+                         map(state, reference.monsters))
+        world.seek_monsters(5)  # без столкновений можно и назад
+        self.assertEqual(state(world.monsters.sprites()[0]),
+                         world.monsters.sprites()[0].patrol.at(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import netgame
+from netgame import HERO, PLAYER, MONSTER
+
+
+class SnapshotTest(unittest.TestCase):
+
+    BASE = {(HERO, 0): (10, 20, 1.5, -2.0, 1, 0),
+            (PLAYER, 1): (30, 40, 0),
+            (PLAYER, 2): (50, 60, 1),
+            (MONSTER, 0): (70, 80),
+            (MONSTER, 5): (90, 100)}
+
+    def test_delta_round_trip(self):
+        state = dict(self.BASE)
+        state[(HERO, 0)] = (11, 20, 1.5, 0.0, 0, 1)  # изменился
+        del state[(PLAYER, 2)]  # ушел из вида
+        del state[(MONSTER, 5)]
+        state[(PLAYER, 3)] = (1, 2, 4)  # появился
+        data = netgame.encode_snapshot(7, 5, 42, state, self.BASE)
+        self.assertEqual(netgame.decode_snapshot(data, {5: self.BASE}),
+                         (7, 42, state))
+        # неизменившиеся записи в пакет не попадают
+        full = netgame.encode_snapshot(7, 0, 42, state, {})
+        self.assertTrue(len(data) < len(full))
+
+    def test_full_snapshot(self):
+        data = netgame.encode_snapshot(3, 0, 0, self.BASE, {})
+        self.assertEqual(netgame.decode_snapshot(data, {}),
+                         (3, 0, self.BASE))
+
+    def test_unknown_base(self):
+        # базовый снимок клиент уже забыл - ждет полного
+        data = netgame.encode_snapshot(9, 5, 0, self.BASE, self.BASE)
+        self.assertEqual(netgame.decode_snapshot(data, {4: {}}), None)
+
+
+class LoopbackTest(unittest.TestCase):
+
+    def test_bots(self):
+        clients = 4
+        server, bots = netgame.run_bots('levels/map_1', clients, 120)
+        try:
+            self.assertEqual(len(server.connections), clients)
+            # каждому клиенту полный снимок только после подключения,
+            # дальше дельты, а предсказание совпадает с сервером
+            self.assertEqual(server.full_snapshots, clients)
+            for bot in bots:
+                self.assertEqual(bot.corrections, 0)
+                self.assertNotEqual(bot.world, None)
+        finally:
+            for bot in bots:
+                bot.close()
+            server.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+import json
+import shutil
+import tempfile
+import unittest
+
+import profiler
+
+
+class Clock(object):
+    # вместо таймера: время идет только в tick()
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def tick(self, seconds):
+        self.now += seconds
+
+
+class ClockTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self._timer = profiler.default_timer
+        profiler.default_timer = self.clock
+
+    def tearDown(self):
+        profiler.default_timer = self._timer
+
+    def frame(self, frame_profiler, *phases):
+        # кадр из этапов (название, секунды)
+        frame_profiler.begin_frame()
+        for phase, seconds in phases:
+            self.clock.tick(seconds)
+            frame_profiler.mark(phase)
+        frame_profiler.end_frame()
+
+
+class FrameProfilerTest(ClockTestCase):
+
+    def setUp(self):
+        ClockTestCase.setUp(self)
+        self.frame_profiler = profiler.FrameProfiler(history=4)
+
+    def assertStats(self, stats, expected):
+        for value, seconds in zip(stats, expected):
+            self.assertAlmostEqual(value, seconds)
+
+    def test_before_history_is_full(self):
+        self.assertStats(self.frame_profiler.frame_stats(), (0, 0, 0))
+        self.frame(self.frame_profiler, ('events', 0.01),
+                   ('world.step', 0.02))
+        self.frame(self.frame_profiler, ('events', 0.03),
+                   ('world.step', 0.04))
+        # пустые места кольца не занижают среднее
+        self.assertStats(self.frame_profiler.stats('events'),
+                         (0.02, 0.01, 0.03))
+        self.assertStats(self.frame_profiler.frame_stats(),
+                         (0.05, 0.03, 0.07))
+        self.assertAlmostEqual(self.frame_profiler.last_frame(), 0.07)
+        self.assertEqual(self.frame_profiler.phases,
+                         ['events', 'world.step'])
+        self.assertStats(self.frame_profiler.stats('draw'), (0, 0, 0))
+
+    def test_ring(self):
+        for frame in range(6):
+            self.frame(self.frame_profiler,
+                       ('world.step', 0.01 * (frame + 1)))
+        # остались последние history кадров: 0.03 .. 0.06
+        self.assertEqual(self.frame_profiler.count, 6)
+        self.assertStats(self.frame_profiler.stats('world.step'),
+                         (0.045, 0.05, 0.06))
+        self.assertAlmostEqual(self.frame_profiler.last_frame(), 0.06)
+        frames = self.frame_profiler.frames(10)
+        self.assertEqual([frame[0] for frame in frames], [2, 3, 4, 5])
+        number, start, end, spans = frames[-1]
+        self.assertAlmostEqual(end - start, 0.06)
+        self.assertEqual([span[0] for span in spans], ['world.step'])
+        self.assertEqual([frame[0] for frame in
+                          self.frame_profiler.frames(2)], [4, 5])
+
+    def test_phases(self):
+        # этап, отмеченный дважды, складывается
+        self.frame(self.frame_profiler, ('events', 0.01),
+                   ('world.step', 0.02), ('events', 0.01))
+        # не отмеченный в кадре этап считается нулем
+        self.frame(self.frame_profiler, ('events', 0.04))
+        self.assertStats(self.frame_profiler.stats('events'),
+                         (0.03, 0.02, 0.04))
+        self.assertStats(self.frame_profiler.stats('world.step'),
+                         (0.01, 0.0, 0.02))
+        spans = self.frame_profiler.frames(2)[0][3]
+        self.assertEqual([span[0] for span in spans],
+                         ['events', 'world.step', 'events'])
+
+
+class StutterDetectorTest(ClockTestCase):
+
+    def setUp(self):
+        ClockTestCase.setUp(self)
+        self.trace_dir = tempfile.mkdtemp()
+        self.frame_profiler = profiler.FrameProfiler(history=10)
+        self.stutter = profiler.StutterDetector(
+            self.frame_profiler, threshold=0.05, before=3, after=2,
+            trace_dir=self.trace_dir,
+            annotate=lambda: {'level': 1, 'player': [10, 20]})
+
+    def tearDown(self):
+        shutil.rmtree(self.trace_dir)
+        ClockTestCase.tearDown(self)
+
+    def step(self, seconds):
+        self.frame(self.frame_profiler, ('events', 0.001),
+                   ('world.step', seconds))
+        return self.stutter.check()
+
+    def load(self, file_name):
+        trace_file = open(file_name)
+        try:
+            return json.load(trace_file)
+        finally:
+            trace_file.close()
+
+    def test_slow_frame(self):
+        for frame in range(6):
+            self.assertEqual(self.step(0.01), None)
+        self.assertEqual(self.step(0.2), None)  # кадр 6
+        self.assertEqual(self.step(0.01), None)
+        file_name = self.step(0.01)  # after кадров прошло
+        self.assertEqual(self.stutter.traces, [file_name])
+
+        events = self.load(file_name)['traceEvents']
+        frames = [e for e in events if e.get('cat') == 'frame']
+        # before кадров до рывка, он сам и after после
+        self.assertEqual([e['args']['frame'] for e in frames],
+                         [3, 4, 5, 6, 7, 8])
+        slow = frames[3]
+        self.assertEqual(slow['args']['ms'], 201.0)
+        self.assertEqual(slow['args']['level'], 1)
+        self.assertEqual(slow['args']['player'], [10, 20])
+        self.assertEqual(slow['dur'], 201000)
+        self.assertFalse('level' in frames[2]['args'])
+        stutters = [e for e in events if e.get('cat') == 'stutter']
+        self.assertEqual([e['args']['frame'] for e in stutters], [6])
+        phases = [e['name'] for e in events if e.get('cat') == 'phase']
+        self.assertEqual(phases, ['events', 'world.step'] * 6)
+
+        self.assertEqual(self.stutter.flush(), None)  # уже записан
+
+    def test_flush(self):
+        for frame in range(4):
+            self.step(0.01)
+        self.assertEqual(self.step(0.1), None)
+        # уровень кончился раньше, чем прошло after кадров
+        file_name = self.stutter.flush()
+        self.assertEqual(self.stutter.traces, [file_name])
+        events = self.load(file_name)['traceEvents']
+        self.assertEqual([e['args']['frame'] for e in events
+                          if e.get('cat') == 'stutter'], [4])
+        self.assertEqual(self.stutter.flush(), None)
+
+    def test_window_must_fit(self):
+        self.assertRaises(ValueError, profiler.StutterDetector,
+                          self.frame_profiler, before=8, after=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import pygame
+
+import pyganim
+
+START = 1000.0  # play() и pause() получают время явно, часы не нужны
+# длина 0.354 с не делится на слот 1/COMPILE_RATE: последний слот неполный
+DURATIONS = (0.2, 0.154)
+
+
+def animation(loop, compiled):
+    frames = [(pygame.Surface((2, 2)), duration) for duration in DURATIONS]
+    anim = pyganim.PygAnimation(frames, loop=loop)
+    if compiled:
+        anim.compile()
+    return anim
+
+
+def frame_at(anim, elapsed):
+    # номер кадра, который blit нарисует через elapsed секунд после play()
+    anim.stop()
+    anim.play(START)
+    anim.pause(START + elapsed)
+    anim.blit(pygame.Surface((2, 2)), (0, 0))
+    return anim.lastFrameNum
+
+
+def near_boundary(elapsed, loop):
+    # в слоте, где меняется кадр, таблица может ошибиться на слот
+    total = sum(DURATIONS)
+    if loop:
+        elapsed %= total
+    return any(abs(elapsed - start) < 1.0 / pyganim.COMPILE_RATE
+               for start in (0, DURATIONS[0], total))
+
+
+class CompiledAnimationTest(unittest.TestCase):
+
+    def test_table_covers_partial_last_slot(self):
+        anim = animation(False, True)
+        self.assertEqual(len(anim._frameTable), 36)
+        self.assertEqual(anim._frameTable[-1], 1)
+
+    def test_not_looped_end_of_animation(self):
+        # последний, неполный слот раньше выходил за таблицу
+        self.assertEqual(frame_at(animation(False, True), 0.3539), 1)
+        self.assertEqual(frame_at(animation(False, True), 0.354), None)
+        self.assertEqual(animation(False, True).frameNumAtTick(35.9), 1)
+        self.assertEqual(animation(False, True).frameNumAtTick(10 ** 6), 1)
+
+    def test_looped_does_not_drift(self):
+        anim = animation(True, True)
+        total = sum(DURATIONS)
+        for passes in (1, 10, 1000):
+            self.assertEqual(frame_at(anim, passes * total + 0.1), 0)
+            self.assertEqual(frame_at(anim, passes * total + 0.3), 1)
+        # 354 слота - ровно 10 проходов
+        self.assertEqual(anim.frameNumAtTick(354 + 5), 0)
+        self.assertEqual(anim.frameNumAtTick(354 + 25), 1)
+
+    def test_same_frames_as_not_compiled(self):
+        for loop in (False, True):
+            plain = animation(loop, False)
+            compiled = animation(loop, True)
+            for step in range(2000):
+                elapsed = step * 0.00137
+                if near_boundary(elapsed, loop):
+                    continue
+                self.assertEqual(frame_at(compiled, elapsed),
+                                 frame_at(plain, elapsed),
+                                 'loop=%s elapsed=%s' % (loop, elapsed))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+import unittest
+
+import replay
+import simulation
+
+# отдельный процесс без SDL_VIDEODRIVER и DISPLAY: любая попытка открыть
+# дисплей там упадет
+HEADLESS = '''
+import sys
+sys.path.insert(0, sys.argv[1])  # абсолютный путь, см. blocks.ICON_DIR
+import pygame
+import simulation
+world = simulation.World(simulation.load_level('levels/map_1'))
+hero = world.spawn_hero()
+x = hero.rect.x
+for tick in range(120):
+    world.step(False, True, False, False)
+print bool(pygame.display.get_init()), hero.rect.x > x, world.monster_tick
+'''
+
+
+def run(ticks, keys):
+    world = simulation.World(simulation.load_level('levels/map_1'))
+    world.spawn_hero()
+    for tick in range(ticks):
+        world.step(*keys(tick))
+    return replay.state(world, ticks)
+
+
+class WorldTest(unittest.TestCase):
+
+    def test_headless(self):
+        env = dict((key, value) for key, value in os.environ.items()
+                   if key not in ('SDL_VIDEODRIVER', 'DISPLAY'))
+        process = subprocess.Popen([sys.executable, '-c', HEADLESS,
+                                    simulation.GAME_DIR],
+                                   cwd=simulation.GAME_DIR, env=env,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        out, err = process.communicate()
+        self.assertEqual(process.returncode, 0, err)
+        self.assertEqual(out.split()[-3:], ['False', 'True', '120'])
+
+    def test_deterministic(self):
+        def keys(tick):  # бежим вправо и прыгаем
+            return False, True, tick % 40 < 10, tick > 60
+        first = run(300, keys)
+        self.assertEqual(run(300, keys), first)
+        self.assertNotEqual(run(300, lambda tick: (False,) * 4), first)
+
+    def test_infinite_maps_need_a_camera(self):
+        self.assertRaises(ValueError, simulation.load_level,
+                          'levels/infinite')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from pygame import Rect
+
+import statestream
+
+
+class Body(object):
+
+    def __init__(self, x, y, pose=0):
+        self.rect = Rect(x, y, 32, 32)
+        self.pose = pose
+
+
+class FakeWorld(object):
+    # то, что читает tick_values: герой и монстры с rect
+
+    def __init__(self, monsters):
+        self.hero = Body(0, 0)
+        self.monsters = [Body(0, 0) for i in range(monsters)]
+
+    def move(self, rnd):
+        for body in [self.hero] + self.monsters:
+            body.rect.x += rnd.randrange(-40, 40)
+            body.rect.y += rnd.choice((0, 0, 1, -7, 10 ** 6))
+        self.hero.pose = rnd.randrange(0, 16)
+
+
+class ChunkTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        rnd = random.Random(1)
+        ticks = [[rnd.randrange(-2 ** 40, 2 ** 40) for i in range(5)]
+                 for tick in range(300)]
+        data = statestream.encode_chunk(ticks)
+        self.assertEqual(statestream.decode_chunk(data, len(ticks), 5), ticks)
+
+
+class StreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'run.smbs')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def record(self, levels):
+        # пишет уровни [(имя, монстров, кадров)] -> ожидаемые кадры
+        rnd = random.Random(2)
+        recorder = statestream.StateRecorder(self.file_name, chunk_ticks=64)
+        expected = []
+        for name, monsters, ticks in levels:
+            world = FakeWorld(monsters)
+            recorder.start_level(name, world)
+            expected.append([])
+            for tick in range(ticks):
+                world.move(rnd)
+                recorder.record(world)
+                expected[-1].append(statestream.tick_values(world))
+        recorder.close()
+        return expected
+
+    def test_round_trip(self):
+        expected = self.record([(u'levels/map_1', 3, 200),
+                                (u'уровень', 0, 64), (u'levels/map_3', 1, 1)])
+        stream = statestream.StateStream(self.file_name)
+        try:
+            self.assertEqual([(level.name, level.monsters, level.ticks)
+                              for level in stream.levels],
+                             [(u'levels/map_1', 3, 200), (u'уровень', 0, 64),
+                              (u'levels/map_3', 1, 1)])
+            # вперед, назад и вразброс
+            for index, ticks in enumerate(expected):
+                order = range(len(ticks))
+                order = order + order[::-1] + random.Random(3).sample(
+                    order, len(order))
+                for tick in order:
+                    self.assertEqual(stream.state(index, tick), ticks[tick])
+            self.assertRaises(IndexError, stream.state, 0, 200)
+        finally:
+            stream.close()
+
+    def test_truncated_file(self):
+        expected = self.record([(u'levels/map_1', 2, 200)])
+        size = os.path.getsize(self.file_name)
+        with open(self.file_name, 'r+b') as f:
+            f.truncate(size - 5)  # игру убили посреди записи куска
+        stream = statestream.StateStream(self.file_name)
+        try:
+            level = stream.levels[0]
+            self.assertEqual(level.ticks, 192)  # три целых куска по 64
+            self.assertEqual(stream.state(0, 191), expected[0][191])
+        finally:
+            stream.close()
+
+    def test_not_a_stream(self):
+        with open(self.file_name, 'wb') as f:
+            f.write('JUNK')
+        self.assertRaises(ValueError, statestream.StateStream, self.file_name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from pygame import Rect
+
+import helperspygame
+import simulation
+import streaming
+from camera import Camera, camera_configure, WIN_WIDTH, WIN_HEIGHT
+
+LEVEL = 'levels/infinite'  # 64 x 32 тайла, чанки 16 x 16 от (-32, -16)
+LEFT_VIEW = Rect(-1024, -512, 32, 32)  # угол в чанке (-32, -16)
+RIGHT_VIEW = Rect(1000, 0, 32, 32)  # в чанке (16, 0)
+
+
+def load():
+    return simulation.load_map(simulation.level_file(LEVEL))
+
+
+class TileChunkTest(unittest.TestCase):
+
+    def test_decode_on_demand(self):
+        world_map = load()
+        self.assertTrue(world_map.infinite)
+        # base64 + zlib
+        platforms = world_map.layers[simulation.PLATFORMS_LAYER]
+        self.assertEqual(platforms.chunk_bounds, (-32, -16, 32, 16))
+        self.assertEqual(len(platforms.chunks), 8)
+        chunk = platforms.chunks[(-32, 0)]
+        self.assertTrue(chunk.decoded_content is None)
+        self.assertTrue(platforms.get_chunk((-32, 0)) is chunk)
+        self.assertEqual(len(chunk.decoded_content), 16 * 16)
+        # стена в левом столбце и пол в нижней строке
+        self.assertEqual(chunk.decoded_content[0], 8)
+        self.assertEqual(chunk.decoded_content[1], 0)
+        self.assertEqual(list(chunk.decoded_content[-16:]), [8] * 16)
+        platforms.release_chunk((-32, 0))
+        self.assertTrue(chunk.decoded_content is None)
+        self.assertTrue(platforms.get_chunk((0, 0)).decoded_content)
+        self.assertTrue(platforms.get_chunk((100, 100)) is None)
+
+        # csv
+        die = world_map.layers[simulation.DIE_BLOCKS_LAYER]
+        content = die.get_chunk((16, 0)).decoded_content
+        self.assertEqual([i for i, gid in enumerate(content) if gid],
+                         [14 * 16 + 4, 14 * 16 + 5, 14 * 16 + 6])
+
+
+class StreamingTest(unittest.TestCase):
+
+    def setUp(self):
+        resources = helperspygame.ResourceLoaderPygame()
+        resources.load(load())
+        self.layers = helperspygame.get_layers_from_map(resources)
+        self.world = simulation.World(resources.world_map)
+        self.platforms_layer = self.layers[simulation.PLATFORMS_LAYER]
+        self.streaming = streaming.StreamingWorld(
+            self.layers, self.platforms_layer,
+            self.layers[simulation.DIE_BLOCKS_LAYER], self.world.platforms)
+        self.streaming.adopt(self.world.objects)
+
+    def alive(self):
+        # (x, жив ли) для объектов с объектных слоев
+        return sorted((obj.rect.x, obj.alive())
+                      for obj, groups, is_platform in self.streaming.objects)
+
+    def test_level_rect(self):
+        self.assertEqual(self.streaming.level_rect,
+                         Rect(-1024, -512, 2048, 1024))
+
+    def test_update_window(self):
+        layer = self.platforms_layer
+        loaded, evicted = layer.update_window(LEFT_VIEW)
+        self.assertEqual(sorted(loaded), [(-32, -16), (-32, 0),
+                                          (-16, -16), (-16, 0)])
+        self.assertEqual(evicted, [])
+        # окно шире уровня: слева и сверху чанков нет
+        self.assertEqual((layer.origin_x, layer.origin_y), (-48, -32))
+        self.assertEqual(layer.update_window(LEFT_VIEW), ([], []))
+
+        loaded, evicted = layer.update_window(RIGHT_VIEW)
+        self.assertEqual(sorted(loaded), [(0, -16), (0, 0),
+                                          (16, -16), (16, 0)])
+        self.assertEqual(sorted(evicted), [(-32, -16), (-32, 0),
+                                           (-16, -16), (-16, 0)])
+        self.assertEqual(sorted(layer.resident), sorted(loaded))
+        self.assertEqual((layer.origin_x, layer.origin_y), (0, -16))
+        # выгруженные чанки отпускают и свои тайлы
+        self.assertTrue(
+            layer._layer.chunks[(-32, 0)].decoded_content is None)
+
+    def test_update_bodies_and_objects(self):
+        platforms = self.world.platforms
+        self.assertTrue(self.streaming.update(LEFT_VIEW))
+        left_bodies = [body for bodies in self.streaming.bodies.values()
+                       for body in bodies]
+        self.assertTrue(left_bodies)
+        for body in left_bodies:
+            self.assertTrue(body in platforms)
+            self.assertTrue(body.rect.right <= 0)
+        self.assertEqual(self.alive(), [(-320, True), (-160, True),
+                                        (512, False), (896, False)])
+        # в platforms только живые объекты и тела подгруженных чанков
+        self.assertEqual(len(platforms), len(left_bodies) + 2)
+
+        self.assertFalse(self.streaming.update(LEFT_VIEW))  # окно то же
+
+        self.assertTrue(self.streaming.update(RIGHT_VIEW))
+        for body in left_bodies:
+            self.assertFalse(body in platforms)
+        right_bodies = [body for bodies in self.streaming.bodies.values()
+                        for body in bodies]
+        self.assertTrue(right_bodies)
+        for body in right_bodies:
+            self.assertTrue(body.rect.left >= 0)
+        # шипы из правого чанка тоже здесь
+        self.assertTrue([body for body in right_bodies
+                         if type(body).__name__ == 'BlockDie'])
+        self.assertEqual(self.alive(), [(-320, False), (-160, False),
+                                        (512, True), (896, True)])
+        self.assertEqual(len(platforms), len(right_bodies) + 2)
+
+
+class CameraTest(unittest.TestCase):
+
+    class Target(object):
+        def __init__(self, x, y):
+            self.rect = Rect(x, y, 22, 32)
+
+    def test_negative_origin(self):
+        camera = Camera(camera_configure, 2048, 1024, -1024, -512)
+        # у левого верхнего угла уровня камера упирается в его начало
+        camera.update(self.Target(-1000, -500))
+        self.assertEqual(camera.reverse((0, 0)), (-1024, -512))
+        # в середине отрицательной части - герой в центре экрана
+        camera.update(self.Target(-600, -100))
+        self.assertEqual(camera.reverse((WIN_WIDTH / 2, WIN_HEIGHT / 2)),
+                         (-600, -100))
+        # у правого нижнего угла
+        camera.update(self.Target(1000, 500))
+        self.assertEqual(camera.reverse((WIN_WIDTH, WIN_HEIGHT)),
+                         (1024, 512))
+
+    def test_default_origin(self):
+        camera = Camera(camera_configure, 2048, 1024)
+        camera.update(self.Target(-600, -100))
+        self.assertEqual(camera.reverse((0, 0)), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
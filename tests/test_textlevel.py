@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import simulation
+import textlevel
+import tmxreader
+from textlevel import TILE_SIZE, CHUNK_SIZE, PLATFORM_GID, DIE_GID
+
+LEVEL = simulation.level_file('levels/1.txt')
+
+
+def objects(world_map, layer):
+    # [(имя, gid, x, y, свойства)] объектного слоя по порядку
+    group, = [l for l in world_map.layers if l.name == layer]
+    return [(obj.name, int(obj.gid), obj.x, obj.y, obj.properties)
+            for obj in group.objects]
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_parse(self):
+        world_map = textlevel.parse(LEVEL)
+        self.assertFalse(world_map.infinite)
+        self.assertEqual((world_map.width, world_map.height), (34, 27))
+        self.assertEqual([layer.name for layer in world_map.layers],
+                         [u'BackGround', u'Platforms', u'DieBlocks',
+                          u'Monsters', u'Teleports'])
+        self.assertEqual(world_map.map_file_name, LEVEL)
+        monsters = objects(world_map, u'Monsters')
+        # y у объектов-тайлов - нижний край
+        self.assertEqual(monsters[0], (u'Princess', textlevel.PRINCESS_GID,
+                                       26 * TILE_SIZE, 3 * TILE_SIZE, {}))
+        self.assertEqual(monsters[1], (u'Player', textlevel.PLAYER_GID,
+                                       55, 44 + TILE_SIZE, {}))
+        self.assertEqual(len(monsters), 5)
+        self.assertEqual(monsters[2][4], {u'left': u'2', u'up': u'1',
+                                          u'maxLeft': u'150',
+                                          u'maxUp': u'10'})
+        # цель телепорта в тайлах
+        teleports = objects(world_map, u'Teleports')
+        self.assertEqual(teleports[0], (None, textlevel.TELEPORT_GID,
+                                        128, 512 + TILE_SIZE,
+                                        {u'goX': u'28', u'goY': u'1'}))
+        self.assertEqual(len(teleports), 2)
+
+        die = world_map.named_layers[u'DieBlocks']
+        self.assertEqual(sum(1 for gid in die.decoded_content if gid), 17)
+        self.assertEqual(die.content2D[16][1], DIE_GID)  # столбец, строка
+        platforms = world_map.named_layers[u'Platforms']
+        self.assertEqual(list(platforms.content2D[0]), [PLATFORM_GID] * 27)
+        self.assertFalse(any(world_map.named_layers[
+            u'BackGround'].decoded_content))
+
+    def test_bad_command(self):
+        directory = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(directory, 'bad.txt')
+            level_file = open(file_name, 'w')
+            level_file.write('[\n--|\n]\nplayer 1 2\nboss 3 4\n/\n')
+            level_file.close()
+            self.assertRaises(ValueError, textlevel.parse, file_name)
+        finally:
+            shutil.rmtree(directory)
+
+
+class MakeMapTest(unittest.TestCase):
+
+    def test_cells_to_gids(self):
+        world_map = textlevel.make_map('-* P'
+                                       '*- x', 4, 2)
+        layers = world_map.named_layers
+        self.assertEqual(list(layers[u'Platforms'].decoded_content),
+                         [PLATFORM_GID, 0, 0, 0, 0, PLATFORM_GID, 0, 0])
+        self.assertEqual(list(layers[u'DieBlocks'].decoded_content),
+                         [0, DIE_GID, 0, 0, DIE_GID, 0, 0, 0])
+        # content2D - столбцы
+        self.assertEqual(list(layers[u'DieBlocks'].content2D[0]),
+                         [0, DIE_GID])
+        self.assertEqual(objects(world_map, u'Monsters'),
+                         [(u'Princess', textlevel.PRINCESS_GID,
+                           3 * TILE_SIZE, TILE_SIZE, {})])
+
+    def test_chunked(self):
+        # 40 x 20 клеток: чанки по 16, пустые пропускаются
+        width, height = 40, 20
+        cells = [' '] * (width * height)
+        cells[0] = '-'
+        cells[39 + 19 * width] = '-'  # правый нижний угол
+        cells[17 + 2 * width] = '*'
+        world_map = textlevel.make_map(''.join(cells), width, height,
+                                       chunked=True)
+        self.assertTrue(world_map.infinite)
+        platforms = world_map.named_layers[u'Platforms']
+        self.assertEqual(sorted(platforms.chunks), [(0, 0), (32, 16)])
+        self.assertEqual(platforms.chunk_bounds, (0, 0, width, height))
+        chunk = platforms.get_chunk((32, 16))
+        self.assertEqual(len(chunk.decoded_content),
+                         CHUNK_SIZE * CHUNK_SIZE)
+        self.assertEqual([idx for idx, gid in
+                          enumerate(chunk.decoded_content) if gid],
+                         [7 + 3 * CHUNK_SIZE])
+        platforms.release_chunk((32, 16))
+        self.assertTrue(chunk.decoded_content is None)
+        die = world_map.named_layers[u'DieBlocks']
+        self.assertEqual(sorted(die.chunks), [(16, 0)])
+        self.assertEqual(die.get_chunk((16, 0)).decoded_content[
+            1 + 2 * CHUNK_SIZE], DIE_GID)
+        # пустой слой - один пустой чанк
+        background = world_map.named_layers[u'BackGround']
+        self.assertEqual(list(background.chunks), [(0, 0)])
+        self.assertFalse(any(background.get_chunk((0, 0)).decoded_content))
+
+    def test_large_levels_are_chunked(self):
+        size = textlevel.CHUNKED_CELLS
+        self.assertFalse(textlevel.make_map(' ' * size, size, 1).infinite)
+        self.assertTrue(textlevel.make_map(' ' * (size + 1), size + 1,
+                                           1).infinite)
+        self.assertFalse(textlevel.make_map(' ' * (size + 1), size + 1, 1,
+                                            chunked=False).infinite)
+
+
+class WriteTmxTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def round_trip(self, world_map):
+        file_name = os.path.join(self.directory, 'map.tmx')
+        textlevel.write_tmx(world_map, file_name)
+        return tmxreader.TileMapParser().parse_decode(file_name)
+
+    def test_round_trip(self):
+        world_map = textlevel.parse(LEVEL)
+        tmx_map = self.round_trip(world_map)
+        self.assertFalse(tmx_map.infinite)
+        self.assertEqual((tmx_map.width, tmx_map.height), (34, 27))
+        for name in (u'BackGround', u'Platforms', u'DieBlocks'):
+            self.assertEqual(tmx_map.named_layers[name].decoded_content,
+                             world_map.named_layers[name].decoded_content)
+        for name in (u'Monsters', u'Teleports'):
+            self.assertEqual(objects(tmx_map, name),
+                             objects(world_map, name))
+        # размер картинки тайлсета берется из самой картинки
+        image = tmx_map.tile_sets[0].images[0]
+        self.assertEqual(os.path.realpath(image.source), os.path.realpath(
+            os.path.join(os.path.dirname(LEVEL), textlevel.TILESET_IMAGE)))
+        self.assertEqual((int(image.width), int(image.height)), (417, 288))
+
+    def test_chunked_round_trip(self):
+        world_map = textlevel.parse(LEVEL, chunked=True)
+        tmx_map = self.round_trip(world_map)
+        self.assertTrue(tmx_map.infinite)
+        for name in (u'Platforms', u'DieBlocks'):
+            chunks = world_map.named_layers[name].chunks
+            layer = tmx_map.named_layers[name]
+            self.assertEqual(sorted(layer.chunks), sorted(chunks))
+            for key in chunks:
+                self.assertEqual(
+                    layer.get_chunk(key).decoded_content,
+                    world_map.named_layers[name].get_chunk(
+                        key).decoded_content)
+
+
+if __name__ == '__main__':
+    unittest.main()
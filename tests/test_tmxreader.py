@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import tmxreader
+from tmxreader import ObjectTableError
+
+SCHEMA = {
+    u'Player': (),
+    None: ((u'left', 'i'), (u'speed', 'f')),
+}
+
+
+def group(*objects):
+    # объектный слой из (имя, x, y, {свойство: строка})
+    layer = tmxreader.MapObjectGroupLayer()
+    layer.name = u'Monsters'
+    for name, x, y, properties in objects:
+        map_obj = tmxreader.MapObject()
+        map_obj.name = name
+        map_obj.x = x
+        map_obj.y = y
+        map_obj.properties = properties
+        layer.objects.append(map_obj)
+    return layer
+
+
+class ObjectTableTest(unittest.TestCase):
+
+    def test_records(self):
+        table = group((None, 10, 20, {u'left': u'2', u'speed': u'1.5'}),
+                      (u'Player', 30, 40, {}),
+                      (u'Ghost', 50, 60, {u'left': u'-3', u'speed': u'0',
+                                          u'extra': u'x'})).compile(SCHEMA)
+        self.assertEqual(len(table), 3)
+        self.assertEqual(table.records(u'Player'), [(30, 40)])
+        # неизвестные схеме имена попадают в None
+        self.assertEqual(table.records(None, u'left', u'speed'),
+                         [(10, 20, 2, 1.5), (50, 60, -3, 0.0)])
+        self.assertEqual(table.params[u'left'].typecode, 'i')
+        self.assertEqual(table.params[u'speed'].typecode, 'f')
+        # у игрока свойств нет, в колонках нули
+        self.assertEqual(list(table.params[u'left']), [2, 0, -3])
+
+    def test_empty(self):
+        table = group().compile(SCHEMA)
+        self.assertEqual(len(table), 0)
+        self.assertEqual(table.records(None, u'left'), [])
+
+    def test_all_errors_at_once(self):
+        layer = group((None, 1, 2, {u'speed': u'1'}),
+                      (None, 3, 4, {u'left': u'two', u'speed': u'1'}),
+                      (None, 5, 6, {u'left': u'1', u'speed': u'fast'}))
+        try:
+            layer.compile(SCHEMA)
+        except ObjectTableError as e:
+            message = unicode(e)
+        else:
+            self.fail('no ObjectTableError')
+        self.assertTrue(message.startswith(u'Monsters:'))
+        self.assertIn(u'object 0 (None at 1, 2): property left is missing',
+                      message)
+        self.assertIn(u'object 1 (None at 3, 4): property left=two is not '
+                      u'of type i', message)
+        self.assertIn(u'object 2 (None at 5, 6): property speed=fast is not '
+                      u'of type f', message)
+
+    def test_value_out_of_range(self):
+        layer = group((None, 0, 0, {u'left': u'300'}))
+        self.assertRaises(ObjectTableError, layer.compile,
+                          {None: ((u'left', 'B'),)})
+
+    def test_unknown_kind(self):
+        layer = group((u'Player', 0, 0, {}), (u'Ghost', 7, 8, {}))
+        with self.assertRaises(ObjectTableError) as context:
+            layer.compile({u'Player': ()})
+        self.assertIn(u'object 1 (Ghost at 7, 8): unknown kind',
+                      unicode(context.exception))
+
+    def test_property_with_two_types(self):
+        schema = {u'Player': ((u'left', 'i'),), None: ((u'left', 'f'),)}
+        self.assertRaises(ObjectTableError, group().compile, schema)
+
+
+if __name__ == '__main__':
+    unittest.main()
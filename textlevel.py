@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Загрузчик старого текстового формата уровней (levels/1.txt):
+#
+#   [
+#   ----------|      <- строка уровня, '|' - ее конец
+#   -  *   P  |      <- '-' платформа, '*' смертельный блок, 'P' принцесса
+#   ]
+#   player x y
+#   portal x y goX goY
+#   monster x y left up maxLeft maxUp
+#   /
+#
+# Координаты в пикселях. Уровень сразу превращается в tmxreader.TileMap с
+# теми же слоями, что и у tmx карт (BackGround, Platforms, DieBlocks,
+# Monsters, Teleports), так что дальше он грузится как обычная карта.
+# Клетки не перебираются по одной: слои строятся через str.translate и
+# срезы bytearray, поэтому уровни в миллионы клеток читаются быстро.
+# Уровни больше CHUNKED_CELLS клеток делятся на чанки, как бесконечные
+# карты Tiled: спрайты и тела для столкновений создаются только для
+# чанков вокруг камеры (streaming.py), иначе на таком уровне их сборка
+# заняла бы десятки секунд.
+#
+# Конвертер в tmx: python textlevel.py levels/1.txt levels/map_0.tmx
+
+import os
+import re
+import sys
+import array
+import base64
+import zlib
+from xml.sax.saxutils import quoteattr
+
+import tmxreader
+
+TILE_SIZE = 32
+TILESET_IMAGE = 'tiles.png'  # лежит рядом с уровнями
+CHUNK_SIZE = 16  # сторона чанка в тайлах, как в Tiled
+CHUNKED_CELLS = 100000  # уровни больше этого делятся на чанки
+
+# номера тайлов в tiles.png, как на картах map_*.tmx
+PLATFORM_GID = 8
+DIE_GID = 47
+TELEPORT_GID = 49
+PRINCESS_GID = 97
+PLAYER_GID = 98
+MONSTER_GID = 99
+
+PLATFORM_CHAR = '-'
+DIE_CHAR = '*'
+PRINCESS_CHAR = 'P'
+
+
+def _table(char, gid):
+    # таблица для str.translate: нужный символ -> номер тайла, остальное -> 0
+    table = ['\0'] * 256
+    table[ord(char)] = chr(gid)
+    return ''.join(table)
+
+_PLATFORMS_TABLE = _table(PLATFORM_CHAR, PLATFORM_GID)
+_DIE_TABLE = _table(DIE_CHAR, DIE_GID)
+
+
+def _gids(cells, table):
+    # строка клеток -> array('I') номеров тайлов, без цикла по клеткам
+    # (номера тайлов меньше 256, поэтому хватает одного байта из четырех)
+    raw = bytearray(4 * len(cells))
+    if sys.byteorder == 'little':
+        raw[0::4] = cells.translate(table)
+    else:
+        raw[3::4] = cells.translate(table)
+    gids = array.array('I')
+    gids.fromstring(str(raw))
+    return gids
+
+
+class _TextChunk(tmxreader.TileChunk):
+    # чанк текстового уровня: encoded_content - его клетки по строкам,
+    # номера тайлов считаются, только когда чанк подгружают
+
+    def __init__(self, x, y, cells, table):
+        tmxreader.TileChunk.__init__(self)
+        self.x = x
+        self.y = y
+        self.width = self.height = CHUNK_SIZE
+        self.encoded_content = cells
+        self.table = table
+
+    def decode(self, encoding, compression):
+        self.decoded_content = _gids(self.encoded_content, self.table)
+
+
+def _chunks(cells, width, height, char, table):
+    # строка клеток -> {(x, y): _TextChunk} по CHUNK_SIZE x CHUNK_SIZE
+    # тайлов, чанки без char пропускаются, как пустые чанки у Tiled.
+    # Крайние чанки дополняются пустыми клетками.
+    size = CHUNK_SIZE
+    across = -(-width // size)  # чанков в ширину
+    pieces_of = re.compile('.{%d}' % size, re.S).findall
+    chunks = {}
+    for y in xrange(0, height, size):
+        band = ''.join([cells[pos:pos + width].ljust(across * size) for pos in
+                        xrange(y * width, min(y + size, height) * width,
+                               width)])
+        if char not in band:
+            continue
+        # куски строк по size клеток, i-й чанк - каждый across-й кусок
+        pieces = pieces_of(band)
+        for idx in xrange(across):
+            part = ''.join(pieces[idx::across])
+            if char in part:
+                chunks[(idx * size, y)] = _TextChunk(
+                    idx * size, y, part.ljust(size * size), table)
+    return chunks
+
+
+def _empty_chunks():
+    # у чанкового слоя должен быть хоть один чанк
+    return {(0, 0): _TextChunk(0, 0, ' ' * (CHUNK_SIZE * CHUNK_SIZE),
+                               _PLATFORMS_TABLE)}
+
+
+def _tile_layer(name, width, height, gids=None):
+    layer = tmxreader.TileLayer()
+    layer.name = name
+    layer.width = width
+    layer.height = height
+    layer.opacity = 1
+    layer.decoded_content = gids
+    return layer
+
+
+def _object(name, gid, x, y, properties=None):
+    # у tmx объектов-тайлов y - это нижний край
+    obj = tmxreader.MapObject()
+    obj.name = name
+    obj.gid = unicode(gid)
+    obj.x = x
+    obj.y = y + TILE_SIZE
+    if properties:
+        obj.properties.update(properties)
+    return obj
+
+
+def _object_group(name, width, height, objects):
+    group = tmxreader.MapObjectGroupLayer()
+    group.name = name
+    group.width = width
+    group.height = height
+    group.objects = objects
+    return group
+
+
+def parse(file_name, chunked=None):
+    # Читает текстовый уровень и возвращает tmxreader.TileMap, как
+    # TileMapParser().parse_decode() для tmx карт. chunked - как у make_map.
+    file_name = os.path.abspath(file_name)
+    text_file = open(file_name, 'rb')
+    try:
+        data = text_file.read()
+    finally:
+        text_file.close()
+
+    start = data.index('[')
+    end = data.index('\n]', start)
+    rows = [row.rstrip('\r').rstrip('|')
+            for row in data[start:end].split('\n')[1:]]
+    width = max(len(row) for row in rows)
+    height = len(rows)
+    cells = ''.join([row.ljust(width) for row in rows])
+
+    player = None
+    portals = []
+    monsters = []
+    for line_no, line in enumerate(data[end + 2:].splitlines()):
+        words = line.split()
+        if not words:
+            continue
+        if words[0] == '/':  # конец уровня
+            break
+        try:
+            args = tuple(int(word) for word in words[1:])
+            if words[0] == 'player':
+                x, y = args
+                player = args
+            elif words[0] == 'portal':
+                x, y, goX, goY = args
+                portals.append(args)
+            elif words[0] == 'monster':
+                x, y, left, up, maxLeft, maxUp = args
+                monsters.append(args)
+            else:
+                raise ValueError(u'unknown command %s' % words[0])
+        except ValueError as e:
+            raise ValueError(u'%s, line after ]: %d: %s (%s)' % (
+                file_name, line_no + 1, line.strip(), e))
+
+    world_map = make_map(cells, width, height, player, portals, monsters,
+                         os.path.join(os.path.dirname(file_name),
+                                      TILESET_IMAGE), chunked)
+    world_map.map_file_name = file_name
+    return world_map
+
+
+def make_map(cells, width, height, player=None, portals=(), monsters=(),
+             tileset_image=TILESET_IMAGE, chunked=None):
+    # Собирает tmxreader.TileMap из клеток и команд текстового формата:
+    # cells - строка из width * height символов по строкам, player - (x, y),
+    # portals - [(x, y, goX, goY)], monsters - [(x, y, left, up, maxLeft,
+    # maxUp)], координаты в пикселях. Им пользуются parse() и levelgen.
+    # chunked - сделать бесконечную (чанковую) карту, по умолчанию только
+    # для уровней больше CHUNKED_CELLS клеток.
+    if chunked is None:
+        chunked = width * height > CHUNKED_CELLS
+    objects = []
+    pos = cells.find(PRINCESS_CHAR)
+    while pos >= 0:
+        objects.append(_object(u'Princess', PRINCESS_GID,
+                               pos % width * TILE_SIZE,
+                               pos // width * TILE_SIZE))
+        pos = cells.find(PRINCESS_CHAR, pos + 1)
+    if player is not None:
+        objects.append(_object(u'Player', PLAYER_GID, *player))
+    for x, y, left, up, maxLeft, maxUp in monsters:
+        objects.append(_object(None, MONSTER_GID, x, y, {
+            u'left': unicode(left), u'up': unicode(up),
+            u'maxLeft': unicode(maxLeft), u'maxUp': unicode(maxUp)}))
+    # в tmx картах цель телепорта задается в тайлах
+    teleports = [_object(None, TELEPORT_GID, x, y, {
+        u'goX': unicode(goX // TILE_SIZE), u'goY': unicode(goY // TILE_SIZE)})
+        for x, y, goX, goY in portals]
+
+    world_map = tmxreader.TileMap()
+    world_map.version = u'1.0'
+    world_map.orientation = u'orthogonal'
+    world_map.width = width
+    world_map.height = height
+    world_map.tilewidth = TILE_SIZE
+    world_map.tileheight = TILE_SIZE
+    world_map.infinite = chunked
+
+    tile_set = tmxreader.TileSet()
+    tile_set.firstgid = 1
+    tile_set.name = u'tiles'
+    tile_set.tilewidth = TILE_SIZE
+    tile_set.tileheight = TILE_SIZE
+    image = tmxreader.TileImage()
+    image.source = tileset_image
+    tile_set.images.append(image)
+    world_map.tile_sets.append(tile_set)
+
+    if chunked:
+        # чанки добавляются после convert(): они уже готовы, а перебор
+        # десятков тысяч чанков там занял бы треть секунды
+        tile_layers = [_tile_layer(name, width, height)
+                       for name in (u'BackGround', u'Platforms',
+                                    u'DieBlocks')]
+    else:
+        tile_layers = [
+            _tile_layer(u'BackGround', width, height,
+                        array.array('I', [0]) * (width * height)),
+            _tile_layer(u'Platforms', width, height,
+                        _gids(cells, _PLATFORMS_TABLE)),
+            _tile_layer(u'DieBlocks', width, height,
+                        _gids(cells, _DIE_TABLE))]
+    world_map.layers = tile_layers + [
+        _object_group(u'Monsters', width, height, objects),
+        _object_group(u'Teleports', width, height, teleports)]
+    world_map.convert()
+    if chunked:
+        background, platforms, die_blocks = tile_layers
+        background.chunks = _empty_chunks()
+        platforms.chunks = _chunks(cells, width, height, PLATFORM_CHAR,
+                                   _PLATFORMS_TABLE) or _empty_chunks()
+        die_blocks.chunks = _chunks(cells, width, height, DIE_CHAR,
+                                    _DIE_TABLE) or _empty_chunks()
+        for layer in tile_layers:
+            # крайние чанки дополнены, а уровень кончается на width, height
+            layer.chunk_bounds = (0, 0, width, height)
+    else:
+        for layer in tile_layers:
+            layer._gen_2D()
+    return world_map
+
+
+def _image_size(image):
+    # размер картинки тайлсета: у карт из tmx он записан в <image>,
+    # у текстовых уровней читаем сам файл
+    width = getattr(image, 'width', None)
+    height = getattr(image, 'height', None)
+    if width and height:
+        return int(width), int(height)
+    import pygame
+    return pygame.image.load(image.source).get_size()
+
+
+def _encode(gids):
+    # номера тайлов -> base64 + zlib, как их пишет Tiled
+    if sys.byteorder != 'little':  # в tmx числа little-endian
+        gids = array.array('I', gids)
+        gids.byteswap()
+    return base64.b64encode(zlib.compress(gids.tostring()))
+
+
+def write_tmx(world_map, file_name):
+    # Сохраняет TileMap в tmx файл: слои в base64 + zlib, как их пишет Tiled.
+    # Чанковые карты сохраняются бесконечными картами.
+    out = [u'<?xml version="1.0" encoding="UTF-8"?>',
+           u'<map version="1.0" orientation="orthogonal" width="%d" '
+           u'height="%d" tilewidth="%d" tileheight="%d"%s>' % (
+               world_map.width, world_map.height,
+               world_map.tilewidth, world_map.tileheight,
+               u' infinite="1"' if world_map.infinite else u'')]
+    base = os.path.dirname(os.path.abspath(file_name))
+    for tile_set in world_map.tile_sets:
+        out.append(u' <tileset firstgid="%s" name=%s tilewidth="%s" '
+                   u'tileheight="%s">' % (tile_set.firstgid,
+                                          quoteattr(tile_set.name),
+                                          tile_set.tilewidth,
+                                          tile_set.tileheight))
+        for image in tile_set.images:
+            out.append(u'  <image source=%s width="%d" height="%d"/>' % ((
+                quoteattr(os.path.relpath(image.source, base)),) +
+                _image_size(image)))
+        out.append(u' </tileset>')
+    for layer in world_map.layers:
+        if layer.is_object_group:
+            out.append(u' <objectgroup name=%s width="%d" height="%d">' % (
+                quoteattr(layer.name), layer.width, layer.height))
+            for obj in layer.objects:
+                name = u' name=%s' % quoteattr(obj.name) if obj.name else u''
+                if getattr(obj, 'gid', None):
+                    name += u' gid="%s"' % obj.gid
+                if not obj.properties:
+                    out.append(u'  <object%s x="%d" y="%d"/>' % (
+                        name, obj.x, obj.y))
+                    continue
+                out.append(u'  <object%s x="%d" y="%d">' % (
+                    name, obj.x, obj.y))
+                out.append(u'   <properties>')
+                for key in sorted(obj.properties):
+                    out.append(u'    <property name=%s value=%s/>' % (
+                        quoteattr(key), quoteattr(obj.properties[key])))
+                out.append(u'   </properties>')
+                out.append(u'  </object>')
+            out.append(u' </objectgroup>')
+        else:
+            out.append(u' <layer name=%s width="%d" height="%d">' % (
+                quoteattr(layer.name), layer.width, layer.height))
+            out.append(u'  <data encoding="base64" compression="zlib">')
+            if layer.chunks:
+                for x, y in sorted(layer.chunks, key=lambda key: key[::-1]):
+                    chunk = layer.get_chunk((x, y))
+                    out.append(u'   <chunk x="%d" y="%d" width="%d" '
+                               u'height="%d">%s</chunk>' % (
+                                   x, y, chunk.width, chunk.height,
+                                   _encode(chunk.decoded_content)))
+            else:
+                out.append(u'   ' + _encode(layer.decoded_content))
+            out.append(u'  </data>')
+            out.append(u' </layer>')
+    out.append(u'</map>')
+    tmx_file = open(file_name, 'wb')
+    try:
+        tmx_file.write(u'\n'.join(out).encode('utf-8'))
+    finally:
+        tmx_file.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(u"Использование: python textlevel.py уровень.txt "
+              u"карта.tmx".encode('utf-8'))
+        sys.exit(1)
+    write_tmx(parse(sys.argv[1]), sys.argv[2])
@@ -45,11 +45,12 @@ __author__ = u'DR0ID @ 2009-2011'
 
 
 import sys
-from xml.dom import minidom, Node
-import StringIO
+# xml.dom.minidom and StringIO are imported where they are needed, so
+# importing this module to use already parsed or generated maps stays cheap
 import os.path
 import struct
 import array
+from itertools import compress, izip
 
 #  -----------------------------------------------------------------------------
 class TileMap(object):
@@ -86,6 +87,8 @@ class TileMap(object):
             dict containing {name : TileLayer}
         named_tile_sets : dict
             dict containing {name : TileSet}
+        infinite : bool
+            True if the map is infinite, its tile layers are chunked then
 
     """
 
@@ -117,6 +120,7 @@ class TileMap(object):
         self.named_layers = {} # {name: layer}
         self.named_tile_sets = {} # {name: tile_set}
         self.map_file_name = ""
+        self.infinite = False
 
     def convert(self):
         u"""
@@ -133,6 +137,7 @@ class TileMap(object):
         self.height = int(self.height)
         self.pixel_width = self.width * self.tilewidth
         self.pixel_height = self.height * self.tileheight
+        self.infinite = bool(int(self.infinite))
 
         for layer in self.layers:
             # ISSUE 9
@@ -302,6 +307,12 @@ class TileLayer(object):
                 usage: graphics id = decoded_content[tile_x + tile_y * width]
         content2D : list
             list of list, usage: graphics id = content2D[x][y]
+        chunks : dict
+            only for layers of infinite maps, {(x, y): TileChunk} where (x, y)
+            is the position of the chunk in tiles. The layer has no
+            decoded_content nor content2D then, see get_chunk()
+        chunk_bounds : tuple
+            (left, top, right, bottom) in tiles of all chunks or None
 
     """
 
@@ -322,69 +333,56 @@ class TileLayer(object):
         self.properties = {} # {name: value}
         self.content2D = None
         self.is_object_group = False    # ISSUE 9
+        self.chunks = {} # {(x, y): TileChunk}, only for infinite maps
+        self.chunk_bounds = None # (left, top, right, bottom) in tiles
 
 
     def decode(self):
         u"""
         Converts the contents in a list of integers which are the gid of the 
         used tiles. If necessairy it decodes and uncompresses the contents.
-        """
-        self.decoded_content = []
-        if self.encoded_content:
-            content = self.encoded_content
-            if self.encoding:
-                if self.encoding.lower() == u'base64':
-                    content = decode_base64(content)
-                elif self.encoding.lower() == u'csv':
-                    list_of_lines = content.split()
-                    for line in list_of_lines:
-                        self.decoded_content.extend(line.split(','))
-                    self.decoded_content = map(int, \
-                                [val for val in self.decoded_content if val])
-                    content = ""
-                else:
-                    raise Exception(u'unknown data encoding %s' % \
-                                                                (self.encoding))
-            else:
-                # in the case of xml the encoded_content already contains a 
-                # list of integers
-                self.decoded_content = map(int, self.encoded_content)
-                content = ""
-            if self.compression:
-                if self.compression == u'gzip':
-                    content = decompress_gzip(content)
-                elif self.compression == u'zlib':
-                    content = decompress_zlib(content)
-                else:
-                    raise Exception(u'unknown data compression %s' % \
-                                                            (self.compression))
-        else:
-            raise Exception(u'no encoded content to decode')
 
-        struc = struct.Struct("<" + "I" * self.width)
-        struc_unpack_from = struc.unpack_from
-        self_decoded_content_extend = self.decoded_content.extend
-        for idx in xrange(0, len(content), 4 * self.width):
-            val = struc_unpack_from(content, idx)
-            self_decoded_content_extend(val)
-
-        arr = array.array('I')
-        arr.fromlist(self.decoded_content)
-        self.decoded_content = arr
+        Chunked layers (infinite maps) are not decoded here, their chunks are
+        decoded on demand, see get_chunk().
+        """
+        if self.chunks:
+            return
+        self.decoded_content = decode_content(self.encoded_content, \
+                                self.encoding, self.compression, self.width)
 
         # TODO: generate property grid here??
 
         self._gen_2D()
 
-    def _gen_2D(self):
-        self.content2D = []
+    def get_chunk(self, key):
+        u"""
+        Returns the chunk with its top left tile at key, decoding it if
+        necessary. Returns None if the layer has no chunk there.
 
-        # generate the needed lists and fill them
-        for xpos in xrange(self.width):
-            self.content2D.append(array.array('I'))
-            for ypos in xrange(self.height):
-                self.content2D[xpos].append( \
-                                self.decoded_content[xpos + ypos * self.width])
+        :Parameters:
+            key : tuple
+                (x, y) position of the chunk in tiles
+        """
+        chunk = self.chunks.get(key, None)
+        if chunk is not None and chunk.decoded_content is None:
+            chunk.decode(self.encoding, self.compression)
+        return chunk
+
+    def release_chunk(self, key):
+        u"""
+        Drops the decoded content of a chunk, the encoded content is kept so
+        the chunk can be decoded again later.
+        """
+        chunk = self.chunks.get(key, None)
+        if chunk is not None:
+            chunk.decoded_content = None
+
+    def _gen_2D(self):
+        # generate the needed lists and fill them, each column is a slice
+        # of the decoded content so no python loop over the tiles is needed
+        end = self.width * self.height
+        self.content2D = [self.decoded_content[xpos:end:self.width] \
+                                                for xpos in xrange(self.width)]
 
     def pretty_print(self):
         num = 0
@@ -404,6 +402,16 @@ class TileLayer(object):
         self.pixel_width = self.width * self.tilewidth
         self.pixel_height = self.height * self.tileheight
         self.visible = bool(int(self.visible))
+        if self.chunks:
+            for chunk in self.chunks.values():
+                chunk.convert()
+            self.chunks = dict(((chunk.x, chunk.y), chunk) \
+                                            for chunk in self.chunks.values())
+            self.chunk_bounds = ( \
+                    min(chunk.x for chunk in self.chunks.values()), \
+                    min(chunk.y for chunk in self.chunks.values()), \
+                    max(chunk.x + chunk.width for chunk in self.chunks.values()),\
+                    max(chunk.y + chunk.height for chunk in self.chunks.values()))
 
     # def get_visible_tile_range(self, xmin, ymin, xmax, ymax):
         # tile_w = self.pixel_width / self.width
@@ -429,6 +437,51 @@ class TileLayer(object):
 
 #  -----------------------------------------------------------------------------
 
+class TileChunk(object):
+    u"""
+    A chunk of a layer of an infinite map.
+
+    :Ivariables:
+        x : int
+            position of the chunk in the world in number of tiles
+        y : int
+            position of the chunk in the world in number of tiles
+        width : int
+            number of tiles in x direction
+        height : int
+            number of tiles in y direction
+        encoded_content : string
+            the content as found in the map file
+        decoded_content : array
+            None until decoded, then the gids of the chunk::
+
+                usage: graphics id = decoded_content[tile_x + tile_y * width]
+    """
+
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+        self.width = 0
+        self.height = 0
+        self.encoded_content = None
+        self.decoded_content = None
+        self.properties = {} # {name: value}
+
+    def convert(self):
+        self.x = int(self.x)
+        self.y = int(self.y)
+        self.width = int(self.width)
+        self.height = int(self.height)
+
+    def decode(self, encoding, compression):
+        u"""
+        Decodes the encoded_content and saves it in decoded_content.
+        """
+        self.decoded_content = decode_content(self.encoded_content, \
+                                            encoding, compression, self.width)
+
+#  -----------------------------------------------------------------------------
+
 
 class MapObjectGroupLayer(object):
     u"""
@@ -472,6 +525,142 @@ class MapObjectGroupLayer(object):
             map_obj.width = int(map_obj.width)
             map_obj.height = int(map_obj.height)
 
+    def compile(self, schema):
+        u"""
+        Compiles the objects of this group into an ObjectTable. Every
+        object is checked against the schema, all broken objects are
+        reported at once.
+
+        :Parameters:
+            schema : dict
+                {kind: ((property name, typecode), ...)}, the kind is the
+                name of the object, the kind None matches all objects
+                whose name is not in the schema. The typecode is a typecode
+                of the array module, the property is converted with int()
+                or float() and stored in an array of that type.
+
+        :Returns: ObjectTable
+
+        :Raises: ObjectTableError if an object does not match the schema
+        """
+        kinds = list(schema)
+        kind_indexes = dict((kind, idx) for idx, kind in enumerate(kinds))
+        typecodes = {} # {property name: typecode}
+        for kind in kinds:
+            for prop_name, typecode in schema[kind]:
+                if typecodes.setdefault(prop_name, typecode) != typecode:
+                    raise ObjectTableError(u'%s: property %s has two types' % \
+                                                        (self.name, prop_name))
+        table = ObjectTable(self.name, kinds, typecodes)
+        errors = []
+        for obj_idx, map_obj in enumerate(self.objects):
+            kind = map_obj.name
+            if kind not in kind_indexes:
+                kind = None
+            if kind not in kind_indexes:
+                errors.append(u'object %d (%s at %s, %s): unknown kind' % \
+                              (obj_idx, map_obj.name, map_obj.x, map_obj.y))
+                continue
+            values = dict.fromkeys(typecodes, 0)
+            for prop_name, typecode in schema[kind]:
+                value = map_obj.properties.get(prop_name, None)
+                if value is None:
+                    errors.append(u'object %d (%s at %s, %s): property %s is' \
+                                  u' missing' % (obj_idx, map_obj.name, \
+                                  map_obj.x, map_obj.y, prop_name))
+                    continue
+                try:
+                    if typecode in u'fd':
+                        number = float(value)
+                    else:
+                        number = int(value)
+                    array.array(typecode, [number])
+                except (ValueError, OverflowError):
+                    errors.append(u'object %d (%s at %s, %s): property %s=%s' \
+                                  u' is not of type %s' % (obj_idx, \
+                                  map_obj.name, map_obj.x, map_obj.y, \
+                                  prop_name, value, typecode))
+                    continue
+                values[prop_name] = number
+            table.append(map_obj.x, map_obj.y, kind_indexes[kind], values)
+        if errors:
+            raise ObjectTableError(u'%s:\n    %s' % (self.name, \
+                                                     u'\n    '.join(errors)))
+        return table
+
+#  -----------------------------------------------------------------------------
+
+class ObjectTable(object):
+    u"""
+    Typed, columnar records of the objects of an object group, created by
+    MapObjectGroupLayer.compile.
+
+    :Ivariables:
+        name : string
+            name of the object group
+        kinds : list
+            the kinds of the schema
+        x : array
+            x positions of the objects
+        y : array
+            y positions of the objects
+        kind : array
+            index into kinds for every object
+        params : dict
+            {property name: array}, objects of a kind without this property
+            have 0 in it
+
+    """
+
+    def __init__(self, name, kinds, typecodes):
+        self.name = name
+        self.kinds = kinds
+        self.x = array.array('i')
+        self.y = array.array('i')
+        self.kind = array.array('B')
+        self.params = dict((prop_name, array.array(typecode)) \
+                                for prop_name, typecode in typecodes.items())
+
+    def __len__(self):
+        return len(self.kind)
+
+    def append(self, x, y, kind_idx, values):
+        u"""
+        Appends a record.
+
+        :Parameters:
+            x : int
+                x position
+            y : int
+                y position
+            kind_idx : int
+                index into kinds
+            values : dict
+                {property name: value} for every column in params
+        """
+        self.x.append(x)
+        self.y.append(y)
+        self.kind.append(kind_idx)
+        for prop_name, column in self.params.items():
+            column.append(values[prop_name])
+
+    def records(self, kind, *prop_names):
+        u"""
+        Returns the records of all objects of a kind.
+
+        :Parameters:
+            kind : string
+                the kind as in the schema
+            prop_names : strings
+                the properties to return after x and y
+
+        :Returns: [(x, y, property values...)] in map order
+        """
+        kind_idx = self.kinds.index(kind)
+        columns = [self.x, self.y] + [self.params[name] for name in prop_names]
+        return list(compress(izip(*columns), \
+                             [idx == kind_idx for idx in self.kind]))
+
 #  -----------------------------------------------------------------------------
 
 class MapObject(object):
@@ -505,6 +694,65 @@ class MapObject(object):
         self.image = None
         self.properties = {} # {name: value}
 
+#  -----------------------------------------------------------------------------
+def decode_content(encoded_content, encoding, compression, width):
+    u"""
+    Decodes the content of a layer or chunk into a list of gids. If necessary
+    it decodes and uncompresses the content.
+
+    :Parameters:
+        encoded_content : string or list
+            the content as found in the map file
+        encoding : string
+            'base64', 'csv' or None (xml)
+        compression : string
+            'gzip', 'zlib' or None
+        width : int
+            number of tiles in x direction
+
+    :returns: array of gids
+    """
+    decoded_content = []
+    if encoded_content:
+        content = encoded_content
+        if encoding:
+            if encoding.lower() == u'base64':
+                content = decode_base64(content)
+            elif encoding.lower() == u'csv':
+                list_of_lines = content.split()
+                for line in list_of_lines:
+                    decoded_content.extend(line.split(','))
+                decoded_content = map(int, \
+                                    [val for val in decoded_content if val])
+                content = ""
+            else:
+                raise Exception(u'unknown data encoding %s' % (encoding))
+        else:
+            # in the case of xml the encoded_content already contains a 
+            # list of integers
+            decoded_content = map(int, encoded_content)
+            content = ""
+        if compression:
+            if compression == u'gzip':
+                content = decompress_gzip(content)
+            elif compression == u'zlib':
+                content = decompress_zlib(content)
+            else:
+                raise Exception(u'unknown data compression %s' % (compression))
+    else:
+        raise Exception(u'no encoded content to decode')
+
+    struc = struct.Struct("<" + "I" * width)
+    struc_unpack_from = struc.unpack_from
+    decoded_content_extend = decoded_content.extend
+    for idx in xrange(0, len(content), 4 * width):
+        val = struc_unpack_from(content, idx)
+        decoded_content_extend(val)
+
+    arr = array.array('I')
+    arr.fromlist(decoded_content)
+    return arr
+
 #  -----------------------------------------------------------------------------
 def decode_base64(in_str):
     u"""
@@ -531,6 +779,7 @@ def decompress_gzip(in_str):
     :returns: uncompressed string
     """
     import gzip
+    import StringIO
     # gzip can only handle file object therefore using StringIO
     copmressed_stream = StringIO.StringIO(in_str)
     gzipper = gzip.GzipFile(fileobj=copmressed_stream)
@@ -580,6 +829,8 @@ def printer(obj, ident=''):
 
 class VersionError(Exception): pass
 
+class ObjectTableError(Exception): pass
+
 #  -----------------------------------------------------------------------------
 class TileMapParser(object):
     u"""
@@ -605,6 +856,7 @@ class TileMapParser(object):
         # print "tsx filename: ", file_name
         # would be more elegant to use  "with open(file_name, "rb") as file:" 
         # but that is python 2.6
+        from xml.dom import minidom
         file = None
         try:
             file = open(file_name, "rb")
@@ -662,19 +914,31 @@ class TileMapParser(object):
         self._set_attributes(layer_node, layer)
         for node in self._get_nodes(layer_node.childNodes, u'data'):
             self._set_attributes(node, layer)
-            if layer.encoding:
-                layer.encoded_content = node.lastChild.nodeValue
-            else:
-                #print 'has childnodes', node.hasChildNodes()
-                layer.encoded_content = []
-                for child in node.childNodes:
-                    if child.nodeType == Node.ELEMENT_NODE and \
-                                                    child.nodeName == "tile":
-                        val = child.attributes["gid"].nodeValue
-                        #print child, val
-                        layer.encoded_content.append(val)
+            # infinite maps store the data in chunks
+            for chunk_node in self._get_nodes(node.childNodes, u'chunk'):
+                chunk = TileChunk()
+                self._set_attributes(chunk_node, chunk)
+                chunk.encoded_content = self._get_data_content(chunk_node, \
+                                                                layer.encoding)
+                layer.chunks[(chunk.x, chunk.y)] = chunk
+            if not layer.chunks:
+                layer.encoded_content = self._get_data_content(node, \
+                                                                layer.encoding)
         world_map.layers.append(layer)
 
+    def _get_data_content(self, node, encoding):
+        if encoding:
+            return node.lastChild.nodeValue
+        #print 'has childnodes', node.hasChildNodes()
+        encoded_content = []
+        for child in node.childNodes:
+            if child.nodeType == child.ELEMENT_NODE and \
+                                            child.nodeName == "tile":
+                val = child.attributes["gid"].nodeValue
+                #print child, val
+                encoded_content.append(val)
+        return encoded_content
+
     def _build_world_map(self, world_node):
         world_map = TileMap()
         self._set_attributes(world_node, world_map)
@@ -704,7 +968,7 @@ class TileMapParser(object):
     # -- helpers -- #
     def _get_nodes(self, nodes, name):
         for node in nodes:
-            if node.nodeType == Node.ELEMENT_NODE and node.nodeName == name:
+            if node.nodeType == node.ELEMENT_NODE and node.nodeName == name:
                 yield node
 
     def _set_attributes(self, node, obj):
@@ -734,6 +998,7 @@ class TileMapParser(object):
         """
         # would be more elegant to use  
         # "with open(file_name, "rb") as tmx_file:" but that is python 2.6
+        from xml.dom import minidom
         self.map_file_name = os.path.abspath(file_name)
         tmx_file = None
         try:
@@ -895,6 +1160,7 @@ class AbstractResourceLoader(object):
                 img_str = decode_base64(a_tile_image.content)
             else:
                 raise Exception(u'unknown image encoding %s' % a_tile_image.encoding)
+        import StringIO
         sio = StringIO.StringIO(img_str)
         new_image = self._load_image_file_like(sio, a_tile_image.trans)
         return new_image